@@ -0,0 +1,25 @@
+import os
+import gc
+
+#-----------------------------------
+#  Production serving for /prob:
+#        gunicorn -c gunicorn.conf.py microservice:app
+#
+#  The master imports the app once and forks WEB_CONCURRENCY workers (one per core by default).
+#  A worker is replaced gracefully, after its current request, once it has served MAX_REQUESTS.
+#
+
+bind = '0.0.0.0:' + os.getenv('PORT', '5000')
+workers = int(os.getenv('WEB_CONCURRENCY', str(os.cpu_count() or 1)))
+preload_app = True
+
+#the jitter keeps the workers from all restarting at the same moment
+max_requests = int(os.getenv('MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+graceful_timeout = 30
+timeout = 60
+
+#objects that exist before the fork are moved out of the collector's reach,
+#so collections in the workers do not write to (and copy) the shared pages
+def pre_fork(server, worker):
+    gc.freeze()
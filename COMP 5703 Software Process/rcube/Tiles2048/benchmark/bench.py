@@ -0,0 +1,134 @@
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+import statistics
+import Tiles2048.bitboard as bitboard
+import Tiles2048.shift as shift
+import Tiles2048.create as create
+import Tiles2048.echo as echo
+import Tiles2048.dispatch as dispatch
+
+#-----------------------------------
+#  Times each piece of the request path on its own over a fixed corpus of boards
+#
+#        python -m Tiles2048.benchmark.bench --output baseline.json
+#        python -m Tiles2048.benchmark.bench --compare baseline.json
+#
+#  Every result is nanoseconds per call (the median and the best of the repeats).
+#  The compare mode exits with 1 when any median is slower than the baseline by more than --threshold.
+#
+
+#boards from greedy games, from the opening to a full board, all still able to move
+CORPUS = [
+    '0000000202000000',
+    '0204000800000004',
+    '0204240800040000',
+    '2802844020008000',
+    '28162408200240008',
+    '00400816846432168424',
+    '244832642216232042160',
+    '21628464423216321641642',
+    ]
+
+def corpusParms():
+    parms = []
+    for gridString in CORPUS:
+        parms.append({'op': 'shift', 'grid': gridString, 'score': '0', 'direction': 'left',
+                      'integrity': shift.calculateIntegrity(gridString, '0')})
+    return parms
+
+#returns {name: function that makes one call per corpus board}
+def benchmarks():
+    boards = [bitboard.parseGrid(gridString) for gridString in CORPUS]
+    openBoards = [board for board in boards if bitboard.emptyMask(board) != 0]
+    parms = corpusParms()
+    echoParms = [dict(userParms, op='echo') for userParms in parms]
+    rng = random.Random(5703)
+
+    def shiftEach(move):
+        return lambda: [move(board) for board in boards]
+
+    return {
+        'dispatch': lambda: [dispatch._dispatch(userParms) for userParms in echoParms],
+        'echo': lambda: [echo._echo(userParms) for userParms in echoParms],
+        'parseGrid': lambda: [bitboard.parseGrid(gridString) for gridString in CORPUS],
+        'validateShift': lambda: [shift.validateShift(userParms) for userParms in parms],
+        'shiftLeft': shiftEach(bitboard.shiftLeft),
+        'shiftRight': shiftEach(bitboard.shiftRight),
+        'shiftUp': shiftEach(bitboard.shiftUp),
+        'shiftDown': shiftEach(bitboard.shiftDown),
+        'insertNewNumber': lambda: [shift.insertNewNumber(board, rng) for board in openBoards],
+        'calculateIntegrity': lambda: [shift.calculateIntegrity(gridString, '0') for gridString in CORPUS],
+        'toGridString': lambda: [bitboard.toGridString(board) for board in boards],
+        'create': lambda: [create._create({'op': 'create'}) for _ in CORPUS],
+        'shift': lambda: [shift._shift(userParms) for userParms in parms],
+        }
+
+#calls made by one run of each benchmark
+def callsPerRun(name):
+    if name == 'insertNewNumber':
+        return len([gridString for gridString in CORPUS if bitboard.emptyCount(bitboard.parseGrid(gridString)) > 0])
+    return len(CORPUS)
+
+def runBenchmarks(repeat=5, names=None):
+    results = {}
+    for name, function in benchmarks().items():
+        if names and name not in names:
+            continue
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        times = [seconds * 1e9 / (number * callsPerRun(name)) for seconds in timer.repeat(repeat, number)]
+        results[name] = {'median_ns': round(statistics.median(times), 1), 'min_ns': round(min(times), 1)}
+
+    #what _dispatch adds on top of the op it calls
+    if 'dispatch' in results and 'echo' in results:
+        overhead = results['dispatch']['median_ns'] - results['echo']['median_ns']
+        results['dispatchOverhead'] = {'median_ns': round(overhead, 1), 'min_ns': round(overhead, 1)}
+    return results
+
+#returns [(name, baseline ns, current ns, ratio)] for every median more than threshold slower than the baseline
+def compare(baseline, current, threshold):
+    regressions = []
+    for name, result in current.items():
+        before = baseline.get(name, {}).get('median_ns', 0)
+        if before <= 0:
+            continue
+        ratio = result['median_ns'] / before
+        if ratio > 1 + threshold:
+            regressions.append((name, before, result['median_ns'], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the Tiles2048 request path.')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed slowdown before a result is flagged')
+    parser.add_argument('--repeat', type=int, default=5, help='timing repeats per benchmark')
+    parser.add_argument('names', nargs='*', help='only run these benchmarks')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.repeat, args.names)
+    report = {'python': platform.python_version(), 'corpus': len(CORPUS), 'results': results}
+
+    for name, result in results.items():
+        print(name.ljust(20) + format(result['median_ns'], '12.1f') + ' ns')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            baseline = json.load(baselineFile).get('results', {})
+        regressions = compare(baseline, results, args.threshold)
+        for name, before, after, ratio in regressions:
+            print('REGRESSION ' + name + ': ' + format(before, '.1f') + ' ns -> ' + format(after, '.1f') + ' ns (' + format(ratio, '.2f') + 'x)')
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
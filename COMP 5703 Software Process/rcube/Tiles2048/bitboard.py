@@ -0,0 +1,365 @@
+import re
+from array import array
+from functools import lru_cache
+import Tiles2048.tables as tables
+
+#--------------------------------------------------------------------------------
+#A board is held as a single 64-bit integer made of sixteen 4-bit tile exponents.
+#An exponent of 0 is an empty cell, 1 is a '2' tile, 2 is a '4' tile ... 11 is '2048'.
+#Cell (row, column) lives in bits 4 * (4 * row + column), so row 0 is the low 16 bits
+#and inside a row the left-most cell is the low nibble.
+#--------------------------------------------------------------------------------
+
+SIZE = 4
+CELLS = SIZE * SIZE
+ROW_MASK = 0xFFFF
+CELL_MASK = 0xF
+LOW_BITS = 0x1111111111111111
+MAX_EXPONENT = 15
+WIN_EXPONENT = 11
+
+#tile strings indexed by exponent and exponents indexed by tile string
+TILES = ['0'] + [str(2 ** exponent) for exponent in range(1, MAX_EXPONENT + 1)]
+EXPONENTS = {tile: exponent for exponent, tile in enumerate(TILES)}
+
+#reverses the order of the four cells in a 16-bit row
+def reverseRow(row):
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+#slides a single row to the left, merging equal neighbours once, and returns (newRow, score)
+def slideRowLeft(row, size=SIZE):
+    tiles = [(row >> shift) & CELL_MASK for shift in range(0, 4 * size, 4)]
+    tiles = [tile for tile in tiles if tile != 0]
+    merged = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] < MAX_EXPONENT:
+            merged.append(tiles[i] + 1)
+            score += 2 ** (tiles[i] + 1)
+            i += 2
+        else:
+            merged.append(tiles[i])
+            i += 1
+    newRow = 0
+    for position, tile in enumerate(merged):
+        newRow |= tile << (4 * position)
+    return newRow, score
+
+#every possible row is slid once so a move is four table lookups; the tables are
+#built into a file the first time and mapped from it afterwards (see tables.py)
+def buildMoveTables():
+    rowLeft = array('H', [0]) * 65536
+    rowRight = array('H', [0]) * 65536
+    scoreLeft = array('I', [0]) * 65536
+    scoreRight = array('I', [0]) * 65536
+
+    for row in range(65536):
+        newRow, score = slideRowLeft(row)
+        reversedRow = reverseRow(row)
+        rowLeft[row] = newRow
+        scoreLeft[row] = score
+        rowRight[reversedRow] = reverseRow(newRow)
+        scoreRight[reversedRow] = score
+    return [rowLeft, rowRight, scoreLeft, scoreRight]
+
+MOVES_FINGERPRINT = ('moves max exponent ' + str(MAX_EXPONENT) + ' code '
+                     + tables.codeFingerprint(buildMoveTables, slideRowLeft, reverseRow))
+ROW_LEFT, ROW_RIGHT, SCORE_LEFT, SCORE_RIGHT = tables.load('moves', ('H', 'H', 'I', 'I'), MOVES_FINGERPRINT,
+                                                           buildMoveTables)
+
+#-----------------------------------------
+#conversion to and from the request format
+#-----------------------------------------
+
+#the tiles a client may send; 2048 is left out because a grid holding it has already won
+#(4096 and 8192 are read as single tiles, as the original parser read every four-digit power of two but 2048)
+GRID_TOKEN = re.compile('8192|4096|1024|512|256|128|64|32|16|8|4|2|0')
+WON_GRID_TOKEN = re.compile('8192|4096|2048|1024|512|256|128|64|32|16|8|4|2|0')
+
+#reads the grid string in one pass, longest tile first, and returns the board
+#as with the original parser, cells after the last complete row are ignored
+#allowWin also accepts a won grid: when the grid is not exactly size * size tiles, it is read again with 2048 as a tile
+def parseGrid(gridString, allowWin=False, size=SIZE):
+    cellCount = size * size
+    board, count = tokenizeGrid(gridString, GRID_TOKEN, cellCount)
+
+    if allowWin and count != cellCount:
+        wonBoard, wonCount = tokenizeGrid(gridString, WON_GRID_TOKEN, cellCount)
+        if wonCount == cellCount:
+            return wonBoard
+
+    if count - count % size != cellCount:
+        raise ValueError('invalid grid - not enough characters')
+    return board
+
+#returns (board, number of tiles read) and reports the character where an invalid tile starts
+def tokenizeGrid(gridString, pattern, cellCount=CELLS):
+    board = 0
+    count = 0
+    position = 0
+    length = len(gridString)
+    while position < length:
+        token = pattern.match(gridString, position)
+        if token == None:
+            raise ValueError('invalid grid - invalid tile at character ' + str(position + 1))
+        if count < cellCount:
+            board |= EXPONENTS[token.group()] << (4 * count)
+        count += 1
+        position = token.end()
+    return board, count
+
+#turns a board back into the concatenated tile string used by the service
+def toGridString(board, size=SIZE):
+    return ''.join([TILES[(board >> (4 * i)) & CELL_MASK] for i in range(size * size)])
+
+#returns the exponent stored in every cell, row by row
+def cells(board, size=SIZE):
+    return [(board >> (4 * i)) & CELL_MASK for i in range(size * size)]
+
+#---------------------------------------------
+#below are the moves; each returns (board, score)
+#---------------------------------------------
+
+#swaps rows and columns so vertical moves can reuse the row tables
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def _shiftRows(board, rowTable, scoreTable):
+    row0 = board & ROW_MASK
+    row1 = (board >> 16) & ROW_MASK
+    row2 = (board >> 32) & ROW_MASK
+    row3 = board >> 48
+    newBoard = rowTable[row0] | (rowTable[row1] << 16) | (rowTable[row2] << 32) | (rowTable[row3] << 48)
+    score = scoreTable[row0] + scoreTable[row1] + scoreTable[row2] + scoreTable[row3]
+    return newBoard, score
+
+def shiftLeft(board):
+    return _shiftRows(board, ROW_LEFT, SCORE_LEFT)
+
+def shiftRight(board):
+    return _shiftRows(board, ROW_RIGHT, SCORE_RIGHT)
+
+#after transposing, the top of each column is the left end of a row
+def shiftUp(board):
+    newBoard, score = _shiftRows(transpose(board), ROW_LEFT, SCORE_LEFT)
+    return transpose(newBoard), score
+
+def shiftDown(board):
+    newBoard, score = _shiftRows(transpose(board), ROW_RIGHT, SCORE_RIGHT)
+    return transpose(newBoard), score
+
+MOVES = {
+    'up' : shiftUp,
+    'down' : shiftDown,
+    'right' : shiftRight,
+    'left' : shiftLeft,
+    }
+
+#---------------------------------------------------------------
+#the 8 rotations and reflections of a board share one canonical form
+#---------------------------------------------------------------
+
+#mirrors the board left to right
+def flipRows(board):
+    return (reverseRow(board & ROW_MASK) | (reverseRow((board >> 16) & ROW_MASK) << 16)
+            | (reverseRow((board >> 32) & ROW_MASK) << 32) | (reverseRow(board >> 48) << 48))
+
+#mirrors the board top to bottom
+def flipColumns(board):
+    return ((board & ROW_MASK) << 48) | (((board >> 16) & ROW_MASK) << 32) \
+        | (((board >> 32) & ROW_MASK) << 16) | (board >> 48)
+
+#the smallest of the 8 symmetric boards; symmetric boards have the same game value
+def canonical(board):
+    transposed = transpose(board)
+    return min(board, flipRows(board), flipColumns(board), flipRows(flipColumns(board)),
+               transposed, flipRows(transposed), flipColumns(transposed), flipRows(flipColumns(transposed)))
+
+#----------------------------
+#board queries used for status
+#----------------------------
+
+#one bit (the low bit of the cell's nibble) for every empty cell
+def emptyMask(board):
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    return ~occupied & LOW_BITS
+
+def emptyCount(board):
+    return bin(emptyMask(board)).count('1')
+
+#the set bits of each byte in order, 8 slots per byte, and how many there are
+SELECT_BYTE = array('B', [([bit for bit in range(8) if (byte >> bit) & 1] + [0] * 8)[slot]
+                          for byte in range(256) for slot in range(8)])
+COUNT_BYTE = array('B', [bin(byte).count('1') for byte in range(256)])
+
+#the sixteen bits of emptyMask gathered into cell order, bit i for cell i (a pext done by folding)
+def emptyFlags(board):
+    flags = emptyMask(board)
+    flags = (flags | (flags >> 3)) & 0x0303030303030303
+    flags = (flags | (flags >> 6)) & 0x000F000F000F000F
+    flags = (flags | (flags >> 12)) & 0x000000FF000000FF
+    return (flags | (flags >> 24)) & 0xFFFF
+
+#the cell of the nth lowest flag (n counts from 0), looked up a byte at a time rather than stepped to
+def selectFlag(flags, n):
+    low = flags & 0xFF
+    below = COUNT_BYTE[low]
+    if n < below:
+        return SELECT_BYTE[(low << 3) | n]
+    return 8 + SELECT_BYTE[((flags >> 8) << 3) | (n - below)]
+
+def maxExponent(board):
+    highest = 0
+    while board:
+        tile = board & CELL_MASK
+        if tile > highest:
+            highest = tile
+        board >>= 4
+    return highest
+
+#the directions that change the board, found by comparing each row with its precomputed move
+def legalMoves(board):
+    transposed = transpose(board)
+    rows = [(board >> shift) & ROW_MASK for shift in (0, 16, 32, 48)]
+    columns = [(transposed >> shift) & ROW_MASK for shift in (0, 16, 32, 48)]
+    legal = []
+    if any([ROW_LEFT[column] != column for column in columns]):
+        legal.append('up')
+    if any([ROW_RIGHT[column] != column for column in columns]):
+        legal.append('down')
+    if any([ROW_RIGHT[row] != row for row in rows]):
+        legal.append('right')
+    if any([ROW_LEFT[row] != row for row in rows]):
+        legal.append('left')
+    return legal
+
+def canMove(board):
+    return len(legalMoves(board)) > 0
+
+#--------------------------------------------------------------------------------
+#Boards from 3x3 to 8x8 use the same layout: cell (row, column) is at bits 4 * (size * row + column).
+#Only the 4x4 rows fit in full tables, so other sizes remember each row the first time it is slid.
+#An Engine has the same board functions as this module, so callers can use either one.
+#--------------------------------------------------------------------------------
+
+#rows of a real game repeat, so a few thousand are enough to hit; random 8x8 rows mostly miss, and a cache
+#of 65536 rows per function grew one engine to about 50 MB
+ROW_CACHE_SIZE = 4096
+
+class Engine:
+
+    def __init__(self, size):
+        self.size = size
+        self.rowBits = 4 * size
+        self.rowMask = (1 << self.rowBits) - 1
+        self.lowBits = sum([1 << (4 * i) for i in range(size * size)])
+        self.slideLeft = lru_cache(maxsize=ROW_CACHE_SIZE)(self.slideRowLeft)
+        self.slideRight = lru_cache(maxsize=ROW_CACHE_SIZE)(self.slideRowRight)
+        self.spread = lru_cache(maxsize=ROW_CACHE_SIZE)(self.spreadRow)
+        self.MOVES = {
+            'up' : self.shiftUp,
+            'down' : self.shiftDown,
+            'right' : self.shiftRight,
+            'left' : self.shiftLeft,
+            }
+
+    def parseGrid(self, gridString, allowWin=False):
+        return parseGrid(gridString, allowWin, self.size)
+
+    def toGridString(self, board):
+        return toGridString(board, self.size)
+
+    def rows(self, board):
+        return [(board >> (self.rowBits * r)) & self.rowMask for r in range(self.size)]
+
+    def reverseRow(self, row):
+        reversedRow = 0
+        for c in range(self.size):
+            reversedRow = (reversedRow << 4) | ((row >> (4 * c)) & CELL_MASK)
+        return reversedRow
+
+    def slideRowLeft(self, row):
+        return slideRowLeft(row, self.size)
+
+    def slideRowRight(self, row):
+        newRow, score = slideRowLeft(self.reverseRow(row), self.size)
+        return self.reverseRow(newRow), score
+
+    #moves the cells of a row into the first column, one row apart, so a transpose is one spread per row
+    def spreadRow(self, row):
+        spread = 0
+        for c in range(self.size):
+            spread |= ((row >> (4 * c)) & CELL_MASK) << (self.rowBits * c)
+        return spread
+
+    def transpose(self, board):
+        transposed = 0
+        for r, row in enumerate(self.rows(board)):
+            transposed |= self.spread(row) << (4 * r)
+        return transposed
+
+    def _shiftRows(self, board, slide):
+        newBoard = 0
+        score = 0
+        for r, row in enumerate(self.rows(board)):
+            newRow, gained = slide(row)
+            newBoard |= newRow << (self.rowBits * r)
+            score += gained
+        return newBoard, score
+
+    def shiftLeft(self, board):
+        return self._shiftRows(board, self.slideLeft)
+
+    def shiftRight(self, board):
+        return self._shiftRows(board, self.slideRight)
+
+    def shiftUp(self, board):
+        newBoard, score = self._shiftRows(self.transpose(board), self.slideLeft)
+        return self.transpose(newBoard), score
+
+    def shiftDown(self, board):
+        newBoard, score = self._shiftRows(self.transpose(board), self.slideRight)
+        return self.transpose(newBoard), score
+
+    def emptyMask(self, board):
+        occupied = board | (board >> 1)
+        occupied |= occupied >> 2
+        return ~occupied & self.lowBits
+
+    def emptyCount(self, board):
+        return bin(self.emptyMask(board)).count('1')
+
+    def maxExponent(self, board):
+        return maxExponent(board)
+
+    def legalMoves(self, board):
+        rows = self.rows(board)
+        columns = self.rows(self.transpose(board))
+        legal = []
+        if any([self.slideLeft(column)[0] != column for column in columns]):
+            legal.append('up')
+        if any([self.slideRight(column)[0] != column for column in columns]):
+            legal.append('down')
+        if any([self.slideRight(row)[0] != row for row in rows]):
+            legal.append('right')
+        if any([self.slideLeft(row)[0] != row for row in rows]):
+            legal.append('left')
+        return legal
+
+    def canMove(self, board):
+        return len(self.legalMoves(board)) > 0
+
+#one engine per size, shared by every request
+@lru_cache(maxsize=None)
+def engine(size):
+    return Engine(size)
+
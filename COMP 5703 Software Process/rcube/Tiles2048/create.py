@@ -1,16 +1,42 @@
 import random
 import hashlib
+import Tiles2048.schema as schema
+import Tiles2048.sessions as sessions
 
+SEED_KEY = 'seed'
+
+validateCreate = schema.compileSchema([schema.SIZE, schema.text(SEED_KEY),
+    schema.choice(sessions.SESSION_KEY, ('0', '1'), 'invalid session - expected 0 or 1', '0')])
+
+#seed (any text) makes the grid repeatable: the same seed and size always give the same grid
+#session=1 keeps the game on the server and adds its id to the result (see sessions.py); it is refused
+#when the game would only be kept by one of several workers
 def _create(userParms):
     
     score = "0"
+
+    try:
+        values = validateCreate(userParms)
+    except ValueError as e:
+        status = 'error: ' + str(e)
+        return {'status': status}
+
+    if values[sessions.SESSION_KEY] == '1' and not sessions.store.shared():
+        return {'status': sessions.UNSHARED_ERROR}
+
+    size = values['size']
     
-    #grid is 4x4 
-    grid = [[0] * 4 for _ in range(4)]
+    #grid is size x size (4x4 unless size is given)
+    grid = [[0] * size for _ in range(size)]
     
+    rng = random
+    if values[SEED_KEY] != '':
+        rng = random.Random(values[SEED_KEY])
+
     #randomly populate two grid places with '2'
-    for pos in random.sample(range(16), 2):
-        grid[pos//4][pos%4] = 2
+    positions = rng.sample(range(size * size), 2)
+    for pos in positions:
+        grid[pos//size][pos%size] = 2
     
     gridString = ''
     #turn grid into string; the grid is a string of strings
@@ -24,4 +50,9 @@ def _create(userParms):
     integrity = myHash.hexdigest().upper() 
     
     result = {'grid': gridString, 'score': score, 'integrity': integrity, 'status': 'ok'}
+
+    #the kept board holds each '2' as exponent 1 in the 4 bits of its cell
+    if values[sessions.SESSION_KEY] == '1':
+        board = sum([1 << (4 * pos) for pos in positions])
+        result[sessions.SESSION_KEY] = sessions.store.create(board, 0, size)
     return result
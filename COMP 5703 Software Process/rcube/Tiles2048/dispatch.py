@@ -1,26 +1,64 @@
-import Tiles2048.create as create
-import Tiles2048.shift as shift
-import Tiles2048.status as status
-import Tiles2048.recommend as recommend
-import Tiles2048.echo as echo
-import Tiles2048.info as info
+import importlib
+import Tiles2048.metrics as metrics
+import Tiles2048.profiler as profiler
 
 ERROR01 = 'error: no op is specified'
 ERROR02 = 'error: parameter is not a dictionary'
 ERROR03 = 'error: op is not legal'
 STATUS = 'status'
 OP = 'op'
+
+#every op is 'module:function'; the module is only imported the first time the op is called,
+#so a cold start does not pay for ops (and tables) it has not been asked for yet
 OPS = {
-    'create' : create._create,
-    'shift' : shift._shift,
-    'status' : status._status,
-    'recommend' : recommend._recommend,
-    'echo' : echo._echo,
-    'info' : info._info,
+    'create' : 'Tiles2048.create:_create',
+    'shift' : 'Tiles2048.shift:_shift',
+    'shiftBatch' : 'Tiles2048.shiftBatch:_shiftBatch',
+    'status' : 'Tiles2048.status:_status',
+    'recommend' : 'Tiles2048.recommend:_recommend',
+    'echo' : 'Tiles2048.echo:_echo',
+    'info' : 'Tiles2048.info:_info',
     }
 
+_loaded = {}
+
+#returns the function behind 'module:function', importing its module on first use
+def load(target):
+    function = _loaded.get(target, None)
+    if function == None:
+        moduleName, functionName = target.split(':')
+        function = getattr(importlib.import_module(moduleName), functionName)
+        _loaded[target] = function
+    return function
+
+#every op is counted and timed in metrics, and a sampled share is profiled,
+#labelled with its name ('none' when there is no legal op)
 def _dispatch(userParms = None):
 
+    if not metrics.ENABLED and not profiler.RATE:
+        return dispatchOp(userParms)
+
+    op = userParms.get(OP, None) if isinstance(userParms, dict) else None
+    if not isinstance(op, str) or op not in OPS:
+        op = 'none'
+
+    if profiler.RATE and profiler.sampled():
+        profiler.begin(op)
+        try:
+            return measuredDispatch(op, userParms)
+        finally:
+            profiler.end()
+    return measuredDispatch(op, userParms)
+
+def measuredDispatch(op, userParms):
+    start = metrics.clock()
+    current = metrics.begin(op)
+    result = dispatchOp(userParms)
+    metrics.observeRequest(op, result, metrics.clock() - start, current=current)
+    return result
+
+def dispatchOp(userParms):
+
     result = {}
     
     # Validate parm
@@ -33,5 +71,45 @@ def _dispatch(userParms = None):
     elif(not(userParms[OP] in OPS)):
         result[STATUS] = ERROR03
     else:
-        result = OPS[userParms[OP]](userParms)
+        result = load(OPS[userParms[OP]])(userParms)
     return result
+
+#op -> (the function that answers a list of its requests together, the keys that keep a request out of a batch)
+#a shift using moves, spawn, size or a session, or a status on a session, is dispatched on its own;
+#recommend is not batched: each search costs far more than a dispatch, and the searches share nothing a batch could
+BATCHED_OPS = {
+    'shift' : ('Tiles2048.shiftBatch:shiftAll', ('moves', 'spawn', 'size', 'session')),
+    'status' : ('Tiles2048.status:statusAll', ('session',)),
+    }
+
+#dispatches many requests at once and returns their results in the same order
+#the plain requests of each op in BATCHED_OPS are answered together; every other request goes through _dispatch
+def _dispatchBatch(userParmsList):
+
+    results = [None] * len(userParmsList)
+    batches = {}
+    for position, userParms in enumerate(userParmsList):
+        op = userParms.get(OP) if isinstance(userParms, dict) else None
+        if op in BATCHED_OPS and not any([key in userParms for key in BATCHED_OPS[op][1]]):
+            batches.setdefault(op, []).append(position)
+        else:
+            results[position] = _dispatch(userParms)
+
+    for op, positions in batches.items():
+        batch = [userParmsList[position] for position in positions]
+        start = metrics.clock()
+        current = metrics.begin(op)
+        profiled = profiler.RATE and profiler.sampled()
+        if profiled:
+            profiler.begin(op)
+        try:
+            answered = load(BATCHED_OPS[op][0])(batch)
+        finally:
+            if profiled:
+                profiler.end()
+        seconds = (metrics.clock() - start) / len(batch)
+        for position, result in zip(positions, answered):
+            results[position] = result
+            #each batched request is counted with the batch's mean time
+            metrics.observeRequest(op, result, seconds, current=current)
+    return results
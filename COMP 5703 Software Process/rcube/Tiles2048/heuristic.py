@@ -0,0 +1,89 @@
+from array import array
+import Tiles2048.bitboard as bitboard
+import Tiles2048.tables as tables
+
+#-------------------------------------------------------------------------------
+#Board evaluation for search. Every term is worked out per 16-bit row, once for
+#all 65,536 rows, and kept in a mapped table file (see tables.py) that is opened
+#the first time a board is evaluated. Scoring a board is then eight lookups:
+#its four rows and its four columns.
+#-------------------------------------------------------------------------------
+
+LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+CORNER_WEIGHT = 10.0
+
+_rowValues = None
+
+#the weights the row values are built from
+WEIGHTS = (LOST_PENALTY, MONOTONICITY_POWER, MONOTONICITY_WEIGHT, SUM_POWER, SUM_WEIGHT, MERGES_WEIGHT, EMPTY_WEIGHT,
+           CORNER_WEIGHT)
+
+def buildRowValues():
+    table = array('d', [0.0]) * 65536
+    for row in range(65536):
+        table[row] = scoreRow(row)
+    return [table]
+
+#what a board's value depends on: the weights and the code that scores rows and boards;
+#the row table (and anything else keeping values) is not reused once it changes
+def fingerprint():
+    return 'heuristic weights ' + repr(WEIGHTS) + ' code ' + tables.codeFingerprint(buildRowValues, scoreRow, evaluate)
+
+#the table of row values, opened on first use
+def rowValues():
+    global _rowValues
+    if _rowValues == None:
+        _rowValues = tables.load('heuristic', ('d',), fingerprint(), buildRowValues)[0]
+    return _rowValues
+
+def evaluate(board):
+    table = _rowValues or rowValues()
+    mask = bitboard.ROW_MASK
+    transposed = bitboard.transpose(board)
+    return (table[board & mask] + table[(board >> 16) & mask] + table[(board >> 32) & mask] + table[board >> 48]
+            + table[transposed & mask] + table[(transposed >> 16) & mask] + table[(transposed >> 32) & mask]
+            + table[transposed >> 48])
+
+#rewards empty cells, possible merges, rows that only rise or only fall and a big tile held at one end
+def scoreRow(row):
+    tiles = [(row >> offset) & bitboard.CELL_MASK for offset in (0, 4, 8, 12)]
+    empty = tiles.count(0)
+    tileSum = sum([tile ** SUM_POWER for tile in tiles])
+
+    merges = 0
+    previous = 0
+    counter = 0
+    for tile in tiles:
+        if tile == 0:
+            continue
+        if tile == previous:
+            counter += 1
+        elif counter > 0:
+            merges += 1 + counter
+            counter = 0
+        previous = tile
+    if counter > 0:
+        merges += 1 + counter
+
+    rising = 0.0
+    falling = 0.0
+    for i in range(3):
+        left = tiles[i] ** MONOTONICITY_POWER
+        right = tiles[i + 1] ** MONOTONICITY_POWER
+        if tiles[i] > tiles[i + 1]:
+            rising += left - right
+        else:
+            falling += right - left
+
+    #a corner cell is the end of a row and of a column, so a big corner tile is rewarded twice
+    highest = max(tiles)
+    corner = highest ** 2 if highest != 0 and (tiles[0] == highest or tiles[3] == highest) else 0
+
+    return LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges + CORNER_WEIGHT * corner \
+        - MONOTONICITY_WEIGHT * min(rising, falling) - SUM_WEIGHT * tileSum
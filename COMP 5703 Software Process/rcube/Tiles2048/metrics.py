@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+from bisect import bisect_left
+import threading
+
+#-------------------------------------------------------------------------------
+#Request metrics in the Prometheus text format. Every thread counts into its own
+#shard, so recording never takes a lock; a scrape adds the shards up. With
+#METRICS_DIR set, each process also writes its totals to a file there every
+#METRICS_FLUSH_SECONDS, and a scrape adds up the files of every process, so any
+#worker answers for all of them. A file is named by the process id and the time
+#the process started counting, so a new process that is given an old id does not
+#overwrite the old file. A scrape adds the files of processes that have exited
+#into one file, EXITED_FILE, so the totals never go down and the files do not pile up.
+#
+#Times are in seconds. The phases of an op are
+#    validate   checking the parameters, leaving out parse and hash
+#    parse      reading the grid into a board
+#    shift      playing the moves
+#    spawn      adding the new numbers and checking for a win or a loss
+#    hash       checking the integrity sent and signing the new one
+#
+#METRICS=0 turns recording off.
+#-------------------------------------------------------------------------------
+
+ENABLED = os.getenv('METRICS', '1') != '0'
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+EXITED_FILE = 'exited.json'
+
+#upper bounds of the latency buckets, from 5 microseconds to a second
+BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0)
+
+#family -> (exposed name, help text, label names)
+COUNTERS = {
+    'requests': ('rcube_requests_total', 'Ops dispatched.', ('op',)),
+    'errors': ('rcube_errors_total', 'Ops answered with an error status.', ('op', 'status')),
+    'http': ('rcube_http_requests_total', 'HTTP requests served.', ('route', 'code')),
+    }
+HISTOGRAMS = {
+    'request': ('rcube_request_seconds', 'Time to run an op.', ('op',)),
+    'phase': ('rcube_phase_seconds', 'Time spent in each phase of an op.', ('op', 'phase')),
+    'http': ('rcube_http_request_seconds', 'Time to serve an HTTP request.', ('route',)),
+    }
+
+#error statuses past this many different ones are counted as 'other', so a client cannot grow the label set
+MAX_STATUSES = 200
+
+clock = time.perf_counter
+
+#one thread's counts: counters map (family, *labels) to a count, histograms map it to the
+#bucket counts followed by the +Inf count and the sum
+class Shard:
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.op = 'none'
+        self.nested = 0.0
+
+    def count(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    #count > 1 records that many observations of seconds, e.g. the mean of a batch
+    def observe(self, key, seconds, count=1):
+        try:
+            counts = self.histograms[key]
+        except KeyError:
+            counts = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+        counts[bisect_left(BUCKETS, seconds)] += count
+        counts[-1] += seconds * count
+
+_local = threading.local()
+_shards = []
+_statuses = set()
+_registry = threading.Lock()
+_fileName = None
+
+#the calling thread's shard; the lock is only taken the first time a thread records
+def shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        current = Shard()
+        with _registry:
+            _shards.append(current)
+        _local.shard = current
+        return current
+
+#-------------------------------
+#recording
+#-------------------------------
+
+#called by dispatch before an op runs; the phases recorded until the next call are labelled with op
+#returns the thread's shard, to be handed to observeRequest
+def begin(op):
+    current = shard()
+    current.op = op
+    current.nested = 0.0
+    return current
+
+#records one op (or count ops, taking seconds as their mean time) and its error status, if any
+#this runs for every request, so the shard's dictionaries are updated in line
+def observeRequest(op, result, seconds, count=1, current=None):
+    if not ENABLED:
+        return
+    if current == None:
+        current = shard()
+    counters = current.counters
+    key = ('requests', op)
+    counters[key] = counters.get(key, 0) + count
+    try:
+        counts = current.histograms[('request', op)]
+    except KeyError:
+        counts = current.histograms[('request', op)] = [0] * (len(BUCKETS) + 2)
+    counts[bisect_left(BUCKETS, seconds)] += count
+    counts[-1] += seconds * count
+    if type(result) is dict:
+        status = result.get('status', '')
+        if type(status) is str and status.startswith('error'):
+            key = ('errors', op, statusLabel(status))
+            counters[key] = counters.get(key, 0) + 1
+
+def statusLabel(status):
+    if status in _statuses:
+        return status
+    if len(_statuses) >= MAX_STATUSES:
+        return 'other'
+    _statuses.add(status)
+    return status
+
+def observePhase(phase, seconds, count=1):
+    if not ENABLED:
+        return
+    current = shard()
+    current.observe(('phase', current.op, phase), seconds, count)
+    current.nested += seconds * count
+
+#runs function(argument) and records its time as phase, leaving out the phases recorded inside it
+def exclusive(phase, function, argument):
+    if not ENABLED:
+        return function(argument)
+    current = shard()
+    nested = current.nested
+    start = clock()
+    try:
+        return function(argument)
+    finally:
+        elapsed = clock() - start
+        current.observe(('phase', current.op, phase), elapsed - (current.nested - nested))
+        current.nested = nested + elapsed
+
+def observeHttp(route, code, seconds):
+    if not ENABLED:
+        return
+    current = shard()
+    current.count(('http', route, str(code)))
+    current.observe(('http', route), seconds)
+
+#-------------------------------
+#totals and exposition
+#-------------------------------
+
+#this process's totals as (counters, histograms)
+def snapshot():
+    counters = {}
+    histograms = {}
+    for current in list(_shards):
+        merge((counters, histograms), (dict(current.counters), dict(current.histograms)))
+    return counters, histograms
+
+def merge(into, totals):
+    counters, histograms = into
+    for key, value in totals[0].items():
+        counters[key] = counters.get(key, 0) + value
+    for key, counts in totals[1].items():
+        before = histograms.get(key, None)
+        if before == None:
+            histograms[key] = list(counts)
+        else:
+            histograms[key] = [a + b for a, b in zip(before, counts)]
+
+#the file this process writes: <pid>-<start time in ns>.json
+def fileName():
+    global _fileName
+    if _fileName == None:
+        _fileName = str(os.getpid()) + '-' + str(time.time_ns()) + '.json'
+    return _fileName
+
+#writes this process's totals to METRICS_DIR, through a temporary file so a scrape never reads half of one
+def flush():
+    if not METRICS_DIR:
+        return
+    counters, histograms = snapshot()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    writeTotals(os.path.join(METRICS_DIR, fileName()), counters, histograms)
+
+def writeTotals(path, counters, histograms):
+    data = {'counters': [[list(key), value] for key, value in counters.items()],
+            'histograms': [[list(key), counts] for key, counts in histograms.items()]}
+    with open(path + '.' + str(os.getpid()) + '.tmp', 'w') as metricsFile:
+        json.dump(data, metricsFile)
+    os.replace(path + '.' + str(os.getpid()) + '.tmp', path)
+
+#returns (counters, histograms) from a file, or None when it cannot be read
+def readTotals(path):
+    try:
+        with open(path) as metricsFile:
+            data = json.load(metricsFile)
+    except (OSError, ValueError):
+        return None
+    return ({tuple(key): value for key, value in data['counters']},
+            {tuple(key): counts for key, counts in data['histograms']})
+
+#true once the process that wrote fileName has exited; EXITED_FILE and names that are not ours are never merged
+def exited(fileName):
+    pid = fileName.split('-')[0]
+    if fileName == EXITED_FILE or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+#adds the files of exited processes into EXITED_FILE and removes them; call with the lock held
+#a file is renamed out of the way before it is added, so a scrape that fails part way loses it rather than counting it twice
+def mergeExited(fileNames):
+    exitedPath = os.path.join(METRICS_DIR, EXITED_FILE)
+    merged = readTotals(exitedPath) or ({}, {})
+    for fileName in fileNames:
+        path = os.path.join(METRICS_DIR, fileName)
+        os.replace(path, path + '.merging')
+        totals = readTotals(path + '.merging')
+        if totals != None:
+            merge(merged, totals)
+    writeTotals(exitedPath, *merged)
+    for fileName in fileNames:
+        os.remove(os.path.join(METRICS_DIR, fileName) + '.merging')
+
+#the totals of every process writing to METRICS_DIR, or of this process alone
+#a scrape holds a lock on the directory, so two scrapes never merge the same file or read one half merged
+def totals():
+    if not METRICS_DIR:
+        return snapshot()
+    flush()
+    merged = ({}, {})
+    with open(os.path.join(METRICS_DIR, 'scrape.lock'), 'w') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        fileNames = [fileName for fileName in os.listdir(METRICS_DIR) if fileName.endswith('.json')]
+        exitedNames = [fileName for fileName in fileNames if exited(fileName)]
+        if exitedNames:
+            mergeExited(exitedNames)
+            fileNames = [fileName for fileName in fileNames if fileName not in exitedNames] + [EXITED_FILE]
+        for fileName in set(fileNames):
+            totals = readTotals(os.path.join(METRICS_DIR, fileName))
+            if totals != None:
+                merge(merged, totals)
+    return merged
+
+def labelText(names, values, extra=''):
+    pairs = [name + '="' + escape(value) + '"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(pairs) + '}'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+#the /metrics response body
+def exposition():
+    counters, histograms = totals()
+    lines = []
+    for family, (name, helpText, labels) in COUNTERS.items():
+        lines.append('# HELP ' + name + ' ' + helpText)
+        lines.append('# TYPE ' + name + ' counter')
+        for key in sorted([key for key in counters if key[0] == family]):
+            lines.append(name + labelText(labels, key[1:]) + ' ' + str(counters[key]))
+
+    for family, (name, helpText, labels) in HISTOGRAMS.items():
+        lines.append('# HELP ' + name + ' ' + helpText)
+        lines.append('# TYPE ' + name + ' histogram')
+        for key in sorted([key for key in histograms if key[0] == family]):
+            counts = histograms[key]
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(name + '_bucket' + labelText(labels, key[1:], 'le="' + str(bound) + '"') + ' ' + str(cumulative))
+            lines.append(name + '_sum' + labelText(labels, key[1:]) + ' ' + repr(float(counts[-1])))
+            lines.append(name + '_count' + labelText(labels, key[1:]) + ' ' + str(cumulative))
+    return '\n'.join(lines) + '\n'
+
+#-------------------------------
+#flushing
+#-------------------------------
+
+def flushLoop():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        try:
+            flush()
+        except OSError:
+            pass
+
+#a forked process starts with no counts of its own (the parent's are in the parent's file) and its own file
+def resetMetrics():
+    global _local, _shards, _statuses, _registry, _fileName
+    _local = threading.local()
+    _shards = []
+    _statuses = set()
+    _registry = threading.Lock()
+    _fileName = None
+
+#called by each serving process once it is forked (see serving.startWorker), so every worker runs its own flusher
+def startMetrics():
+    resetMetrics()
+    if METRICS_DIR and ENABLED:
+        threading.Thread(target=flushLoop, name='metrics-flush', daemon=True).start()
+
+def stopMetrics():
+    try:
+        flush()
+    except OSError:
+        pass
+
+atexit.register(stopMetrics)
+os.register_at_fork(after_in_child=resetMetrics)
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import random
+import threading
+
+#-------------------------------------------------------------------------------
+#Sampling profiler for live traffic. A share (RATE) of dispatched ops is marked
+#while it runs; a sampler thread wakes every INTERVAL, reads the stack of every
+#marked thread with sys._current_frames() and counts it under the op. The
+#request threads only set and clear their mark, so an op that is not sampled
+#pays one random() call, and nothing at all when RATE is 0.
+#
+#The counts are written every WRITE_SECONDS, in the collapsed format that
+#flamegraph.pl and speedscope read, to one file per op and process:
+#    PROFILE_DIR/<op>-<pid>.folded      frame;frame;...;frame count
+#
+#PROFILE_RATE turns it on at start; microservice.py and asyncserver.py also take
+#/admin/profile?rate=0.05 (with the ADMIN_TOKEN), which writes the rate to
+#PROFILE_DIR/rate so that every worker picks it up within CONTROL_SECONDS. A rate
+#file written before the server started is left alone, so a restart does not
+#turn profiling back on. PROFILE_DIR defaults to profiles/ beside the app.
+#
+#A thread waiting for the lock that runs Python code gets it after
+#sys.getswitchinterval() (5 ms unless changed), so the sampler wakes at most that
+#often while an op is running, however small INTERVAL is. The switch interval is
+#left alone, as lowering it slows every request in the process. Ops shorter than
+#it are mostly missed, which leaves the slow ones: the ones a latency spike is made of.
+#-------------------------------------------------------------------------------
+
+RATE = float(os.getenv('PROFILE_RATE', '0'))
+INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+PROFILE_DIR = os.path.abspath(os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'profiles')))
+WRITE_SECONDS = 10
+CONTROL_SECONDS = 2
+MAX_DEPTH = 64
+
+#thread id -> op of the marked ops; set and cleared by the request threads, read by the sampler
+_active = {}
+#op -> {collapsed stack: samples}; only the sampler thread writes it
+_stacks = {}
+_sampler = None
+_wake = threading.Event()
+
+#when the server started: this module is imported before a pre-forking server forks, so workers forked later
+#still take a rate set while the server runs
+STARTED = time.time()
+
+#true for the share of ops that are profiled
+def sampled():
+    return random.random() < RATE
+
+def begin(op):
+    _active[threading.get_ident()] = op
+    if not _wake.is_set():
+        _wake.set()
+
+def end():
+    _active.pop(threading.get_ident(), None)
+
+#the stack of frame from the outermost call in, as module.function names
+def collapse(frame):
+    names = []
+    while frame != None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(frame.f_globals.get('__name__', '?') + '.' + getattr(code, 'co_qualname', code.co_name))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+def sample():
+    frames = sys._current_frames()
+    for ident, op in list(_active.items()):
+        frame = frames.get(ident, None)
+        if frame == None:
+            continue
+        counts = _stacks.setdefault(op, {})
+        stack = collapse(frame)
+        counts[stack] = counts.get(stack, 0) + 1
+
+#runs while RATE is above 0; sleeps on _wake while no marked op is running
+def samplerLoop():
+    written = time.monotonic()
+    while RATE > 0:
+        if not _active:
+            _wake.clear()
+            _wake.wait(WRITE_SECONDS)
+        else:
+            time.sleep(INTERVAL)
+            sample()
+        if time.monotonic() - written >= WRITE_SECONDS:
+            write()
+            written = time.monotonic()
+    write()
+
+#writes the counts so far, replacing the files written before
+def write(directory=None):
+    directory = directory or PROFILE_DIR
+    for op, counts in list(_stacks.items()):
+        lines = [stack + ' ' + str(count) for stack, count in sorted(counts.items())]
+        path = os.path.join(directory, op + '-' + str(os.getpid()) + '.folded')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path + '.tmp', 'w') as foldedFile:
+                foldedFile.write('\n'.join(lines) + '\n')
+            os.replace(path + '.tmp', path)
+        except OSError:
+            pass
+
+#starts or stops profiling in this process; rate is the share of ops to profile
+#stopping waits for the sampler to write what it has counted
+def setRate(rate):
+    global RATE, _sampler
+    RATE = rate
+    if rate > 0:
+        if _sampler == None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=samplerLoop, name='profiler', daemon=True)
+            _sampler.start()
+    elif _sampler != None:
+        _wake.set()
+        if _sampler is not threading.current_thread():
+            _sampler.join()
+        _sampler = None
+
+#reads a rate parameter and applies it to every process sharing PROFILE_DIR; returns the response
+def control(rateText):
+    try:
+        rate = float(rateText)
+    except (TypeError, ValueError):
+        rate = -1.0
+    if not 0 <= rate <= 1:
+        return {'status': 'error: invalid rate - expected 0 to 1'}
+
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, 'rate.tmp'), 'w') as rateFile:
+            rateFile.write(str(rate))
+        os.replace(os.path.join(PROFILE_DIR, 'rate.tmp'), os.path.join(PROFILE_DIR, 'rate'))
+    except OSError as e:
+        return {'status': 'error: ' + str(e)}
+    setRate(rate)
+    return {'rate': str(rate), 'directory': os.path.abspath(PROFILE_DIR), 'status': 'ok'}
+
+#returns (modified time, rate) from PROFILE_DIR/rate, or None when it is missing, unreadable,
+#was written before the server started or has not changed since seen
+def readRate(seen):
+    path = os.path.join(PROFILE_DIR, 'rate')
+    try:
+        changed = os.stat(path).st_mtime_ns
+        if changed == seen or changed < STARTED * 1e9:
+            return None
+        with open(path) as rateFile:
+            return changed, float(rateFile.read())
+    except (OSError, ValueError):
+        return None
+
+#follows PROFILE_DIR/rate, so a rate set through one worker reaches the others
+def controlLoop():
+    seen = None
+    while True:
+        time.sleep(CONTROL_SECONDS)
+        update = readRate(seen)
+        if update == None:
+            continue
+        seen, rate = update
+        if rate != RATE:
+            setRate(rate)
+
+#called by each serving process once it is forked (see serving.startWorker), so every worker runs its own threads
+def startProfiler():
+    global _active, _stacks, _sampler, _wake
+    _active = {}
+    _stacks = {}
+    _sampler = None
+    _wake = threading.Event()
+    if os.getenv('ADMIN_TOKEN'):
+        threading.Thread(target=controlLoop, name='profiler-control', daemon=True).start()
+    if RATE > 0:
+        setRate(RATE)
@@ -1,3 +1,214 @@
+import time
+import Tiles2048.bitboard as bitboard
+import Tiles2048.schema as schema
+import Tiles2048.shift as shift
+import Tiles2048.sessions as sessions
+import Tiles2048.heuristic as heuristic
+import Tiles2048.rollout as rollout
+import Tiles2048.transposition as transposition
+
+DEPTH_KEY = 'depth'
+BUDGET_KEY = 'budgetMs'
+DEFAULT_DEPTH = 3
+MAX_DEPTH = 6
+DEFAULT_BUDGET_MS = 50
+MAX_BUDGET_MS = 1000
+#budgetMs=0 searches to depth with no deadline, so the answer only depends on the request; that is
+#only allowed for depths that finish quickly
+UNTIMED_MAX_DEPTH = 3
+#an untimed search keeps a table of its own, as values left in the shared table by other searches would
+#make its answer depend on what was asked before
+UNTIMED_TABLE_ENTRIES = 1 << 14
+STRATEGY_KEY = 'strategy'
+ROLLOUTS_KEY = 'rollouts'
+POLICY_KEY = 'policy'
+DEFAULT_ROLLOUTS = 100
+MAX_ROLLOUTS = 2000
+#rollouts always run against a deadline; playouts not started by then are dropped
+DEFAULT_ROLLOUT_BUDGET_MS = 500
+SIZE_ERROR = 'error: invalid session - recommend only plays 4x4 games'
+
+#the service spawns a 2 (exponent 1) or a 4 (exponent 2) with equal chance
+SPAWNS = ((1, 0.5), (2, 0.5))
+
+#chance branches this unlikely are scored by the heuristic instead of being searched
+PROBABILITY_CUTOFF = 0.0001
+
+#an optional positive integer parameter, up to maximum
+def limit(key, default, maximum):
+    return schema.integer(key, 'invalid ' + key + ' - expected 1 to ' + str(maximum), default=default, minimum=1, maximum=maximum)
+
+def checkUntimed(userParms, values):
+    if values[BUDGET_KEY] == 0 and values[DEPTH_KEY] > UNTIMED_MAX_DEPTH:
+        raise ValueError('invalid budgetMs - 0 needs a depth up to ' + str(UNTIMED_MAX_DEPTH))
+
+#each strategy has its own parameters
+STRATEGY_RULES = [
+    schema.choice(STRATEGY_KEY, ('expectimax', 'rollout'), 'invalid strategy', 'expectimax', branches={
+        'expectimax': [limit(DEPTH_KEY, DEFAULT_DEPTH, MAX_DEPTH),
+                       schema.integer(BUDGET_KEY, 'invalid ' + BUDGET_KEY + ' - expected 0 to ' + str(MAX_BUDGET_MS),
+                                      default=DEFAULT_BUDGET_MS, minimum=0, maximum=MAX_BUDGET_MS),
+                       schema.custom(checkUntimed)],
+        'rollout': [limit(ROLLOUTS_KEY, DEFAULT_ROLLOUTS, MAX_ROLLOUTS),
+                    schema.choice(POLICY_KEY, rollout.POLICIES, 'invalid policy', 'random'),
+                    limit(BUDGET_KEY, DEFAULT_ROLLOUT_BUDGET_MS, MAX_BUDGET_MS)],
+        }),
+    ]
+
+#grid, score and integrity are checked exactly as for op=shift
+validateRecommend = schema.compileSchema(shift.GRID_RULES + STRATEGY_RULES + [
+    schema.derive('board', bitboard.parseGrid, 'grid'),
+    ])
+
+#a game kept by the server brings its own board and score
+validateSessionRecommend = schema.compileSchema(STRATEGY_RULES)
+
+#recommends the direction with the highest expected value
+#strategy=expectimax (the default) searches the game tree; strategy=rollout plays games out on the process pool
+#session=<id> recommends a move for a game kept by the server instead of the grid given
 def _recommend(userParms):
-    result = {'recommend': 'recommend stub'}
+
+    try:
+        if sessions.selected(userParms):
+            values = validateSessionRecommend(userParms)
+        else:
+            values = validateRecommend(userParms)
+    except ValueError as e:
+        status = 'error: ' + str(e)
+        return {'status': status}
+
+    if sessions.selected(userParms):
+        game = sessions.store.get(userParms[sessions.SESSION_KEY])
+        if game == None:
+            return {'status': sessions.ERROR}
+        #the search and the playouts use the 4x4 move tables
+        if game[2] != bitboard.SIZE:
+            return {'status': SIZE_ERROR}
+        values['board'], values['score'] = game[0], game[1]
+
+    if values[STRATEGY_KEY] == 'rollout':
+        result = recommendByRollout(values['board'], values['score'], values[ROLLOUTS_KEY], values[POLICY_KEY], values[BUDGET_KEY])
+    else:
+        result = recommendBySearch(values['board'], values[DEPTH_KEY], values[BUDGET_KEY])
+    if sessions.selected(userParms):
+        result[sessions.SESSION_KEY] = userParms[sessions.SESSION_KEY]
     return result
+
+#recommends the direction with the best expected value to depth, or as deep as budgetMs allows
+def recommendBySearch(board, depth, budgetMs):
+    expected, searchedDepth, search = searchMoves(board, depth, budgetMs)
+
+    #no direction changes the grid, so there is nothing to recommend
+    if not expected:
+        result = {'recommend': '', 'expected': {}, 'depth': '0', 'status': 'lose'}
+    else:
+        best = max(expected, key=expected.get)
+        expected = {direction: round(value, 2) for direction, value in expected.items()}
+        result = {'recommend': best, 'expected': expected, 'depth': str(searchedDepth), 'status': 'ok'}
+
+    #an untimed answer may be cached and served again, so it carries nothing about the search that made it
+    if budgetMs:
+        result['tableHits'] = str(search.hits)
+        result['tableMisses'] = str(search.misses)
+    return result
+
+#recommends the direction with the best mean final score over its playouts; rollouts is how many
+#playouts every direction got before budgetMs ran out, which may be fewer than were asked for
+def recommendByRollout(board, score, rollouts, policy, budgetMs):
+    summary, played = rollout.evaluateMoves(board, score, rollouts, policy, budgetMs=budgetMs)
+
+    if not summary:
+        return {'recommend': '', 'expected': {}, 'interval': {}, 'rollouts': str(rollouts), 'status': 'lose'}
+
+    best = max(summary, key=lambda direction: summary[direction][0])
+    expected = {direction: round(mean, 2) for direction, (mean, low, high) in summary.items()}
+    interval = {direction: [round(low, 2), round(high, 2)] for direction, (mean, low, high) in summary.items()}
+    result = {'recommend': best, 'expected': expected, 'interval': interval, 'rollouts': str(played), 'status': 'ok'}
+    return result
+
+#----------------------------------------------------------------
+#the search deepens one move at a time until depth or the budget runs out
+#----------------------------------------------------------------
+
+class SearchTimeout(Exception):
+    pass
+
+#one search; it counts its own hits and misses in its transposition table
+class ExpectimaxSearch:
+
+    def __init__(self, table, deadline=None):
+        self.table = table
+        self.deadline = deadline
+        self.hits = 0
+        self.misses = 0
+
+    #the player picks the move with the best expected value
+    def maxNode(self, board, depth, probability):
+        if self.deadline != None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        best = 0.0
+        for move in (bitboard.shiftLeft, bitboard.shiftRight, bitboard.shiftUp, bitboard.shiftDown):
+            newBoard, gained = move(board)
+            if newBoard != board:
+                value = self.chanceNode(newBoard, depth, probability)
+                if value > best:
+                    best = value
+        return best
+
+    #the new tile lands in any empty cell, so the value is the average over every spawn
+    def chanceNode(self, board, depth, probability):
+        if depth == 0 or probability < PROBABILITY_CUTOFF:
+            return heuristic.evaluate(board)
+
+        empty = bitboard.emptyMask(board)
+        if empty == 0:
+            return heuristic.evaluate(board)
+
+        #symmetric boards are worth the same, so they share one table entry
+        key = bitboard.canonical(board)
+        value = self.table.lookup(key, depth)
+        if value != None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        total = 0.0
+        emptyCount = bin(empty).count('1')
+        cellProbability = probability / emptyCount
+        while empty:
+            lowest = empty & -empty
+            empty ^= lowest
+            for exponent, chance in SPAWNS:
+                total += chance * self.maxNode(board | (exponent * lowest), depth - 1, cellProbability * chance)
+        value = total / emptyCount
+
+        self.table.store(key, depth, value)
+        return value
+
+#returns ({direction: expected value}, depth searched, search) for every direction that changes the board
+#a budgetMs of 0 has no deadline and searches with a private table
+def searchMoves(board, depth, budgetMs):
+    if budgetMs:
+        table = transposition.sharedTable()
+    else:
+        table = transposition.TranspositionTable(UNTIMED_TABLE_ENTRIES)
+    search = ExpectimaxSearch(table)
+    deadline = time.perf_counter() + budgetMs / 1000.0 if budgetMs else None
+    expected = {}
+    searchedDepth = 0
+    for currentDepth in range(1, depth + 1):
+        #the first pass always finishes so there is something to recommend
+        if currentDepth > 1:
+            search.deadline = deadline
+        try:
+            values = {}
+            for direction, move in bitboard.MOVES.items():
+                newBoard, gained = move(board)
+                if newBoard != board:
+                    values[direction] = search.chanceNode(newBoard, currentDepth - 1, 1.0)
+        except SearchTimeout:
+            break
+        expected = values
+        searchedDepth = currentDepth
+    return expected, searchedDepth, search
@@ -0,0 +1,155 @@
+import os
+import math
+import time
+import random
+import threading
+from itertools import zip_longest
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import Tiles2048.bitboard as bitboard
+import Tiles2048.shift as shift
+
+POLICIES = ('random', 'greedy')
+
+#rollouts for one first move are split into chunks of this size so every core gets work
+CHUNK_SIZE = 25
+
+#a playout on a 4x4 board cannot last this long, but it bounds a runaway loop
+MAX_PLAYOUT_MOVES = 100000
+
+_pool = None
+_poolLock = threading.Lock()
+
+#--------------------------------------------------------------------
+#the pool is started once per server process, by the first rollout it
+#serves, so a worker that never gets one never forks a pool; every pool
+#process loads the engine tables before its first chunk, and request
+#threads that get here at the same time share the one pool
+#--------------------------------------------------------------------
+def startPool(workers=None):
+    global _pool
+    with _poolLock:
+        if _pool == None:
+            size = workers or poolSize()
+            _pool = ProcessPoolExecutor(max_workers=size)
+            list(_pool.map(warmWorker, range(size)))
+        return _pool
+
+#the cores are shared by the server processes: ROLLOUT_WORKERS, or the cores over WEB_CONCURRENCY
+def poolSize():
+    if os.getenv('ROLLOUT_WORKERS'):
+        return max(1, int(os.getenv('ROLLOUT_WORKERS')))
+    return max(1, (os.cpu_count() or 1) // max(1, int(os.getenv('WEB_CONCURRENCY', '1'))))
+
+def stopPool():
+    global _pool
+    with _poolLock:
+        if _pool != None:
+            _pool.shutdown()
+            _pool = None
+
+def warmWorker(_):
+    return len(bitboard.ROW_LEFT)
+
+#returns ({direction: (mean, low, high)}, playouts per direction) for every direction that changes the board,
+#where low and high bound the 95% confidence interval of the mean final score
+#with budgetMs the chunks still waiting when it runs out are dropped, so fewer playouts may be summarized;
+#the first chunk of every direction always finishes so each has a mean
+def evaluateMoves(board, score, rollouts, policy, seed=None, budgetMs=None):
+    rng = random.Random(seed)
+    chunks = []
+    for direction, move in bitboard.MOVES.items():
+        newBoard, gained = move(board)
+        if newBoard == board:
+            continue
+        directionChunks = []
+        remaining = rollouts
+        while remaining > 0:
+            count = min(CHUNK_SIZE, remaining)
+            directionChunks.append((direction, newBoard, score + gained, count, policy, rng.getrandbits(64)))
+            remaining -= count
+        chunks.append(directionChunks)
+
+    #the chunks are queued a round at a time across the directions, so a search cut short by its budget
+    #has played about as many games for every direction
+    tasks = [chunk for turn in zip_longest(*chunks) for chunk in turn if chunk != None]
+    deadline = time.perf_counter() + budgetMs / 1000.0 if budgetMs else None
+
+    finalScores = {}
+    for task, scores in zip(tasks, runTasks(tasks, len(chunks), deadline)):
+        if scores != None:
+            finalScores.setdefault(task[0], []).extend(scores)
+
+    summary = {direction: summarize(scores) for direction, scores in finalScores.items()}
+    played = min([len(scores) for scores in finalScores.values()], default=0)
+    return summary, played
+
+#runs the chunks on the pool, or in this process if a pool cannot be used here; the first required chunks
+#always finish, and after the deadline the rest are cancelled and come back as None
+def runTasks(tasks, required=0, deadline=None):
+    global _pool
+    if not tasks:
+        return []
+    try:
+        pool = startPool()
+        futures = [pool.submit(playChunk, task) for task in tasks]
+        wait(futures[:required])
+        if deadline != None:
+            wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+        else:
+            wait(futures)
+        for future in futures:
+            future.cancel()
+        return [future.result() if future.done() and not future.cancelled() else None for future in futures]
+    except (OSError, BrokenProcessPool):
+        _pool = None
+        results = []
+        for index, task in enumerate(tasks):
+            if index >= required and deadline != None and time.perf_counter() > deadline:
+                results.append(None)
+            else:
+                results.append(playChunk(task))
+        return results
+
+def summarize(scores):
+    count = len(scores)
+    mean = sum(scores) / count
+    if count > 1:
+        variance = sum([(score - mean) ** 2 for score in scores]) / (count - 1)
+    else:
+        variance = 0.0
+    margin = 1.96 * math.sqrt(variance / count)
+    return mean, mean - margin, mean + margin
+
+#-------------------------------------------
+#everything below runs inside a pool worker
+#-------------------------------------------
+
+#task is (direction, board after the first move, score so far, playouts, policy, seed)
+def playChunk(task):
+    direction, board, score, count, policy, seed = task
+    rng = random.Random(seed)
+    return [playout(shift.insertNewNumber(board, rng), score, policy, rng) for _ in range(count)]
+
+#plays one game until it is won or lost and returns its final score
+def playout(board, score, policy, rng):
+    moves = (bitboard.shiftLeft, bitboard.shiftRight, bitboard.shiftUp, bitboard.shiftDown)
+    for _ in range(MAX_PLAYOUT_MOVES):
+        #a game ends at 2048, as it does for op=shift
+        if bitboard.maxExponent(board) >= bitboard.WIN_EXPONENT:
+            break
+        options = []
+        for move in moves:
+            newBoard, gained = move(board)
+            if newBoard != board:
+                options.append((gained, newBoard))
+        if not options:
+            break
+
+        if policy == 'greedy':
+            bestGain = max([gained for gained, _ in options])
+            options = [option for option in options if option[0] == bestGain]
+        gained, board = rng.choice(options)
+        score += gained
+        board = shift.insertNewNumber(board, rng)
+    return score
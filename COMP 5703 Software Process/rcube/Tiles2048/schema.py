@@ -0,0 +1,108 @@
+#-------------------------------------------------------------------------------
+#Parameter schemas. An op declares its parameters as an ordered list of rules;
+#compileSchema turns the list into one validator that returns the typed values
+#in a dictionary. Rules run in order, so the first problem found is the one
+#reported, and every problem is raised as a ValueError holding the status text
+#without the 'error: ' prefix.
+#-------------------------------------------------------------------------------
+
+#the board sizes a request may ask for
+DEFAULT_SIZE = 4
+MIN_SIZE = 3
+MAX_SIZE = 8
+
+def compileSchema(rules):
+    steps = tuple(rules)
+
+    def validate(userParms):
+        values = {}
+        for step in steps:
+            step(userParms, values)
+        return values
+    return validate
+
+#the value must be given; blank=False also rejects an empty value
+def required(key, message, blank=True):
+    def step(userParms, values):
+        value = userParms.get(key, '')
+        if value == None or (not blank and value == ''):
+            raise ValueError(message)
+        values[key] = value
+    return step
+
+#the value must be all digits (it is kept as text)
+def digits(key, message):
+    def step(userParms, values):
+        if userParms.get(key, '').isdigit() == False:
+            raise ValueError(message)
+    return step
+
+#a whole number from minimum to maximum; a missing value takes default, or is an error when there is none
+def integer(key, message, default=None, minimum=0, maximum=None):
+    def step(userParms, values):
+        value = userParms.get(key, '')
+        if value == None or value == '':
+            if default == None:
+                raise ValueError(message)
+            values[key] = default
+            return
+        if value.isdigit() == False or int(value) < minimum or (maximum != None and int(value) > maximum):
+            raise ValueError(message)
+        values[key] = int(value)
+    return step
+
+#an integer already read must be even
+def even(key, message):
+    def step(userParms, values):
+        if values[key] % 2 != 0:
+            raise ValueError(message)
+    return step
+
+#the value must equal expected(userParms), e.g. an integrity hash of other parameters
+def matches(key, expected, message):
+    def step(userParms, values):
+        if userParms.get(key, '') != expected(userParms):
+            raise ValueError(message)
+    return step
+
+#one of choices (default when missing); branches maps a choice to the rules that only apply to it
+def choice(key, choices, message, default, lower=False, branches=None):
+    compiled = {}
+    for name, rules in (branches or {}).items():
+        compiled[name] = tuple(rules)
+
+    def step(userParms, values):
+        value = userParms.get(key, '')
+        if value == None or value == '':
+            value = default
+        elif lower:
+            value = value.lower()
+        if value not in choices:
+            raise ValueError(message)
+        values[key] = value
+        for branchStep in compiled.get(value, ()):
+            branchStep(userParms, values)
+    return step
+
+#free text, default when missing
+def text(key, default=''):
+    def step(userParms, values):
+        value = userParms.get(key, '')
+        if value == None or value == '':
+            value = default
+        values[key] = value
+    return step
+
+#a value worked out from values already read, e.g. the board from the grid; function may raise ValueError
+def derive(name, function, *keys):
+    def step(userParms, values):
+        values[name] = function(*[values[key] for key in keys])
+    return step
+
+#a rule written by hand: function(userParms, values) reads or checks what the others cannot
+def custom(function):
+    return function
+
+#the size parameter shared by create and shift
+SIZE = integer('size', 'invalid size - expected ' + str(MIN_SIZE) + ' to ' + str(MAX_SIZE),
+               default=DEFAULT_SIZE, minimum=MIN_SIZE, maximum=MAX_SIZE)
@@ -0,0 +1,114 @@
+import random
+import importlib
+from collections import Counter
+import Tiles2048.bitboard as bitboard
+import Tiles2048.shift as shift
+import Tiles2048.recommend as recommend
+
+#-------------------------------------------------------------------
+#Complete games played straight on the engine, with the same rules as
+#op=create and op=shift: two 2s to start, a 2 or 4 after every move,
+#and the game ends on a 2048 tile or when no direction changes the grid
+#-------------------------------------------------------------------
+
+#a game on a 4x4 board cannot last this long, but it bounds a runaway strategy
+MAX_GAME_MOVES = 100000
+
+#a strategy is called with (board, rng) and returns a direction, or None to resign
+def randomStrategy(board, rng):
+    return rng.choice(bitboard.legalMoves(board))
+
+#takes the move that scores the most, breaking ties at random
+def greedyStrategy(board, rng):
+    options = []
+    for direction, move in bitboard.MOVES.items():
+        newBoard, gained = move(board)
+        if newBoard != board:
+            options.append((gained, direction))
+    bestGain = max([gained for gained, _ in options])
+    return rng.choice([direction for gained, direction in options if gained == bestGain])
+
+#plays what op=recommend (expectimax) would recommend
+def recommendStrategy(depth, budgetMs):
+    def strategy(board, rng):
+        expected, searchedDepth, search = recommend.searchMoves(board, depth, budgetMs)
+        return max(expected, key=expected.get)
+    return strategy
+
+STRATEGIES = ('random', 'greedy', 'recommend')
+
+#returns the strategy function for a name, or for 'package.module:function' to plug in another one
+def strategyFor(name, depth=recommend.DEFAULT_DEPTH, budgetMs=recommend.DEFAULT_BUDGET_MS):
+    if name == 'random':
+        return randomStrategy
+    if name == 'greedy':
+        return greedyStrategy
+    if name == 'recommend':
+        return recommendStrategy(depth, budgetMs)
+    if ':' in name:
+        moduleName, functionName = name.split(':', 1)
+        return getattr(importlib.import_module(moduleName), functionName)
+    raise ValueError('invalid strategy - expected ' + ', '.join(STRATEGIES) + ' or module:function')
+
+#the opening board from op=create
+def openingBoard(rng):
+    first, second = rng.sample(range(bitboard.CELLS), 2)
+    return (1 << (4 * first)) | (1 << (4 * second))
+
+#plays one game and returns (final score, highest exponent, moves played)
+def playGame(strategy, rng):
+    board = openingBoard(rng)
+    score = 0
+    moves = 0
+    status = 'ok' if bitboard.canMove(board) else 'lose'
+    while status == 'ok' and moves < MAX_GAME_MOVES:
+        direction = strategy(board, rng)
+        if direction == None:
+            break
+        newBoard, gained = bitboard.MOVES[direction](board)
+        if newBoard == board:
+            break
+        score += gained
+        moves += 1
+        board, status = shift.settleBoard(newBoard, rng)
+    return score, bitboard.maxExponent(board), moves
+
+#task is (strategy name, games, seed, depth, budgetMs); runs inside a pool worker
+#results are kept as counts so a chunk of any size comes back as a few small dictionaries
+def playChunk(task):
+    name, games, seed, depth, budgetMs = task
+    strategy = strategyFor(name, depth, budgetMs)
+    rng = random.Random(seed)
+    maxTiles = Counter()
+    lengths = Counter()
+    totalScore = 0
+    for _ in range(games):
+        score, highest, moves = playGame(strategy, rng)
+        maxTiles[bitboard.TILES[highest]] += 1
+        lengths[moves] += 1
+        totalScore += score
+    return games, totalScore, maxTiles, lengths
+
+#adds chunk results together
+def combine(results):
+    games = 0
+    totalScore = 0
+    maxTiles = Counter()
+    lengths = Counter()
+    for chunkGames, chunkScore, chunkTiles, chunkLengths in results:
+        games += chunkGames
+        totalScore += chunkScore
+        maxTiles.update(chunkTiles)
+        lengths.update(chunkLengths)
+    return games, totalScore, maxTiles, lengths
+
+#the smallest game length with at least fraction of the games at or below it
+def percentile(lengths, fraction):
+    total = sum(lengths.values())
+    needed = fraction * total
+    seen = 0
+    for length in sorted(lengths):
+        seen += lengths[length]
+        if seen >= needed:
+            return length
+    return 0
@@ -0,0 +1,221 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+#-------------------------------------------------------------------------------
+#Server-side games. op=create&session=1 keeps the new game here and answers with
+#a short id; op=shift&session=<id>&direction=left (and op=status or op=recommend with session=<id>)
+#then play on the kept board, so the client sends no grid, score or integrity
+#and the server neither parses nor hashes them. session=0 (or none) is the
+#default: the game is played from the grid sent.
+#
+#A game is (board, score, size), kept in memory in least recently used order.
+#Every use pushes its expiry SESSION_TTL seconds on, so the least recently used
+#game is also the first to expire. Past SESSION_CAPACITY games the least recently
+#used one is dropped.
+#
+#A game in memory is only seen by the process that created it, so with more than
+#one worker (WEB_CONCURRENCY) session=1 needs SESSION_DB, an SQLite file every
+#worker opens. The file then holds every game: each move is written to it, and
+#the games in memory are a cache of it. A cached game carries the version it was
+#read at. A move is played on the cached game and written over that version in
+#one statement, so two workers playing one game at once cannot both win; the
+#loser reads the game again and plays the move over. The file is in WAL mode, so
+#readers do not wait for a writer, and expired games are purged at most once
+#every PURGE_INTERVAL seconds.
+#
+#A game is played under its own lock, so moves on one game never overlap while
+#moves on different games run side by side.
+#-------------------------------------------------------------------------------
+
+SESSION_KEY = 'session'
+CAPACITY = int(os.getenv('SESSION_CAPACITY', '10000'))
+TTL = float(os.getenv('SESSION_TTL', '3600'))
+DATABASE = os.getenv('SESSION_DB', '')
+WORKERS = int(os.getenv('WEB_CONCURRENCY', '1'))
+ERROR = 'error: unknown session'
+UNSHARED_ERROR = 'error: invalid session - more than one worker runs without a SESSION_DB'
+BUSY_ERROR = 'error: session busy - try again'
+
+#a move that keeps losing to moves from other workers is given up after this many tries
+RETRIES = 5
+
+#seconds between purges of expired games from the database
+PURGE_INTERVAL = 60
+
+#true when the request names a kept game; '' and '0' do not
+def selected(userParms):
+    return userParms.get(SESSION_KEY, None) not in (None, '', '0')
+
+#a size-bounded LRU of id -> [expiry, board, score, size, version, lock], safe to share between request threads
+class SessionStore:
+
+    def __init__(self, capacity, ttl, databasePath='', clock=time.time):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.databasePath = databasePath
+        self.clock = clock
+        self.games = OrderedDict()
+        #guards the order of games; a game is read and played under its own lock
+        self.lock = threading.Lock()
+        self.connections = threading.local()
+        self.nextPurge = 0.0
+
+    #true when every worker sees the games kept here
+    def shared(self):
+        return bool(self.databasePath) or WORKERS <= 1
+
+    #keeps a new game and returns its id, 64 random bits as 16 hex digits
+    def create(self, board, score, size):
+        sessionId = os.urandom(8).hex()
+        game = [self.clock() + self.ttl, board, score, size, 0, threading.Lock()]
+        if self.databasePath:
+            now = self.clock()
+            database = self.database()
+            with database:
+                if now >= self.nextPurge:
+                    self.nextPurge = now + PURGE_INTERVAL
+                    database.execute('DELETE FROM sessions WHERE expiry <= ?', (now,))
+                database.execute('INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)',
+                                 (sessionId, game[0], format(board, 'x'), score, size, 0))
+        with self.lock:
+            self.keep(sessionId, game)
+        return sessionId
+
+    #returns (board, score, size), or None when there is no such game
+    def get(self, sessionId):
+        game = self.fetch(sessionId)
+        if game == None:
+            return None
+        with game[5]:
+            if not self.refresh(sessionId, game):
+                return None
+            return game[1], game[2], game[3]
+
+    #play(board, score, size) returns ((board, score), result); the game is held while it plays,
+    #so two moves on one game never overlap; returns the result, or None when there is no such game
+    #a cached game is played as it is and checked by the write; only a game that has not been read yet,
+    #or lost its last write, is read from the database first
+    def update(self, sessionId, play):
+        for _ in range(RETRIES):
+            game = self.fetch(sessionId)
+            if game == None:
+                return None
+            with game[5]:
+                if game[4] < 0 and not self.refresh(sessionId, game):
+                    return None
+                (board, score), result = play(game[1], game[2], game[3])
+                if self.write(sessionId, game, board, score):
+                    return result
+        return {'status': BUSY_ERROR}
+
+    #the game as the most recently used, with its expiry pushed on, or None; with a database a game that is
+    #not in memory is read from it (refresh checks it against the database before it is used)
+    def fetch(self, sessionId):
+        now = self.clock()
+        with self.lock:
+            game = self.games.get(sessionId, None)
+            if game != None and game[0] <= now and not self.databasePath:
+                del self.games[sessionId]
+                return None
+            if game != None:
+                game[0] = now + self.ttl
+                self.games.move_to_end(sessionId)
+                return game
+        if not self.databasePath:
+            return None
+
+        #version -1 makes refresh read the game
+        game = [now + self.ttl, 0, 0, 0, -1, threading.Lock()]
+        with self.lock:
+            game = self.games.setdefault(sessionId, game)
+            self.keep(sessionId, game)
+        return game
+
+    def keep(self, sessionId, game):
+        self.games[sessionId] = game
+        self.games.move_to_end(sessionId)
+
+        #the oldest games are at the front, so the expired ones are dropped from there
+        now = self.clock()
+        while self.games:
+            oldestId, oldest = next(iter(self.games.items()))
+            if oldest[0] > now and len(self.games) <= self.capacity:
+                break
+            del self.games[oldestId]
+
+    #-------------------------------
+    #SQLite
+    #-------------------------------
+
+    #each thread has its own connection; sqlite3 is only imported on first use, so op=create without
+    #a database does not pay for it on a cold start
+    def database(self):
+        connection = getattr(self.connections, 'database', None)
+        if connection == None:
+            import sqlite3
+            connection = sqlite3.connect(self.databasePath, timeout=10)
+            #a move commits without waiting for the disk; a crash of the machine may lose the last moves
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, expiry REAL, '
+                                   'board TEXT, score INTEGER, size INTEGER, version INTEGER)')
+                connection.execute('CREATE INDEX IF NOT EXISTS sessionsExpiry ON sessions (expiry)')
+            self.connections.database = connection
+        return connection
+
+    #closes the calling thread's connection
+    def close(self):
+        connection = getattr(self.connections, 'database', None)
+        if connection != None:
+            connection.close()
+            self.connections.database = None
+
+    #brings a game up to the database's version and pushes its expiry on there; false when the game has
+    #expired or is gone; call with the game's lock held
+    def refresh(self, sessionId, game):
+        if not self.databasePath:
+            return True
+        now = self.clock()
+        database = self.database()
+        with database:
+            database.execute('UPDATE sessions SET expiry = ? WHERE id = ? AND expiry > ?', (now + self.ttl, sessionId, now))
+            row = database.execute('SELECT version FROM sessions WHERE id = ? AND expiry > ?', (sessionId, now)).fetchone()
+            if row != None and row[0] != game[4]:
+                row = database.execute('SELECT version, board, score, size FROM sessions WHERE id = ?', (sessionId,)).fetchone()
+                if row != None:
+                    game[4], game[1], game[2], game[3] = row[0], int(row[1], 16), row[2], row[3]
+        if row == None:
+            with self.lock:
+                self.games.pop(sessionId, None)
+            return False
+        return True
+
+    #stores a move and pushes the game's expiry on; with a database only over the version it was played from
+    #and while the game has not expired, so false means another worker played first (or the game is gone) and
+    #the game has to be read again; call with the game's lock held
+    #boards larger than 4x4 do not fit an SQLite integer, so they are kept as hex
+    def write(self, sessionId, game, board, score):
+        if self.databasePath:
+            now = self.clock()
+            database = self.database()
+            with database:
+                written = database.execute('UPDATE sessions SET board = ?, score = ?, version = ?, expiry = ? '
+                                           'WHERE id = ? AND version = ? AND expiry > ?',
+                                           (format(board, 'x'), score, game[4] + 1, now + self.ttl, sessionId, game[4], now)).rowcount
+            if written != 1:
+                game[4] = -1
+                return False
+        game[1], game[2], game[4] = board, score, game[4] + 1
+        return True
+
+store = SessionStore(CAPACITY, TTL, DATABASE)
+
+#a forked worker must not use its parent's SQLite connections, so it gets a store of its own
+def startSessions():
+    global store
+    store = SessionStore(CAPACITY, TTL, DATABASE)
+
+os.register_at_fork(after_in_child=startSessions)
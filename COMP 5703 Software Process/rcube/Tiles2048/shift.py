@@ -1,690 +1,282 @@
-import math
 import hashlib
 import random
+from functools import lru_cache
+import Tiles2048.bitboard as bitboard
+import Tiles2048.schema as schema
+import Tiles2048.metrics as metrics
+import Tiles2048.sessions as sessions
 
+MOVES_KEY = 'moves'
+MAX_MOVES = 4096
+MOVE_LETTERS = {'u': 'up', 'd': 'down', 'l': 'left', 'r': 'right'}
+SPAWN_KEY = 'spawn'
+SPAWN_MODES = ('random', 'hash')
+
+#the parameters a shift reads; together they make the key for the response cache
+SHIFT_KEYS = ('grid', 'score', 'integrity', 'direction', MOVES_KEY, SPAWN_KEY, 'size')
+CACHE_SIZE = 4096
+
+#spawn=hash makes the response depend only on the request, so those responses are cached
+#a retried request is answered from the cache without shifting or hashing again
+#a session shift plays on the game kept by the server (see sessions.py) and is never cached
 def _shift(userParms):
 
-    #keys to pull values from input parameters    
-    gridKey = 'grid'
-    integrityKey = 'integrity'
-    scoreKey = 'score'
-    directionKey = 'direction'
-    
-    #Values pulled from the input parameters
-    gridString = userParms.get(gridKey,'')
-    score = userParms.get(scoreKey, '')
-    integrity = userParms.get(integrityKey, '')
-    direction = (userParms.get(directionKey, '')).lower()
-    
-    #populates a 4x4 matrix with the values from the input grid string
+    if sessions.selected(userParms):
+        return shiftSession(userParms)
+    if userParms.get(SPAWN_KEY, None) == 'hash':
+        key = tuple([(name, userParms[name]) for name in SHIFT_KEYS if name in userParms])
+        return dict(cachedShift(key))
+    return shiftBoard(userParms)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def cachedShift(key):
+    return shiftBoard(dict(key))
+
+def shiftBoard(userParms):
+
+    try:
+        values = metrics.exclusive('validate', validateShift, userParms)
+    except ValueError as e:
+        status = 'error: ' + str(e)
+        return {'status': status}
     
+#---------------------------------------
+#Now begins the actual shift of the grid
+#---------------------------------------
+
+    engine = boardEngine(values['size'])
+    board, score, status, applied = playMoves(engine, values['board'], values['score'], values[MOVES_KEY], values['rng'])
+
+    #the integrity is only calculated once, after every move
+    score = str(score)
+    newGridString = engine.toGridString(board)
+    start = metrics.clock()
+    newIntegrity = calculateIntegrity(newGridString, score)
+    metrics.observePhase('hash', metrics.clock() - start)
+
+    #return shifted grid
+    result = {'grid': newGridString, 'score': score, 'integrity': newIntegrity, 'status': status}
+    if userParms.get(MOVES_KEY, None) != None:
+        result[MOVES_KEY] = str(applied)
+    return result
+
+#every move is played on the board and returns (board, score, status, moves applied)
+#the shift and spawn times are added up over the moves and recorded once
+def playMoves(engine, board, score, moves, rng):
+
+    applied = 0
+    status = 'ok'
+
+    #with metrics off nothing is timed
+    if not metrics.ENABLED:
+        for direction in moves:
+            board, gained = engine.MOVES[direction](board)
+            score += gained
+            board, status = settleBoard(board, rng, engine)
+            applied += 1
+            if status != 'ok':
+                break
+        return board, score, status, applied
+
+    shiftSeconds = 0.0
+    spawnSeconds = 0.0
+    clock = metrics.clock
+    for direction in moves:
+        start = clock()
+        board, gained = engine.MOVES[direction](board)
+        moved = clock()
+        score += gained
+        board, status = settleBoard(board, rng, engine)
+        shiftSeconds += moved - start
+        spawnSeconds += clock() - moved
+        applied += 1
+
+        #there is no point playing on once the game is won or lost
+        if status != 'ok':
+            break
+    metrics.observePhase('shift', shiftSeconds)
+    metrics.observePhase('spawn', spawnSeconds)
+    return board, score, status, applied
+
+#plays on a game kept by the server; the response carries the grid and score but no integrity
+def shiftSession(userParms):
+
+    try:
+        values = metrics.exclusive('validate', validateSessionShift, userParms)
+    except ValueError as e:
+        status = 'error: ' + str(e)
+        return {'status': status}
+
+    sessionId = userParms[sessions.SESSION_KEY]
+
+    def play(board, score, size):
+        engine = boardEngine(size)
+        rng = random
+        if values[SPAWN_KEY] == 'hash':
+            rng = HashSpawn('.'.join([sessionId, format(board, 'x'), str(score)]))
+        board, score, status, applied = playMoves(engine, board, score, values[MOVES_KEY], rng)
+        result = {'grid': engine.toGridString(board), 'score': str(score), 'session': sessionId, 'status': status}
+        if userParms.get(MOVES_KEY, None) != None:
+            result[MOVES_KEY] = str(applied)
+        return (board, score), result
+
+    result = sessions.store.update(sessionId, play)
+    if result == None:
+        return {'status': sessions.ERROR}
+    return result
+
 #--------------------------------    
 #Checking for invalid grid inputs
 #--------------------------------
 
+#4x4 boards keep the full move tables in the bitboard module; other sizes get a bitboard.Engine
+def boardEngine(size):
+    if size == bitboard.SIZE:
+        return bitboard
+    return bitboard.engine(size)
+
+def parseBoard(gridString, size=bitboard.SIZE):
+    start = metrics.clock()
+    board = boardEngine(size).parseGrid(gridString)
+    metrics.observePhase('parse', metrics.clock() - start)
+    return board
+
+#the integrity the client should have sent for its grid and score
+def expectedIntegrity(userParms):
+    start = metrics.clock()
+    integrity = calculateIntegrity(userParms.get('grid', ''), userParms.get('score', ''))
+    metrics.observePhase('hash', metrics.clock() - start)
+    return integrity
+
+#sets the list of directions to play: the moves value (e.g. 'llurd') when given, otherwise just direction
+def readMoves(userParms, values):
+
+    moves = userParms.get(MOVES_KEY, None)
+    if moves == None:
+        values[MOVES_KEY] = [values['direction']]
+        return
+
+    moves = moves.lower()
+    if moves == '' or len(moves) > MAX_MOVES:
+        raise ValueError('invalid moves - expected 1 to ' + str(MAX_MOVES) + ' moves')
+
+    try:
+        values[MOVES_KEY] = [MOVE_LETTERS[letter] for letter in moves]
+    except KeyError:
+        raise ValueError('invalid moves - use only u, d, l and r')
+
+#sets the random source for new numbers: the random module, or a HashSpawn seeded from the request
+def readSpawn(userParms, values):
+
+    if values[SPAWN_KEY] == 'random':
+        values['rng'] = random
+        return
+
+    seed = '.'.join([userParms.get('grid', ''), userParms.get('score', ''), userParms.get('integrity', '')])
+    values['rng'] = HashSpawn(seed)
+
+#grid, score and integrity are checked the same way by every op that is given a game
+GRID_RULES = [
     #checks if the grid input value is empty
-    if gridString == None:
-        status = 'error: missing grid'
-        return {'status': status}
-    
+    schema.required('grid', 'missing grid'),
     #checks if the score input value is empty
-    if score == None or score == '':
-        status = 'error: missing score'
-        return {'status': status}
-    
-    #checks if the direction input value is empty
-    if direction == None or direction == '':
-        direction = 'down'
-
-    #checks to make sure there are no letters in the grid value    
-    if gridString.isdigit() == False:
-        status = 'error: invalid grid - contains invalid character'
-        return {'status': status}
-        
-     #checks to make sure there are no letters in the score value and it's not less than zero    
-    if score.isdigit() == False or int(score) < 0:
-        status = 'error: invalid score - score negative or contains invalid character'
-        return {'status': status}
- 
-    #makes sure the score is of a proper format (multiple of 2)   
-    if int(score) % 2 != 0:
-        status = 'error: invalid score - not divisible by 2'
-        return {'status': status}
-    
+    schema.required('score', 'missing score', blank=False),
+    #checks to make sure there are no letters in the grid value
+    schema.digits('grid', 'invalid grid - contains invalid character'),
+    #checks to make sure there are no letters in the score value and it's not less than zero
+    schema.integer('score', 'invalid score - score negative or contains invalid character'),
+    #makes sure the score is of a proper format (multiple of 2)
+    schema.even('score', 'invalid score - not divisible by 2'),
     #checks to make sure the incoming integrity value is correct
-    initialIntegrityString = gridString + "." + score        
-    myHash = hashlib.sha256()
-    myHash.update(initialIntegrityString.encode())
-    expectedIntegrity = myHash.hexdigest().upper()
-    
-    if expectedIntegrity != integrity:
-        status = 'error: bad integrity value'
-        return {'status': status}
-    
-    #checks to make direction value is one of the 4 valid options
-    if direction != 'up' and direction != 'down' and direction != 'right' and direction != 'left':
-        status = 'error: invalid direction'
-        return {'status': status}
+    schema.matches('integrity', expectedIntegrity, 'bad integrity value'),
+    ]
 
-#-----------------------------------------------------------------------
-#parse the grid to put it into a matrix for further checks before shift!
-#-----------------------------------------------------------------------
-    grid = parseGridStringInitial(gridString)
- 
-    #checks if the grid contains valid numbers after the parse that are of a power of 2
-    if grid == None:
-        status = 'error: missing grid'  
-        return {'status': status} 
-    
-    #checks to make sure the grid is 4x4 and no rows or columns are missing an element
-    numOfElements = 0
-    for row in grid:
-        numOfElements += len(row)
-    
-    if numOfElements != 16:
-        status = 'error: invalid grid - not enough characters'
-        return {'status': status}
-    
-#---------------------------------------
-#Now begins the actual shift of the grid
-#---------------------------------------
+DIRECTION = schema.choice('direction', ('up', 'down', 'right', 'left'), 'invalid direction', 'down', lower=True)
+
+#returns {size, grid, score, direction, board, moves, spawn, rng}
+validateShift = schema.compileSchema([schema.SIZE] + GRID_RULES + [
+    DIRECTION,
+    schema.derive('board', parseBoard, 'grid', 'size'),
+    schema.custom(readMoves),
+    schema.choice(SPAWN_KEY, SPAWN_MODES, 'invalid spawn - expected random or hash', 'random'),
+    schema.custom(readSpawn),
+    ])
 
-    if direction == 'up':
-        return shiftUp(grid, score, gridString, integrity)
-        
-    elif direction == 'down':
-        return shiftDown(grid, score, gridString, integrity)
-        
-    elif direction == 'right':
-        return shiftRight(grid, score, gridString, integrity)
-        
-    elif direction == 'left':
-        return shiftLeft(grid, score, gridString, integrity)
+#a shift on a kept game only reads how to play; returns {direction, moves, spawn}
+validateSessionShift = schema.compileSchema([
+    DIRECTION,
+    schema.custom(readMoves),
+    schema.choice(SPAWN_KEY, SPAWN_MODES, 'invalid spawn - expected random or hash', 'random'),
+    ])
+
+#one 4x4 move, as played by shiftBatch; returns {grid, score, direction, board}
+validateBoardShift = schema.compileSchema(GRID_RULES + [
+    DIRECTION,
+    schema.derive('board', parseBoard, 'grid'),
+    ])
 
 #-----------------------------------------------------
 #These are supporting functions for the shift function
 #-----------------------------------------------------
 
-#This is used to populate the matrix by checking the values being entered are a power of 2
-def checkNumPowerOfTwo(num):
+#a counter-based random source: draw n is taken from SHA-256 of the seed and n
+#the same seed gives the same draws on any node, so identical requests get identical boards
+class HashSpawn:
 
-    #zero is a valid value even though it's technically not a power of 2
-    if num == '0':
-        return True
-    
-    #even though 1 is technically a power of 2, we don't want to include it (our values start at 2)
-    if num == '1':
-        return False
-    
-    x = (math.log10(int(num)) / math.log10(2))
-    return (math.ceil(x) == math.floor(x))
-    
-#this parses through the grid string and puts the values into a matrix
-#this parse is done after the grid has been shifted (i.e. 2048 is a valid number)
-def parseGridStringAfterShift(gridString):
-    
-    #start with an empty grid
-    grid = []
-    row = []
-    i = 0
-    #parse through each number to see if it is a power of 2
-    #if not, we continue concatenating that number until we get a number that is 4 characters long (2048 is largest possible)
-    #if that's a valid number, great we continue! if not, we have an invalid grid (contains number that's not a power of 2) 
-    #the numbers 256, 1024, and 2048 are special cases because parts of them are a power of 2 and they may not
-    #be processed correctly
-    #---------------------------------------------------------------------------------------
-    #this is a LARGE nested if/else statement mess. I may need to refactor and clean this up
-    #---------------------------------------------------------------------------------------  
-    while (i <= (len(gridString) - 1)):
-        num = gridString[i]
-        if checkNumPowerOfTwo(num):
-            if(num != '0' and (i + 1) <= (len(gridString) - 1) and checkNumPowerOfTwo((num + gridString[i + 1]))):
-                row.append(num + gridString[i + 1])
-                i += 2
-            elif(num != '0' and (i + 1) <= (len(gridString) - 1) and (i + 2) <= (len(gridString) - 1) \
-                     and checkNumPowerOfTwo((num + gridString[i + 1] + gridString[i + 2]))):
-                row.append(num + gridString[i + 1] + gridString[i + 2])
-                i += 3
-            elif(num != '0' and (i + 1) <= (len(gridString) - 1) and (i + 2) <= (len(gridString) - 1) \
-                    and (i + 3) <= (len(gridString) - 1) \
-                    and checkNumPowerOfTwo((num + gridString[i + 1] + gridString[i + 2] + gridString[i + 3]))):
-                row.append(num + gridString[i + 1] + gridString[i + 2] + gridString[i + 3])
-                i += 4
-            else:
-                row.append(num)
-                i += 1
-            if len(row) == 4:
-                grid.append(row)
-                row = []
-        else:
-            if (i + 1) <= (len(gridString) - 1):
-                i += 1
-                num = num + gridString[i]
-            else:
-                grid = None
-                break
-                
-            if checkNumPowerOfTwo(num):
-                row.append(num)
-                i += 1
-                if len(row) == 4:
-                    grid.append(row)
-                    row = []
-            else:
-                if (i + 1) <= (len(gridString) - 1):
-                    i += 1
-                    num = num + gridString[i]
-                    
-                else:
-                    grid = None
-                    break
-                    
-                if checkNumPowerOfTwo(num):
-                    row.append(num)
-                    i += 1
-                    if len(row) == 4:
-                        grid.append(row)
-                        row = []
-                        
-                else:
-                    if (i + 1) <= (len(gridString) - 1):
-                        i += 1
-                        num = num + gridString[i]
-                    
-                    else:
-                        grid = None
-                        break
-                        
-                    if checkNumPowerOfTwo(num):
-                        row.append(num)
-                        i += 1
-                        if len(row) == 4:
-                            grid.append(row)
-                            row = []
-                            
-                    else:
-                        grid = None
-                        break                
-    return grid
-
-def parseGridStringInitial(gridString):
-    
-    #start with an empty grid
-    grid = []
-    row = []
-    i = 0
-    #parse through each number to see if it is a power of 2
-    #if not, we continue concatenating that number until we get a number that is 4 characters long (2048 is largest possible)
-    #if that's a valid number, great we continue! if not, we have an invalid grid (contains number that's not a power of 2) 
-    #the numbers 256, 1024, and 2048 are special cases because parts of them are a power of 2 and they may not
-    #be processed correctly
-    #---------------------------------------------------------------------------------------
-    #this is a LARGE nested if/else statement mess. I may need to refactor and clean this up
-    #---------------------------------------------------------------------------------------  
-    while (i <= (len(gridString) - 1)):
-        num = gridString[i]
-        if checkNumPowerOfTwo(num):
-            if(num != '0' and (i + 1) <= (len(gridString) - 1) and checkNumPowerOfTwo((num + gridString[i + 1]))):
-                row.append(num + gridString[i + 1])
-                i += 2
-            elif(num != '0' and (i + 1) <= (len(gridString) - 1) and (i + 2) <= (len(gridString) - 1) \
-                     and checkNumPowerOfTwo((num + gridString[i + 1] + gridString[i + 2]))):
-                row.append(num + gridString[i + 1] + gridString[i + 2])
-                i += 3
-            elif(num != '0' and (i + 1) <= (len(gridString) - 1) and (i + 2) <= (len(gridString) - 1) \
-                    and (i + 3) <= (len(gridString) - 1) \
-                    and checkNumPowerOfTwo((num + gridString[i + 1] + gridString[i + 2] + gridString[i + 3]))) \
-                    and (num + gridString[i + 1] + gridString[i + 2] + gridString[i + 3]) != '2048':
-                row.append(num + gridString[i + 1] + gridString[i + 2] + gridString[i + 3])
-                i += 4
-            else:
-                row.append(num)
-                i += 1
-            if len(row) == 4:
-                grid.append(row)
-                row = []
-        else:
-            if (i + 1) <= (len(gridString) - 1):
-                i += 1
-                num = num + gridString[i]
-            else:
-                grid = None
-                break
-                
-            if checkNumPowerOfTwo(num):
-                row.append(num)
-                i += 1
-                if len(row) == 4:
-                    grid.append(row)
-                    row = []
-            else:
-                if (i + 1) <= (len(gridString) - 1):
-                    i += 1
-                    num = num + gridString[i]
-                    
-                else:
-                    grid = None
-                    break
-                    
-                if checkNumPowerOfTwo(num):
-                    row.append(num)
-                    i += 1
-                    if len(row) == 4:
-                        grid.append(row)
-                        row = []
-                        
-                else:
-                    if (i + 1) <= (len(gridString) - 1):
-                        i += 1
-                        num = num + gridString[i]
-                    
-                    else:
-                        grid = None
-                        break
-                        
-                    if checkNumPowerOfTwo(num):
-                        row.append(num)
-                        i += 1
-                        if len(row) == 4:
-                            grid.append(row)
-                            row = []
-                            
-                    else:
-                        grid = None
-                        break                
-    return grid
- 
-#this function adds a random 2 or 4 to and empty space in the grid (each with equal chance)          
-def insertNewNumber(grid):
-    
-    values= ['2', '4']
-    
-    #need to randomize an index number between 0 and 15
-    randomColumnIndex = random.randint(0, 3)
-    randomRowIndex = random.randint(0, 3)
-    
-    #we need to input this value in an empty space 
-    #we need to first check there is an empty space or we'll be here forever
-    
-    if emptySpace(grid):
-            while grid[randomRowIndex][randomColumnIndex] != '0':
-                randomColumnIndex = random.randint(0, 3)
-                randomRowIndex = random.randint(0, 3)
-            grid[randomRowIndex][randomColumnIndex] = random.choice(values)
-        
-    else:
-        _shift.status = 'lose'
-
-#this function will parse the matrix to determine if there are any empty spaces (with value '0')    
-def emptySpace(grid):
-    
-    for row in grid:
-        for num in row:
-            if num == '0':
-                return True
-    return False
-
-#-----------------------------------------
-#below are the methods that shift the grid
-#-----------------------------------------
-
-#this method shifts the grid left and handles any resulting collisions        
-def shiftLeft(grid, score, gridString, integrity):
-    
-    score = int(score)
-
-    i = 0
-    #need to shift all values to the left as well as merge and update score
-    for row in grid:
-          
-    #first we handle collisions
-    #order is very important!
-        
-        if row[i] == row [i + 1] and row[i] != '0' and row [i + 1] != '0':
-            
-            row[i] = str(int(row[i]) + int(row [i + 1]))
-            row[i + 1] = '0'
-            score += int(row[i])
-            
-        elif row[i] == row[i + 2] and row[i] != '0' and row[i + 2] != '0' and row[i + 1] == '0':
-                
-            row[i] = str(int(row[i]) + int(row [i + 2]))
-            row[i + 2] = '0'
-            score += int(row[i])
-                
-        elif row[i] == row[i + 3] and row[i] != '0' and row[i + 3] != '0' and row[i + 1] == '0' and row[i + 2] == '0':
-                
-            row[i] = str(int(row[i]) + int(row [i + 3]))
-            row[i + 3] = '0'
-            score += int(row[i])
-            
-        if row[i + 1] == row[i + 2] and row[i + 1] != '0' and row[i + 2] != '0':
-            
-            row[i + 1] = str(int(row[i + 1]) + int(row [i + 2]))
-            row[i + 2] = '0'
-            score += int(row[i + 1])
-            
-        elif row[i + 1] == row[i + 3] and row[i + 1] != '0' and row[i + 3] != '0' and row[i + 2] == '0':
-            row[i + 1] = str(int(row[i + 1]) + int(row [i + 3]))
-            row[i + 3] = '0'
-            score += int(row[i + 1])
-                  
-        if row[i + 2] == row[i + 3] and row[i + 2] != '0' and row[i + 3] != '0':
-                
-            row[i + 2] = str(int(row[i + 2]) + int(row [i + 3]))
-            row[i + 3] = '0'
-            score += int(row[i + 2])      
-              
-    #Everything now needs to be shifted over so there's no rogue 0's
-    for row in grid:
-        if row[i] == '0' and row [i + 1] != '0':
-            row [i] = row[i + 1]
-            row[i + 1] = '0'
-        elif row[i] == '0' and row [i + 2] != '0':
-            row[i] = row[i + 2]
-            row[i + 2] = '0'
-        elif row[i] == '0' and row[i + 3] != '0':
-            row[i] = row[i + 3]
-            row[i + 3] = '0'
-            
-        if row[i + 1] == '0' and row [i + 2] != '0':
-            row [i + 1] = row[i + 2]
-            row[i + 2] = '0'
-        elif row[i + 1] == '0' and row [i + 3] != '0':
-            row[i + 1] = row[i + 3]
-            row[i + 3] = '0'
-            
-        if row[i + 2] == '0' and row [i + 3] != '0':
-            row [i + 2] = row[i + 3]
-            row[i + 3] = '0'         
- 
-    #if one of the slots is 2048, the game is won
-    status = ''
-    for row in grid:
-        for num in row:
-            if num == '2048':
-                status = 'win'
-                result = {'grid': gridString, 'score': score, 'integrity': integrity, 'status': status}
-                return result 
-                          
-    #now we need to insert a new random 2 or 4           
-    insertNewNumber(grid)
-    
-    #now we need to turn the matrix back into a string so we can calculate integrity
-    newGridString = ''
-    
-    for row in grid:
-        for num in row:
-            newGridString += str(num)
-            
-    score = str(score)        
-    #calculate new integrity value      
-    newIntegrityString = newGridString + "." + score        
-    myHash = hashlib.sha256()
-    myHash.update(newIntegrityString.encode())
-    newIntegrity = myHash.hexdigest().upper()
-    
-    #need to update the status of the game
-                
-    #there is still and empty space so the game is not over
-    if emptySpace(grid):
-        status = 'ok'   
-            
-    if newGridString == gridString:
-        status = 'lose'
+    def __init__(self, seed):
+        self.seed = hashlib.sha256(seed.encode()).digest()
+        self.counter = 0
 
-    #return shifted grid
-    result = {'grid': newGridString, 'score': score, 'integrity': newIntegrity, 'status': status}
-    return result     
+    def randrange(self, stop):
+        draw = hashlib.sha256(self.seed + self.counter.to_bytes(8, 'little')).digest()
+        self.counter += 1
+        return int.from_bytes(draw[:8], 'little') % stop
 
-#this method shifts the grid right and handles any resulting collisions
-def shiftRight(grid, score, gridString, integrity): 
-    
-    score = int(score)
-    i = 3
-    #need to shift all values to the left as well as merge and update score
-    for row in grid:
-            
-    #first we handle collisions
-    #order is very important!
-            
-        if row[i] == row [i - 1] and row[i] != '0' and row [i - 1] != '0':
-                
-                row[i - 1] = str(int(row[i]) + int(row [i - 1]))
-                row[i] = '0'
-                score += int(row[i - 1]) 
-                
-        elif row[i] == row[i - 2] and row[i] != '0' and row[i - 2] != '0' and row[i - 1] == '0':
-                
-                row[i - 2] = str(int(row[i]) + int(row [i - 2]))
-                row[i] = '0'
-                score += int(row[i - 2])
-                
-        elif row[i] == row[i - 3] and row[i] != '0' and row[i - 3] != '0' and row[i - 1] == '0' and row[i - 2] == '0':
-                
-                row[i - 3] = str(int(row[i]) + int(row [i - 3]))
-                row[i] = '0'
-                score += int(row[i - 3])
-                    
-        if row[i - 1] == row[i - 2] and row[i - 1] != '0' and row[i - 2] != '0':
-                
-                row[i - 2] = str(int(row[i - 1]) + int(row [i - 2]))
-                row[i - 1] = '0'
-                score += int(row[i - 2]) 
-                    
-        elif row[i - 1] == row[i - 3] and row[i - 1] != '0' and row[i - 3] != '0' and row[i - 2] == '0':
-            
-                row[i - 3] = str(int(row[i - 1]) + int(row [i - 3]))
-                row[i - 1] = '0'
-                score += int(row[i - 3])
-                      
-        if row[i - 2] == row[i - 3] and row[i - 2] != '0' and row[i - 3] != '0':
-                
-                row[i - 3] = str(int(row[i - 2]) + int(row [i - 3]))
-                row[i - 2] = '0'
-                score += int(row[i - 3])    
-                    
-    #Everything now needs to be shifted over so there's no rogue 0's
-    for row in grid:
-        
-        if row[i] == '0' and row [i - 1] != '0':
-            row [i] = row[i - 1]
-            row[i - 1] = '0'
-        elif row[i] == '0' and row [i - 2] != '0':
-            row[i] = row[i - 2]
-            row[i - 2] = '0'
-        elif row[i] == '0' and row[i - 3] != '0':
-            row[i] = row[i - 3]
-            row[i - 3] = '0'
-            
-        if row[i - 1] == '0' and row [i - 2] != '0':
-            row [i - 1] = row[i - 2]
-            row[i - 2] = '0'
-        elif row[i - 1] == '0' and row [i - 3] != '0':
-            row[i - 1] = row[i - 3]
-            row[i - 3] = '0'
-            
-        if row[i - 2] == '0' and row [i - 3] != '0':
-            row [i - 2] = row[i - 3]
-            row[i - 3] = '0'         
-        
-    #now we need to insert a new random 2 or 4           
-    insertNewNumber(grid)
-    
-    #now we need to turn the matrix back into a string so we can calculate integrity
-    newGridString = ''
-    
-    for row in grid:
-        for num in row:
-            newGridString += str(num)
-            
-    score = str(score)        
-    #calculate new integrity value      
-    newIntegrityString = newGridString + "." + score        
-    myHash = hashlib.sha256()
-    myHash.update(newIntegrityString.encode())
-    newIntegrity = myHash.hexdigest().upper()
-    
-    #need to update the status of the game
-    
-    #if one of the slots is 2048, the game is won
-    status = ''
-    for row in grid:
-        for num in row:
-            if num == '2048':
-                status = 'win'
-                result = {'grid': newGridString, 'score': score, 'integrity': integrity, 'status': status}
-                return result
-                
-    #there is still and empty space so the game is not over
-    if emptySpace(grid):
-        status = 'ok'   
-            
-    if newGridString == gridString:
-        status = 'lose' 
-    
-    #return shifted grid
-    result = {'grid': newGridString, 'score': score, 'integrity': newIntegrity, 'status': status}
-    return result   
+#adds the new number after a move and returns (board, status)
+def settleBoard(board, rng=random, engine=bitboard):
 
-#this method shifts the grid up and handles any resulting collisions
-def shiftUp(grid, score, gridString, integrity): 
-    
-    #shifting up is the same result if the grid is tilted on it's side so the right side becomes the bottom side
-    #and then shifting right and then tilting the grid back
-    
-    originalGrid = grid
-    score = score
-    gridString = gridString
-    integrity = integrity
-    
-    tiltedGrid = [[0] * 4 for _ in range(4)]
-    
-    #tilting the grid manually
-    tiltedGrid[0][0] = originalGrid[3][0]; tiltedGrid[0][1] = originalGrid[2][0]; tiltedGrid[0][2] = originalGrid[1][0] 
-    tiltedGrid[0][3] = originalGrid[0][0]; tiltedGrid[1][0] = originalGrid[3][1]; tiltedGrid[1][1] = originalGrid[2][1]
-    tiltedGrid[1][2] = originalGrid[1][1]; tiltedGrid[1][3] = originalGrid[0][1]; tiltedGrid[2][0] = originalGrid[3][2]
-    tiltedGrid[2][1] = originalGrid[2][2]; tiltedGrid[2][2] = originalGrid[1][2]; tiltedGrid[2][3] = originalGrid[0][2]
-    tiltedGrid[3][0] = originalGrid[3][3]; tiltedGrid[3][1] = originalGrid[2][3]; tiltedGrid[3][2] = originalGrid[1][3]
-    tiltedGrid[3][3] = originalGrid[0][3]
-    
-    
-    #now we use the tilted grid and call shiftRight
-    #we're going to pass in the gridString, but we're going to have to recalculate it anyways after we tilt the grid back
-    tiltedResult = shiftRight(tiltedGrid, score, gridString, integrity)
-    
-    gridKey = 'grid'
-    scoreKey = 'score'
-    statusKey = 'status'
-    
-    tiltedGridString = tiltedResult.get(gridKey,'')
-    finalScore = str(tiltedResult.get(scoreKey, ''))
-    status = tiltedResult.get(statusKey, '')
-    
-    #the score can stay the same, but the gridString, status, and integrity will have to be calculate again
-    #after we tilt the grid back
-    
-    #from here we need to first put the gridString back into a matrix and shift it back
-    
-    tiltedGrid = parseGridStringAfterShift(tiltedGridString)
-    finalGrid = grid = [[0] * 4 for _ in range(4)]
-    
-    finalGrid[0][0] = tiltedGrid[0][3]; finalGrid[0][1] = tiltedGrid[1][3]; finalGrid[0][2] = tiltedGrid[2][3] 
-    finalGrid[0][3] = tiltedGrid[3][3]; finalGrid[1][0] = tiltedGrid[0][2]; finalGrid[1][1] = tiltedGrid[1][2]
-    finalGrid[1][2] = tiltedGrid[2][2]; finalGrid[1][3] = tiltedGrid[3][2]; finalGrid[2][0] = tiltedGrid[0][1]
-    finalGrid[2][1] = tiltedGrid[1][1]; finalGrid[2][2] = tiltedGrid[2][1]; finalGrid[2][3] = tiltedGrid[3][1]
-    finalGrid[3][0] = tiltedGrid[0][0]; finalGrid[3][1] = tiltedGrid[1][0]; finalGrid[3][2] = tiltedGrid[2][0]
-    finalGrid[3][3] = tiltedGrid[3][0]
-    
-    #now we need to convert the matrix into a string and recalculate integrity
-    
-    finalGridString = ''
-    
-    for row in grid:
-        for num in row:
-            finalGridString += str(num)
-            
-    if finalGridString == gridString:
-        status = 'lose'
-           
-    #calculate new integrity value      
-    newIntegrityString = finalGridString + "." + finalScore        
-    myHash = hashlib.sha256()
-    myHash.update(newIntegrityString.encode())
-    finalIntegrity = myHash.hexdigest().upper() 
-    
-    #finally, we need to return the shifted grid
-    #return shifted grid
-    result = {'grid': finalGridString, 'score': finalScore, 'integrity': finalIntegrity, 'status': status}
-    return result
-    
+    #if one of the slots is 2048, the game is won and no new number is added
+    if bitboard.maxExponent(board) >= bitboard.WIN_EXPONENT:
+        return board, 'win'
 
-#this method shifts the grid down and handles and resulting collisions
-def shiftDown(grid, score, gridString, integrity): 
-    
-    #shifting down is the same result if the grid is tilted on it's side so the right side becomes the bottom side
-    #and then shifting left and then tilting the grid back   
-           
-    originalGrid = grid
-    score = score
-    gridString = gridString
-    
-    tiltedGrid = [[0] * 4 for _ in range(4)]
-    
-    #tilting the grid manually
-    tiltedGrid[0][0] = originalGrid[3][0]; tiltedGrid[0][1] = originalGrid[2][0]; tiltedGrid[0][2] = originalGrid[1][0] 
-    tiltedGrid[0][3] = originalGrid[0][0]; tiltedGrid[1][0] = originalGrid[3][1]; tiltedGrid[1][1] = originalGrid[2][1]
-    tiltedGrid[1][2] = originalGrid[1][1]; tiltedGrid[1][3] = originalGrid[0][1]; tiltedGrid[2][0] = originalGrid[3][2]
-    tiltedGrid[2][1] = originalGrid[2][2]; tiltedGrid[2][2] = originalGrid[1][2]; tiltedGrid[2][3] = originalGrid[0][2]
-    tiltedGrid[3][0] = originalGrid[3][3]; tiltedGrid[3][1] = originalGrid[2][3]; tiltedGrid[3][2] = originalGrid[1][3]
-    tiltedGrid[3][3] = originalGrid[0][3]
-    
-    
-    #now we use the tilted grid and call shiftLeft
-    #we're going to pass in the gridString, but we're going to have to recalculate it anyways after we tilt the grid back
-    tiltedResult = shiftLeft(tiltedGrid, score, gridString, integrity)
-    
-    gridKey = 'grid'
-    scoreKey = 'score'
-    statusKey = 'status'
-    
-    tiltedGridString = tiltedResult.get(gridKey,'')
-    finalScore = str(tiltedResult.get(scoreKey, ''))
-    status = tiltedResult.get(statusKey, '')
-    
-    #the score can stay the same, but the gridString, status, and integrity will have to be calculate again
-    #after we tilt the grid back
-    
-    #from here we need to first put the gridString back into a matrix and shift it back
-    
-    tiltedGrid = parseGridStringAfterShift(tiltedGridString)
-    finalGrid = grid = [[0] * 4 for _ in range(4)]
-    
-    finalGrid[0][0] = tiltedGrid[0][3]; finalGrid[0][1] = tiltedGrid[1][3]; finalGrid[0][2] = tiltedGrid[2][3] 
-    finalGrid[0][3] = tiltedGrid[3][3]; finalGrid[1][0] = tiltedGrid[0][2]; finalGrid[1][1] = tiltedGrid[1][2]
-    finalGrid[1][2] = tiltedGrid[2][2]; finalGrid[1][3] = tiltedGrid[3][2]; finalGrid[2][0] = tiltedGrid[0][1]
-    finalGrid[2][1] = tiltedGrid[1][1]; finalGrid[2][2] = tiltedGrid[2][1]; finalGrid[2][3] = tiltedGrid[3][1]
-    finalGrid[3][0] = tiltedGrid[0][0]; finalGrid[3][1] = tiltedGrid[1][0]; finalGrid[3][2] = tiltedGrid[2][0]
-    finalGrid[3][3] = tiltedGrid[3][0]
-    
-    #now we need to convert the matrix into a string and recalculate integrity
-    
-    finalGridString = ''
-    
-    for row in grid:
-        for num in row:
-            finalGridString += str(num)
-            
-    if finalGridString == gridString:
-        status = 'lose'
-            
-    #calculate new integrity value      
-    newIntegrityString = finalGridString + "." + finalScore        
+    #now we need to insert a new random 2 or 4
+    board = insertNewNumber(board, rng, engine)
+
+    #the game is only lost once no direction can change the grid
+    if engine.canMove(board):
+        return board, 'ok'
+    return board, 'lose'
+
+#this function adds a random 2 or 4 to an empty space in the board (each with equal chance)
+#one draw picks both the cell (uniformly from the empty-cell mask) and the tile
+#rng can be any random.Random so simulations can be repeated
+def insertNewNumber(board, rng=random, engine=bitboard):
+
+    #on a 4x4 board the chosen cell is found by table lookups on the gathered empty-cell flags
+    if engine is bitboard:
+        flags = bitboard.emptyFlags(board)
+        if flags == 0:
+            return board
+        draw = rng.randrange(2 * (bitboard.COUNT_BYTE[flags & 0xFF] + bitboard.COUNT_BYTE[flags >> 8]))
+        return board | ((1 + (draw & 1)) << (4 * bitboard.selectFlag(flags, draw >> 1)))
+
+    empty = engine.emptyMask(board)
+
+    #a full board has nowhere to put the new number
+    if empty == 0:
+        return board
+
+    draw = rng.randrange(2 * bin(empty).count('1'))
+
+    #other sizes drop the lowest empty cells until the chosen one is the lowest left
+    for _ in range(draw >> 1):
+        empty &= empty - 1
+    position = (empty & -empty).bit_length() - 1
+
+    return board | ((1 + (draw & 1)) << position)
+
+#the integrity value is the uppercase SHA-256 hex digest of grid + "." + score
+def calculateIntegrity(gridString, score):
     myHash = hashlib.sha256()
-    myHash.update(newIntegrityString.encode())
-    finalIntegrity = myHash.hexdigest().upper() 
-    
-    #finally, we need to return the shifted grid
-    #return shifted grid
-    result = {'grid': finalGridString, 'score': finalScore, 'integrity': finalIntegrity, 'status': status}
-    return result
\ No newline at end of file
+    myHash.update((gridString + "." + score).encode())
+    return myHash.hexdigest().upper()
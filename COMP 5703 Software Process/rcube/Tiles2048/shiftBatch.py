@@ -0,0 +1,114 @@
+import json
+import Tiles2048.bitboard as bitboard
+import Tiles2048.shift as shift
+import Tiles2048.metrics as metrics
+
+MAX_BOARDS = 10000
+
+#shifts many boards in one request
+#boards is a list (or a JSON array string) of {grid, score, integrity, direction} entries;
+#every entry gets its own result or error, in the same order
+#a GET only fits a few dozen boards in its query string; more are POSTed to /2048 as
+#[{"op": "shiftBatch", "boards": [...]}], where boards stays a JSON array
+def _shiftBatch(userParms):
+
+    boardsKey = 'boards'
+    entries = userParms.get(boardsKey, None)
+
+    if entries == None or entries == '':
+        return {'status': 'error: missing boards'}
+
+    if isinstance(entries, str):
+        try:
+            entries = json.loads(entries)
+        except ValueError:
+            return {'status': 'error: invalid boards - not a JSON array'}
+
+    if not isinstance(entries, list):
+        return {'status': 'error: invalid boards - not a JSON array'}
+
+    if len(entries) > MAX_BOARDS:
+        return {'status': 'error: invalid boards - more than ' + str(MAX_BOARDS) + ' boards'}
+
+    results = [None] * len(entries)
+    positions = []
+    verified = []
+    for position, entry in enumerate(entries):
+        try:
+            verified.append(entryParms(entry))
+        except ValueError as e:
+            results[position] = {'status': 'error: ' + str(e)}
+            continue
+        positions.append(position)
+
+    for position, result in zip(positions, shiftAll(verified)):
+        results[position] = result
+
+    return {'results': results, 'status': 'ok'}
+
+#shifts every entry (a dictionary of shift parameters) and returns one result per entry, in order
+#the boards are taken through one stage at a time; each stage is still one Python call per board,
+#so what the batch saves is the per-request work around the shift, not the shift itself
+def shiftAll(entries):
+
+    results = [None] * len(entries)
+
+    #---------------------------------------------------------------
+    #verify every entry; positions remembers where each good board goes
+    #---------------------------------------------------------------
+    positions = []
+    boards = []
+    scores = []
+    directions = []
+    for position, userParms in enumerate(entries):
+        try:
+            values = metrics.exclusive('validate', shift.validateBoardShift, userParms)
+        except ValueError as e:
+            results[position] = {'status': 'error: ' + str(e)}
+            continue
+        positions.append(position)
+        boards.append(values['board'])
+        scores.append(values['score'])
+        directions.append(values['direction'])
+
+    #------------------------------------------------------------
+    #each stage below is applied to every verified board in turn
+    #and is recorded once, with its mean time per board
+    #------------------------------------------------------------
+    start = metrics.clock()
+    moved = list(map(moveBoard, boards, directions))
+    scores = [str(score + gained) for score, (_, gained) in zip(scores, moved)]
+    shifted = metrics.clock()
+    settled = list(map(shift.settleBoard, [board for board, _ in moved]))
+    spawned = metrics.clock()
+    gridStrings = list(map(bitboard.toGridString, [board for board, _ in settled]))
+    signing = metrics.clock()
+    integrities = list(map(shift.calculateIntegrity, gridStrings, scores))
+
+    if boards:
+        count = len(boards)
+        metrics.observePhase('shift', (shifted - start) / count, count)
+        metrics.observePhase('spawn', (spawned - shifted) / count, count)
+        metrics.observePhase('hash', (metrics.clock() - signing) / count, count)
+
+    for i, position in enumerate(positions):
+        results[position] = {'grid': gridStrings[i], 'score': scores[i], 'integrity': integrities[i], 'status': settled[i][1]}
+
+    return results
+
+#entries may carry numbers (e.g. a JSON score), but the shift checks expect query strings;
+#a nested array or object (or true/false) has no query string form, so the entry is rejected
+def entryParms(entry):
+    if not isinstance(entry, dict):
+        raise ValueError('invalid board entry')
+    userParms = {}
+    for key, value in entry.items():
+        if value == None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError('invalid board entry - ' + str(key) + ' is not a string or number')
+        userParms[key] = str(value)
+    return userParms
+
+def moveBoard(board, direction):
+    return bitboard.MOVES[direction](board)
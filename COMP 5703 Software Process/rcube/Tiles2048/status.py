@@ -1,3 +1,66 @@
+import Tiles2048.bitboard as bitboard
+import Tiles2048.schema as schema
+import Tiles2048.shift as shift
+import Tiles2048.sessions as sessions
+
+#grid, score and integrity are checked exactly as for op=shift, but the grid may hold a 2048 tile
+validateStatus = schema.compileSchema(shift.GRID_RULES + [
+    schema.derive('board', lambda gridString: bitboard.parseGrid(gridString, allowWin=True), 'grid'),
+    ])
+
+#reports the state of a game without playing a move
+#session=<id> reports a game kept by the server instead of the grid given
 def _status(userParms):
-    result = {'status': 'status stub'}
+
+    if sessions.selected(userParms):
+        sessionId = userParms[sessions.SESSION_KEY]
+        game = sessions.store.get(sessionId)
+        if game == None:
+            return {'status': sessions.ERROR}
+        board, score, size = game
+        engine = shift.boardEngine(size)
+        result = boardStatus(board, engine)
+        result.update({'grid': engine.toGridString(board), 'score': str(score), 'session': sessionId})
+        return result
+
+    try:
+        board = validateStatus(userParms)['board']
+    except ValueError as e:
+        status = 'error: ' + str(e)
+        return {'status': status}
+
+    return boardStatus(board)
+
+#the status of many requests on given grids, for dispatch._dispatchBatch; requests with the same
+#grid, score and integrity are answered once
+def statusAll(userParmsList):
+
+    answered = {}
+    results = []
+    for userParms in userParmsList:
+        key = (userParms.get('grid', None), userParms.get('score', None), userParms.get('integrity', None))
+        if not all([isinstance(value, str) for value in key]):
+            results.append(_status(userParms))
+            continue
+        result = answered.get(key, None)
+        if result == None:
+            result = answered[key] = _status(userParms)
+        results.append(dict(result))
+    return results
+
+#{directions, maxTile, empty, status} of a board; engine is bitboard, or a bitboard.Engine for other sizes
+def boardStatus(board, engine=bitboard):
+
+    highest = engine.maxExponent(board)
+    directions = engine.legalMoves(board)
+
+    if highest >= bitboard.WIN_EXPONENT:
+        status = 'win'
+    elif directions:
+        status = 'ok'
+    else:
+        status = 'lose'
+
+    result = {'directions': directions, 'maxTile': bitboard.TILES[highest], 'empty': str(engine.emptyCount(board)),
+              'status': status}
     return result
@@ -0,0 +1,113 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+
+#-------------------------------------------------------------------------------
+#Prebuilt tables. Each set of 65,536-entry tables is built once into a packed
+#binary file and opened with mmap, so every process on the machine reads the
+#same physical pages instead of building and holding its own copy.
+#
+#A file is a header followed by the tables back to back:
+#    magic, format version, sha256 of the fingerprint, sha256 of the data, table count
+#The fingerprint describes what the tables were built from (e.g. the heuristic
+#weights and the code of the build functions), so changing either builds a new
+#file. A file that is missing, truncated or fails its checksum is rebuilt; if it
+#cannot be written, the built tables are used from memory.
+#
+#        python -m Tiles2048.tables        builds every table file ahead of time
+#-------------------------------------------------------------------------------
+
+ENTRIES = 65536
+MAGIC = b'T2048TBL'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sI32s32sI')
+
+#TILES2048_TABLES moves the files, e.g. to a writable directory when the app directory is read-only
+TABLE_DIR = os.getenv('TILES2048_TABLES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables'))
+
+#returns one indexable table per typecode in layout: views of the mapped file, or the built arrays
+#build() returns the arrays, in the order of layout, when the file has to be made
+def load(name, layout, fingerprint, build, directory=None):
+    path = os.path.join(directory or TABLE_DIR, name + '.bin')
+    tables = openTables(path, layout, fingerprint)
+    if tables != None:
+        return tables
+
+    built = build()
+    try:
+        writeTables(path, layout, fingerprint, built)
+    except OSError:
+        return built
+    return openTables(path, layout, fingerprint) or built
+
+#maps the file and checks it; returns None when it is missing or does not match
+def openTables(path, layout, fingerprint):
+    sizes = [array(code).itemsize * ENTRIES for code in layout]
+    try:
+        with open(path, 'rb') as tableFile:
+            mapped = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mapped) != HEADER.size + sum(sizes):
+        return None
+    magic, version, fingerprintDigest, dataDigest, count = HEADER.unpack_from(mapped, 0)
+    if (magic != MAGIC or version != FORMAT_VERSION or count != len(layout)
+            or fingerprintDigest != digest(fingerprint.encode())):
+        return None
+
+    view = memoryview(mapped)
+    if hashlib.sha256(view[HEADER.size:]).digest() != dataDigest:
+        return None
+
+    tables = []
+    offset = HEADER.size
+    for code, size in zip(layout, sizes):
+        tables.append(view[offset:offset + size].cast(code))
+        offset += size
+    return tables
+
+#writes to a temporary file first, so another process never maps a half-written file
+def writeTables(path, layout, fingerprint, tables):
+    data = b''.join([array(code, table).tobytes() for code, table in zip(layout, tables)])
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, digest(fingerprint.encode()), digest(data), len(layout))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary, 'wb') as tableFile:
+        tableFile.write(header)
+        tableFile.write(data)
+    os.replace(temporary, path)
+
+def digest(data):
+    return hashlib.sha256(data).digest()
+
+#a digest of the code of functions (bytecode, names and constants, nested code included), for a fingerprint:
+#tables built by code that has since changed are rebuilt rather than reused
+def codeFingerprint(*functions):
+    codeDigest = hashlib.sha256()
+    pending = [function.__code__ for function in functions]
+    while pending:
+        code = pending.pop(0)
+        codeDigest.update(code.co_code)
+        codeDigest.update(repr(code.co_names).encode())
+        for constant in code.co_consts:
+            if hasattr(constant, 'co_code'):
+                pending.append(constant)
+            else:
+                codeDigest.update(repr(constant).encode())
+    return codeDigest.hexdigest()
+
+#builds every table file; importing the engine modules loads (and, when needed, builds) their tables
+def main():
+    import Tiles2048.bitboard as bitboard
+    import Tiles2048.heuristic as heuristic
+    heuristic.rowValues()
+    print('tables ready in ' + TABLE_DIR)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
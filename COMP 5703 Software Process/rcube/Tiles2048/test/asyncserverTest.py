@@ -0,0 +1,153 @@
+import json
+import asyncio
+import hashlib
+import unittest
+import asyncserver
+import Tiles2048.dispatch as dispatch
+
+class AsyncserverTest(unittest.IsolatedAsyncioTestCase):
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+    async def asyncSetUp(self):
+        self.batcher = asyncserver.MicroBatcher(0.001, 4)
+        self.server = await asyncio.start_server(lambda reader, writer: asyncserver.handleConnection(reader, writer, self.batcher),
+                                                 '127.0.0.1', 0, limit=asyncserver.MAX_HEADER_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.engine.shutdown()
+        self.batcher.workers.shutdown()
+
+    #sends raw request bytes and returns [(status line, headers, body)] for every response until the server closes
+    async def exchange(self, request):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(request)
+        await writer.drain()
+        responses = []
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.IncompleteReadError:
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers['content-length']))
+            responses.append((lines[0], headers, body))
+            if headers.get('connection') == 'close':
+                break
+        writer.close()
+        return responses
+
+#Tests that requests submitted together are dispatched as one batch and each gets its own result
+    async def test_asyncserver_batcher_results(self):
+
+        grid = '2200000000002200'
+        requests = [{'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')},
+                    {'op': 'nope'},
+                    {'op': 'shift', 'grid': grid, 'score': '0', 'integrity': 'bad'}]
+
+        results = await asyncio.gather(*[self.batcher.submit(userParms) for userParms in requests])
+
+        self.assertEqual(results, [dispatch._dispatch(userParms) for userParms in requests])
+        self.assertEqual(self.batcher.pending, [])
+
+#Tests that a full batch is sent at once, without waiting for the window
+    async def test_asyncserver_batcher_full(self):
+
+        self.batcher.window = 60
+        futures = [self.batcher.submit({'op': 'nope'}) for _ in range(4)]
+
+        self.assertIsNone(self.batcher.timer, 'A full batch still waits for its timer')
+        self.assertEqual(await asyncio.wait_for(asyncio.gather(*futures), 5), [{'status': dispatch.ERROR03}] * 4)
+
+#Tests that a slow recommend runs beside the batches, so a status sent after it is answered first
+    async def test_asyncserver_recommend_not_batched(self):
+
+        grid = '2000020000000000'
+        recommend = self.batcher.submit({'op': 'recommend', 'grid': grid, 'score': '0', 'depth': '6', 'budgetMs': '300',
+                                         'integrity': self.generateHash(grid, '0')})
+        status = self.batcher.submit({'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')})
+
+        done, _ = await asyncio.wait([recommend, status], return_when=asyncio.FIRST_COMPLETED)
+
+        self.assertEqual(done, {status}, 'The status waited for the recommend')
+        self.assertEqual((await recommend)['status'], 'ok')
+
+#Tests that keep-alive requests on one connection are answered in order, the last one closing it
+    async def test_asyncserver_keep_alive(self):
+
+        responses = await self.exchange(b'GET /2048?op=nope HTTP/1.1\r\nHost: x\r\n\r\n'
+                                        b'GET /2048 HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+
+        self.assertEqual([status for status, _, _ in responses], ['HTTP/1.1 200 OK', 'HTTP/1.1 200 OK'])
+        self.assertEqual(json.loads(responses[0][2]), {'status': dispatch.ERROR03})
+        self.assertEqual(json.loads(responses[1][2]), {'status': dispatch.ERROR01})
+        self.assertEqual(responses[0][1]['connection'], 'keep-alive')
+
+#Tests that a POSTed array is read from the body and answered in order
+    async def test_asyncserver_post(self):
+
+        body = b'[{"op": "nope"}, {"op": "echo"}]'
+        responses = await self.exchange(b'POST /2048 HTTP/1.1\r\nContent-Length: ' + str(len(body)).encode()
+                                        + b'\r\nConnection: close\r\n\r\n' + body)
+
+        self.assertEqual(responses[0][0], 'HTTP/1.1 200 OK')
+        self.assertEqual(json.loads(responses[0][2])[0], {'status': dispatch.ERROR03})
+
+#Tests that a malformed Content-Length gets a 400 and closes the connection
+    async def test_asyncserver_bad_content_length(self):
+
+        responses = await self.exchange(b'POST /2048 HTTP/1.1\r\nContent-Length: ten\r\n\r\n')
+
+        self.assertEqual(responses[0][0], 'HTTP/1.1 400 Bad Request')
+        self.assertEqual(responses[0][1]['connection'], 'close')
+
+#Tests that a request line without three parts gets a 400
+    async def test_asyncserver_bad_request_line(self):
+
+        responses = await self.exchange(b'GET /2048\r\n\r\n')
+
+        self.assertEqual(responses[0][0], 'HTTP/1.1 400 Bad Request')
+
+#Tests that a method other than GET and POST on /2048 gets a 405
+    async def test_asyncserver_method_not_allowed(self):
+
+        responses = await self.exchange(b'DELETE /2048?op=create HTTP/1.1\r\nConnection: close\r\n\r\n')
+
+        self.assertEqual(responses[0][0], 'HTTP/1.1 405 Method Not Allowed')
+        self.assertEqual(responses[0][1]['allow'], 'GET, POST')
+
+#Tests that an unknown path gets a 404
+    async def test_asyncserver_not_found(self):
+
+        responses = await self.exchange(b'GET /nowhere HTTP/1.1\r\nConnection: close\r\n\r\n')
+
+        self.assertEqual(responses[0][0], 'HTTP/1.1 404 Not Found')
+
+#Tests that a GET carrying the ETag it was given gets an empty 304, and an error response no ETag
+    async def test_asyncserver_not_modified(self):
+
+        grid = '2200000000004400'
+        target = ('/2048?op=status&grid=' + grid + '&score=0&integrity=' + self.generateHash(grid, '0')).encode()
+        first = await self.exchange(b'GET ' + target + b' HTTP/1.1\r\nConnection: close\r\n\r\n')
+        etag = first[0][1]['etag']
+        second = await self.exchange(b'GET ' + target + b' HTTP/1.1\r\nIf-None-Match: ' + etag.encode()
+                                     + b'\r\nConnection: close\r\n\r\n')
+
+        self.assertEqual(second[0][0], 'HTTP/1.1 304 Not Modified')
+        self.assertEqual(second[0][2], b'')
+        self.assertEqual(second[0][1]['etag'], etag)
+
+        error = await self.exchange(b'GET /2048?op=status&grid=' + grid.encode() + b'&score=0&integrity=B942 HTTP/1.1\r\n'
+                                    b'Connection: close\r\n\r\n')
+        self.assertNotIn('etag', error[0][1])
+        self.assertEqual(error[0][1]['cache-control'], 'no-store')
@@ -0,0 +1,18 @@
+import unittest
+import Tiles2048.benchmark.bench as bench
+
+class BenchmarkTest(unittest.TestCase):
+
+#Tests that only medians slower than the threshold are flagged, and new benchmarks are skipped
+    def test_benchmark_compare(self):
+
+        baseline = {'shiftLeft': {'median_ns': 100.0}, 'parseGrid': {'median_ns': 1000.0}}
+        current = {'shiftLeft': {'median_ns': 125.0}, 'parseGrid': {'median_ns': 1050.0}, 'create': {'median_ns': 5.0}}
+
+        self.assertEqual(bench.compare(baseline, current, 0.10), [('shiftLeft', 100.0, 125.0, 1.25)])
+
+#Tests that every benchmark runs over the corpus
+    def test_benchmark_runs(self):
+
+        for name, function in bench.benchmarks().items():
+            self.assertEqual(len(function()), bench.callsPerRun(name), name + ' does not make one call per board')
@@ -0,0 +1,139 @@
+import unittest
+import Tiles2048.bitboard as bitboard
+
+class BitboardTest(unittest.TestCase):
+
+#Tests that a grid survives the trip into the board representation and back
+    def test_bitboard_grid_round_trip(self):
+
+        board = bitboard.parseGrid('200162400248162480')
+
+        self.assertEqual(bitboard.toGridString(board), '200162400248162480', 'Board does not convert back to the same grid')
+
+#Tests that 256 and 1024 are read as single tiles and 2048 is split the same way as before
+    def test_bitboard_parse_multi_digit_tiles(self):
+
+        board = bitboard.parseGrid('2561024204800000000000')
+
+        self.assertEqual(bitboard.cells(board)[:6], [8, 10, 1, 0, 2, 3], 'Grid tokens are not read longest first')
+
+#Tests that 4096 and 8192 are read as single tiles, as the original parser did
+    def test_bitboard_parse_large_tiles(self):
+
+        board = bitboard.parseGrid('4096819200000000000000')
+
+        self.assertEqual(bitboard.cells(board)[:3], [12, 13, 0], 'Four-digit tiles are not read as single tiles')
+        self.assertEqual(bitboard.toGridString(board), '4096819200000000000000')
+
+#Tests that the parser reports the character where an invalid tile starts
+    def test_bitboard_parse_invalid_tile(self):
+
+        with self.assertRaises(ValueError) as context:
+            bitboard.parseGrid('00002481600001280361')
+
+        self.assertEqual(str(context.exception), 'invalid grid - invalid tile at character 18')
+
+#Tests that a grid without 16 tiles is rejected
+    def test_bitboard_parse_wrong_tile_count(self):
+
+        with self.assertRaises(ValueError) as context:
+            bitboard.parseGrid('000024816')
+
+        self.assertEqual(str(context.exception), 'invalid grid - not enough characters')
+
+#Tests that a row merges each pair only once and slides toward the left
+    def test_bitboard_row_merge(self):
+
+        #2 2 2 2 -> 4 4 0 0 and 4 2 2 0 -> 4 4 0 0
+        rowTwos = 0x1111
+        rowMixed = 0x0112
+
+        self.assertEqual(bitboard.ROW_LEFT[rowTwos], 0x0022, 'Row of four 2s does not merge into two 4s')
+        self.assertEqual(bitboard.SCORE_LEFT[rowTwos], 8, 'Row of four 2s does not score 8')
+        self.assertEqual(bitboard.ROW_LEFT[rowMixed], 0x0022, 'Merged tile merges a second time')
+        self.assertEqual(bitboard.ROW_RIGHT[rowTwos], 0x2200, 'Row of four 2s does not merge to the right')
+
+#Tests that transposing twice gives back the original board
+    def test_bitboard_transpose(self):
+
+        board = 0x0123456789ABCDEF
+
+        self.assertEqual(bitboard.transpose(bitboard.transpose(board)), board, 'Transpose is not its own inverse')
+        self.assertEqual(bitboard.cells(bitboard.transpose(board))[1], bitboard.cells(board)[4], 'Transpose does not swap rows and columns')
+
+#Tests every direction on the same board
+    def test_bitboard_all_directions(self):
+
+        board = bitboard.parseGrid('200162400248162480')
+
+        expected = {'up': ('481632440000000000', 64),
+                    'down': ('000000004400481632', 64),
+                    'right': ('002160024248160248', 0),
+                    'left': ('216002400248162480', 0)}
+
+        for direction in expected:
+            newBoard, score = bitboard.MOVES[direction](board)
+            self.assertEqual((bitboard.toGridString(newBoard), score), expected[direction], 'Board does not shift ' + direction + ' correctly')
+
+#Tests that all 8 rotations and reflections of a board share one canonical form
+    def test_bitboard_canonical(self):
+
+        board = bitboard.parseGrid('200162400248162480')
+        symmetric = [bitboard.flipRows(board), bitboard.flipColumns(board), bitboard.transpose(board),
+                     bitboard.flipRows(bitboard.transpose(board)), bitboard.flipColumns(bitboard.transpose(board))]
+
+        self.assertEqual(bitboard.toGridString(bitboard.flipRows(board)), '160020042168420842')
+        for other in symmetric:
+            self.assertEqual(bitboard.canonical(other), bitboard.canonical(board), 'Symmetric boards have different canonical forms')
+
+#Tests that a full board with no merges cannot move
+    def test_bitboard_can_move(self):
+
+        stuck = bitboard.parseGrid('24816168422481616842')
+        movable = bitboard.parseGrid('22816168422481616842')
+
+        self.assertFalse(bitboard.canMove(stuck), 'Stuck board reports a legal move')
+        self.assertTrue(bitboard.canMove(movable), 'Movable board reports no legal move')
+        self.assertEqual(bitboard.emptyCount(stuck), 0)
+        self.assertEqual(bitboard.maxExponent(stuck), 4)
+
+#Tests that the sized engine plays a 4x4 board exactly like the move tables
+    def test_bitboard_engine_matches_tables(self):
+
+        engine = bitboard.Engine(4)
+        board = bitboard.parseGrid('200162400248162480')
+
+        for direction in bitboard.MOVES:
+            self.assertEqual(engine.MOVES[direction](board), bitboard.MOVES[direction](board), 'Engine does not shift ' + direction + ' like the tables')
+        self.assertEqual(engine.legalMoves(board), bitboard.legalMoves(board))
+        self.assertEqual(engine.emptyMask(board), bitboard.emptyMask(board))
+
+#Tests moves on a 3x3 and an 8x8 board
+    def test_bitboard_engine_other_sizes(self):
+
+        small = bitboard.engine(3)
+        board = small.parseGrid('220404008')
+
+        self.assertEqual(small.toGridString(small.shiftLeft(board)[0]), '400800800')
+        self.assertEqual(small.toGridString(small.shiftUp(board)[0]), '224408000')
+        self.assertEqual(small.shiftUp(board)[1], 0)
+
+        large = bitboard.engine(8)
+        board = large.parseGrid('2' * 64)
+        newBoard, score = large.shiftDown(board)
+
+        self.assertEqual(large.toGridString(newBoard), '0' * 32 + '4' * 32)
+        self.assertEqual(score, 128)
+        self.assertEqual(large.emptyCount(newBoard), 32)
+        self.assertEqual(large.legalMoves(board), ['up', 'down', 'right', 'left'])
+
+
+#Tests that an engine remembers a bounded number of rows however many different rows it slides
+    def test_bitboard_engine_row_cache_bounded(self):
+
+        engine = bitboard.Engine(8)
+        for row in range(bitboard.ROW_CACHE_SIZE + 100):
+            engine.slideLeft(row)
+
+        self.assertEqual(engine.slideLeft.cache_info().currsize, bitboard.ROW_CACHE_SIZE)
+        self.assertLessEqual(bitboard.ROW_CACHE_SIZE, 8192, 'The row caches can grow an engine by tens of megabytes')
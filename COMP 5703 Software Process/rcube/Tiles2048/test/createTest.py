@@ -35,4 +35,27 @@ class CreateTest(unittest.TestCase):
         averageIndex = totalElementIndex/50
         
         #a perfect average would be 7.5, so this is a range that the average should fall in
-        self.assertAlmostEqual(averageIndex, 7.5, delta = 1)
\ No newline at end of file
+        self.assertAlmostEqual(averageIndex, 7.5, delta = 1)
+
+#Tests that size sets the number of cells and two 2's are still placed
+    def test_create_size(self):
+
+        for size in range(3, 9):
+            actualResult = create._create({'op': 'create', 'size': str(size)})
+            gridString = actualResult.get('grid')
+
+            self.assertEqual(len(gridString), size * size, 'Grid does not have size x size cells')
+            self.assertEqual(gridString.count('2'), 2)
+
+        self.assertEqual(create._create({'op': 'create', 'size': '2'}), {'status': 'error: invalid size - expected 3 to 8'})
+
+
+#Tests that the same seed always gives the same grid
+    def test_create_seed(self):
+
+        first = create._create({'op': 'create', 'seed': 'abc'})
+        second = create._create({'op': 'create', 'seed': 'abc'})
+        others = [create._create({'op': 'create', 'seed': str(seed)})['grid'] for seed in range(10)]
+
+        self.assertEqual(first, second, 'Seeded create gives different grids')
+        self.assertGreater(len(set(others)), 1, 'Grid does not depend on the seed')
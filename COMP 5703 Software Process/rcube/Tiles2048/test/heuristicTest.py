@@ -0,0 +1,40 @@
+import unittest
+import Tiles2048.bitboard as bitboard
+import Tiles2048.heuristic as heuristic
+
+class HeuristicTest(unittest.TestCase):
+
+#Tests that the table holds the row score for every one of the 65,536 rows
+    def test_heuristic_table_matches_rows(self):
+
+        table = heuristic.rowValues()
+
+        self.assertEqual(len(table), 65536)
+        for row in (0x0000, 0x1111, 0x4321, 0xB000):
+            self.assertEqual(table[row], heuristic.scoreRow(row))
+
+#Tests that a board is scored by its four rows and its four columns
+    def test_heuristic_evaluate_rows_and_columns(self):
+
+        board = bitboard.parseGrid('200162400248162480')
+        transposed = bitboard.transpose(board)
+        expected = sum([heuristic.scoreRow((board >> offset) & 0xFFFF) + heuristic.scoreRow((transposed >> offset) & 0xFFFF)
+                        for offset in (0, 16, 32, 48)])
+
+        self.assertAlmostEqual(heuristic.evaluate(board), expected)
+
+#Tests that mirrored boards are worth the same
+    def test_heuristic_symmetric(self):
+
+        board = bitboard.parseGrid('200162400248162480')
+
+        self.assertAlmostEqual(heuristic.evaluate(board), heuristic.evaluate(bitboard.flipRows(board)))
+        self.assertAlmostEqual(heuristic.evaluate(board), heuristic.evaluate(bitboard.transpose(board)))
+
+#Tests that the biggest tile is worth more in a corner than in the middle
+    def test_heuristic_prefers_corner(self):
+
+        corner = bitboard.parseGrid('1024000000000000000')
+        middle = bitboard.parseGrid('0000010240000000000')
+
+        self.assertGreater(heuristic.evaluate(corner), heuristic.evaluate(middle))
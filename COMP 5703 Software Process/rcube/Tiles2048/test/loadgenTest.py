@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+import loadgen
+import Tiles2048.dispatch as dispatch
+import Tiles2048.shift as shift
+
+class LoadgenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'trace.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+#Tests that a written trace reads back the same
+    def test_loadgen_trace_round_trip(self):
+
+        records = [{'t': 0.0, 'parms': {'op': 'create'}}, {'t': 0.01, 'parms': {'op': 'status', 'grid': '0' * 16}}]
+        loadgen.writeTrace(self.path, records)
+
+        self.assertEqual(loadgen.readTrace(self.path), records)
+
+#Tests that the recorder keeps requests in memory until its buffer fills or it is closed
+    def test_loadgen_recorder_buffers(self):
+
+        recorder = loadgen.TraceRecorder(self.path)
+        recorder.BUFFER_LINES = 3
+        recorder.record({'op': 'create'})
+        recorder.record({'op': 'status'})
+
+        self.assertFalse(os.path.exists(self.path), 'Requests were written before the buffer filled')
+
+        recorder.record({'op': 'shift'})
+        self.assertEqual([record['parms']['op'] for record in loadgen.readTrace(self.path)], ['create', 'status', 'shift'])
+
+        recorder.record({'op': 'recommend'})
+        recorder.close()
+        records = loadgen.readTrace(self.path)
+        self.assertEqual([record['parms']['op'] for record in records], ['create', 'status', 'shift', 'recommend'])
+        self.assertEqual(records[0]['t'], 0.0)
+        self.assertEqual(records, sorted(records, key=lambda record: record['t']), 'Requests are out of order')
+
+#Tests that a synthesized trace starts each game with a create and signs every shift correctly
+    def test_loadgen_synthesize(self):
+
+        records = loadgen.synthesize(2, 'greedy', 5703, 0.01)
+
+        self.assertEqual(records[0]['parms'], {'op': 'create'})
+        self.assertEqual(len([record for record in records if record['parms']['op'] == 'create']), 2)
+        self.assertEqual(records, loadgen.synthesize(2, 'greedy', 5703, 0.01), 'The same seed gives a different trace')
+        for record in records:
+            userParms = record['parms']
+            if userParms['op'] == 'shift':
+                self.assertEqual(userParms['integrity'], shift.calculateIntegrity(userParms['grid'], userParms['score']))
+                self.assertNotIn('error', dispatch._dispatch(userParms)['status'])
+
+#Tests that a replay times every request by op and counts the error responses
+    def test_loadgen_replay(self):
+
+        class Sender:
+            def send(self, userParms):
+                if userParms['op'] == 'launch':
+                    return 200, '{"status":"error: no op is specified"}'
+                if userParms['op'] == 'crash':
+                    raise OSError('connection refused')
+                return 200, '{"status":"ok"}'
+
+        records = [{'t': 0.0, 'parms': {'op': op}} for op in ('create', 'create', 'launch', 'crash')]
+        latencies, errors, elapsed = loadgen.replay(records, Sender(), 0, 2)
+
+        self.assertEqual({op: len(values) for op, values in latencies.items()}, {'create': 2, 'launch': 1, 'crash': 1})
+        self.assertEqual(errors, {'launch': 1, 'crash': 1})
+        self.assertGreaterEqual(elapsed, 0)
+
+#Tests that the report shows the latency percentiles of every op in milliseconds
+    def test_loadgen_report(self):
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            loadgen.report({'shift': [0.001] * 99 + [0.1]}, {'shift': 2}, 1.0)
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(lines[0].split(), ['requests', '100'])
+        self.assertEqual(lines[-1].split(), ['shift', '100', '2', '1.00', '1.00', '1.00', '100.00'])
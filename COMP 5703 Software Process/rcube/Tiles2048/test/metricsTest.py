@@ -0,0 +1,116 @@
+import os
+import json
+import hashlib
+import tempfile
+import subprocess
+import sys
+import threading
+import unittest
+import Tiles2048.metrics as metrics
+import Tiles2048.dispatch as dispatch
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        metrics.startMetrics()
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+    def counter(self, key):
+        return metrics.snapshot()[0].get(key, 0)
+
+#Tests that every dispatched op is counted and errors are counted by their status
+    def test_metrics_requests_and_errors(self):
+
+        grid = '2200000000002200'
+        dispatch._dispatch({'op': 'shift', 'grid': grid, 'score': '0', 'direction': 'left',
+                            'integrity': self.generateHash(grid, '0')})
+        dispatch._dispatch({'op': 'shift', 'grid': grid, 'score': '0', 'integrity': 'B942'})
+        dispatch._dispatch({'op': 'launch'})
+
+        self.assertEqual(self.counter(('requests', 'shift')), 2)
+        self.assertEqual(self.counter(('errors', 'shift', 'error: bad integrity value')), 1)
+        self.assertEqual(self.counter(('errors', 'none', dispatch.ERROR03)), 1)
+
+#Tests that a shift records each of its phases once
+    def test_metrics_shift_phases(self):
+
+        grid = '2200000000002200'
+        dispatch._dispatch({'op': 'shift', 'grid': grid, 'score': '0', 'direction': 'left', 'moves': 'lr',
+                            'integrity': self.generateHash(grid, '0')})
+
+        histograms = metrics.snapshot()[1]
+        for phase in ('validate', 'parse', 'shift', 'spawn'):
+            self.assertEqual(sum(histograms[('phase', 'shift', phase)][:-1]), 1, phase + ' was not recorded once')
+        self.assertEqual(sum(histograms[('phase', 'shift', 'hash')][:-1]), 2, 'Both hashes were not recorded')
+
+#Tests that threads count into their own shards and the snapshot adds them up
+    def test_metrics_threads_added_up(self):
+
+        def work():
+            for _ in range(100):
+                dispatch._dispatch({'op': 'echo'})
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.counter(('requests', 'echo')), 400)
+
+#Tests the text format, including the files written by other processes
+    def test_metrics_exposition_adds_up_processes(self):
+
+        dispatch._dispatch({'op': 'echo'})
+        directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(directory.name, '1.json'), 'w') as other:
+            json.dump({'counters': [[['requests', 'echo'], 2]], 'histograms': []}, other)
+
+        try:
+            metrics.METRICS_DIR = directory.name
+            text = metrics.exposition()
+        finally:
+            metrics.METRICS_DIR = ''
+            directory.cleanup()
+
+        self.assertIn('# TYPE rcube_requests_total counter', text)
+        self.assertIn('rcube_requests_total{op="echo"} 3', text)
+        self.assertIn('rcube_request_seconds_bucket{op="echo",le="+Inf"} 1', text)
+        self.assertIn('rcube_request_seconds_count{op="echo"} 1', text)
+
+#Tests that the files of exited processes are added into one file, and the totals stay the same
+    def test_metrics_exited_files_merged(self):
+
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        directory = tempfile.TemporaryDirectory()
+        for fileName, count in ((str(dead.pid) + '-1.json', 2), (str(dead.pid) + '-2.json', 5), (metrics.EXITED_FILE, 1)):
+            with open(os.path.join(directory.name, fileName), 'w') as other:
+                json.dump({'counters': [[['requests', 'echo'], count]], 'histograms': []}, other)
+
+        try:
+            metrics.METRICS_DIR = directory.name
+            first = metrics.totals()[0]
+            names = sorted(os.listdir(directory.name))
+            second = metrics.totals()[0]
+        finally:
+            metrics.METRICS_DIR = ''
+            directory.cleanup()
+
+        self.assertEqual(first.get(('requests', 'echo'), 0), 8)
+        self.assertEqual(second, first, 'The totals changed once the files were merged')
+        self.assertEqual([name for name in names if name.endswith('.json')], sorted([metrics.EXITED_FILE, metrics.fileName()]))
+
+#Tests that a process's file is named by its id and start time, and a reset process gets a new one
+    def test_metrics_file_name(self):
+
+        first = metrics.fileName()
+        metrics.resetMetrics()
+
+        self.assertTrue(first.startswith(str(os.getpid()) + '-'))
+        self.assertTrue(first.endswith('.json'))
+        self.assertNotEqual(metrics.fileName(), first)
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+import Tiles2048.profiler as profiler
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved = profiler.PROFILE_DIR
+        profiler.PROFILE_DIR = self.directory.name
+        profiler.startProfiler()
+
+    #setRate(0) waits for the sampler's last write, so nothing is written to the saved directory
+    def tearDown(self):
+        profiler.setRate(0)
+        profiler.PROFILE_DIR = self.saved
+        self.directory.cleanup()
+
+    def spin(self, seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+#Tests that a marked op is sampled and written as collapsed stacks in a file for its op
+    def test_profiler_collapsed_stacks_per_op(self):
+
+        profiler.setRate(1)
+        profiler.begin('recommend')
+        self.spin(0.2)
+        profiler.end()
+        profiler.write()
+
+        path = os.path.join(self.directory.name, 'recommend-' + str(os.getpid()) + '.folded')
+        with open(path) as foldedFile:
+            lines = foldedFile.read().splitlines()
+
+        self.assertTrue(lines, 'No stacks were sampled')
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(int(count) > 0)
+        self.assertTrue(any(['ProfilerTest.spin' in line for line in lines]), 'The running function is not in the stacks')
+
+#Tests that the rate is checked and written for the other processes
+    def test_profiler_control(self):
+
+        self.assertEqual(profiler.control('2'), {'status': 'error: invalid rate - expected 0 to 1'})
+        self.assertEqual(profiler.control('x'), {'status': 'error: invalid rate - expected 0 to 1'})
+
+        result = profiler.control('0.25')
+
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(profiler.RATE, 0.25)
+        with open(os.path.join(self.directory.name, 'rate')) as rateFile:
+            self.assertEqual(rateFile.read(), '0.25')
+
+#Tests that a rate file left from before the server started is ignored, and a new one is read once
+    def test_profiler_stale_rate_ignored(self):
+
+        path = os.path.join(self.directory.name, 'rate')
+        with open(path, 'w') as rateFile:
+            rateFile.write('0.5')
+        os.utime(path, (profiler.STARTED - 60, profiler.STARTED - 60))
+
+        self.assertIsNone(profiler.readRate(None), 'A rate from before the start was read')
+
+        os.utime(path)
+        changed, rate = profiler.readRate(None)
+        self.assertEqual(rate, 0.5)
+        self.assertIsNone(profiler.readRate(changed), 'An unchanged rate was read again')
+
+#Tests that stopping waits for the sampler's last write and leaves the switch interval alone
+    def test_profiler_stop_writes(self):
+
+        interval = sys.getswitchinterval()
+        profiler.setRate(1)
+        profiler.begin('status')
+        self.spin(0.05)
+        profiler.end()
+        self.assertEqual(sys.getswitchinterval(), interval)
+        profiler.setRate(0)
+
+        self.assertIsNone(profiler._sampler)
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'status-' + str(os.getpid()) + '.folded')))
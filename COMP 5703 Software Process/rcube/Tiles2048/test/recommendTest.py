@@ -0,0 +1,167 @@
+import unittest
+import hashlib
+import random
+import threading
+import time
+import Tiles2048.recommend as recommend
+import Tiles2048.rollout as rollout
+
+class RecommendTest(unittest.TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        rollout.stopPool()
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+#Tests that the grid, score and integrity are checked the same way as for shift
+    def test_recommend_bad_integrity_value(self):
+
+        userParms = {'op': 'recommend', 'grid': '2200000000002200', 'score': '0', 'integrity': 'B942E8D41B4'}
+
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: bad integrity value'})
+
+#Tests that depth must be a small positive integer and budgetMs a small integer, 0 only for a shallow search
+    def test_recommend_invalid_limits(self):
+
+        grid = '2200000000002200'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+
+        userParms['depth'] = '0'
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid depth - expected 1 to 6'})
+
+        userParms['depth'] = '2'
+        userParms['budgetMs'] = 'fast'
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid budgetMs - expected 0 to 1000'})
+
+        userParms['depth'] = '4'
+        userParms['budgetMs'] = '0'
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid budgetMs - 0 needs a depth up to 3'})
+
+        userParms['depth'] = '3'
+        self.assertEqual(recommend._recommend(userParms)['depth'], '3', 'An untimed search stops before its depth')
+
+#Tests that only directions that change the grid are scored and the best one is recommended
+    def test_recommend_best_direction(self):
+
+        grid = '24816168422481616840'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'depth': '2',
+                     'integrity': self.generateHash(grid, '0')}
+
+        actualResult = recommend._recommend(userParms)
+
+        self.assertEqual(actualResult.get('status'), 'ok')
+        self.assertEqual(sorted(actualResult.get('expected', {})), ['down', 'right'], 'Recommend scores directions that cannot move')
+        self.assertEqual(actualResult.get('recommend'), 'right', 'Recommend does not avoid the losing move')
+        self.assertEqual(actualResult.get('depth'), '2')
+        self.assertTrue(actualResult.get('tableHits', '').isdigit(), 'Recommend does not report table hits')
+        self.assertTrue(actualResult.get('tableMisses', '').isdigit(), 'Recommend does not report table misses')
+
+#Tests that an untimed search answers the same whatever the shared table holds, and reports no table counts
+    def test_recommend_untimed_repeatable(self):
+
+        grid = '2400020000080000'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'depth': '2', 'budgetMs': '0',
+                     'integrity': self.generateHash(grid, '0')}
+
+        first = recommend._recommend(dict(userParms))
+        recommend._recommend(dict(userParms, depth='4', budgetMs='1000'))
+        second = recommend._recommend(dict(userParms))
+
+        self.assertEqual(first, second, 'An untimed search depends on the searches before it')
+        self.assertNotIn('tableHits', first)
+        self.assertNotIn('tableMisses', first)
+
+#Tests that a lost board has nothing to recommend
+    def test_recommend_lost_board(self):
+
+        grid = '24816168422481616842'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+
+        actualResult = recommend._recommend(userParms)
+
+        self.assertEqual(actualResult, {'recommend': '', 'expected': {}, 'depth': '0', 'tableHits': '0', 'tableMisses': '0',
+                                        'status': 'lose'})
+
+#Tests that an unknown strategy or rollout policy is reported
+    def test_recommend_invalid_strategy_and_policy(self):
+
+        grid = '2200000000002200'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+
+        userParms['strategy'] = 'guess'
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid strategy'})
+
+        userParms['strategy'] = 'rollout'
+        userParms['policy'] = 'lucky'
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid policy'})
+
+#Tests that the rollout strategy reports a mean and a confidence interval for every legal direction
+    def test_recommend_rollout(self):
+
+        grid = '24816168422481616840'
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'strategy': 'rollout', 'rollouts': '30',
+                     'policy': 'greedy', 'integrity': self.generateHash(grid, '0')}
+
+        actualResult = recommend._recommend(userParms)
+        expected = actualResult.get('expected', {})
+        interval = actualResult.get('interval', {})
+
+        self.assertEqual(actualResult.get('status'), 'ok')
+        self.assertEqual(actualResult.get('rollouts'), '30')
+        self.assertEqual(sorted(expected), ['down', 'right'])
+        self.assertIn(actualResult.get('recommend'), expected)
+        for direction in expected:
+            self.assertLessEqual(interval[direction][0], expected[direction])
+            self.assertGreaterEqual(interval[direction][1], expected[direction])
+
+#Tests that the same seed gives the same rollout summary
+    def test_recommend_rollout_seeded(self):
+
+        board = 0x0000000000002211
+
+        first = rollout.evaluateMoves(board, 0, 10, 'random', seed=7)
+        second = rollout.evaluateMoves(board, 0, 10, 'random', seed=7)
+
+        self.assertEqual(first, second, 'Seeded rollouts are not repeatable')
+
+#Tests that rollouts stop at their budget with at least one chunk played for every direction
+    def test_recommend_rollout_budget(self):
+
+        board = 0x0000000000002211
+
+        start = time.perf_counter()
+        summary, played = rollout.evaluateMoves(board, 0, recommend.MAX_ROLLOUTS, 'greedy', seed=7, budgetMs=1)
+
+        self.assertLess(time.perf_counter() - start, 5, 'The rollouts ran past their budget')
+        self.assertEqual(sorted(summary), sorted(rollout.evaluateMoves(board, 0, 1, 'greedy')[0]))
+        self.assertGreaterEqual(played, rollout.CHUNK_SIZE)
+        self.assertLess(played, recommend.MAX_ROLLOUTS)
+
+        grid = '2' + '0' * 15
+        userParms = {'op': 'recommend', 'grid': grid, 'score': '0', 'strategy': 'rollout', 'budgetMs': '0',
+                     'integrity': self.generateHash(grid, '0')}
+        self.assertEqual(recommend._recommend(userParms), {'status': 'error: invalid budgetMs - expected 1 to ' + str(recommend.MAX_BUDGET_MS)})
+
+#Tests that a playout stops once the game is won, as a shift does
+    def test_recommend_playout_stops_at_win(self):
+
+        board = 0x000000000000000B
+
+        self.assertEqual(rollout.playout(board, 20000, 'random', random.Random(1)), 20000)
+
+#Tests that requests starting the pool at the same time share one pool
+    def test_recommend_pool_started_once(self):
+
+        rollout.stopPool()
+        pools = []
+        threads = [threading.Thread(target=lambda: pools.append(rollout.startPool(1))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set([id(pool) for pool in pools])), 1, 'More than one pool was started')
@@ -0,0 +1,47 @@
+import unittest
+import Tiles2048.schema as schema
+import Tiles2048.dispatch as dispatch
+
+class SchemaTest(unittest.TestCase):
+
+#Tests that a compiled schema returns typed values and defaults
+    def test_schema_typed_values(self):
+
+        validate = schema.compileSchema([schema.integer('depth', 'invalid depth', default=3, minimum=1, maximum=6),
+                                         schema.choice('direction', ('up', 'down'), 'invalid direction', 'down', lower=True),
+                                         schema.text('seed')])
+
+        self.assertEqual(validate({'depth': '5', 'direction': 'UP'}), {'depth': 5, 'direction': 'up', 'seed': ''})
+        self.assertEqual(validate({}), {'depth': 3, 'direction': 'down', 'seed': ''})
+
+#Tests that rules run in order, so the first problem is the one reported
+    def test_schema_first_error(self):
+
+        validate = schema.compileSchema([schema.required('score', 'missing score', blank=False),
+                                         schema.integer('score', 'invalid score'),
+                                         schema.even('score', 'odd score')])
+
+        for userParms, message in (({}, 'missing score'), ({'score': 'a'}, 'invalid score'), ({'score': '3'}, 'odd score')):
+            with self.assertRaises(ValueError) as context:
+                validate(userParms)
+            self.assertEqual(str(context.exception), message)
+
+#Tests that branch rules only apply to their choice
+    def test_schema_branches(self):
+
+        validate = schema.compileSchema([schema.choice('strategy', ('a', 'b'), 'invalid strategy', 'a', branches={
+            'b': [schema.integer('count', 'invalid count', default=1, minimum=1)]})])
+
+        self.assertEqual(validate({'count': 'x'}), {'strategy': 'a'})
+        self.assertEqual(validate({'strategy': 'b'}), {'strategy': 'b', 'count': 1})
+        with self.assertRaises(ValueError):
+            validate({'strategy': 'b', 'count': '0'})
+
+#Tests that an op is only loaded when it is first called
+    def test_schema_lazy_dispatch(self):
+
+        dispatch._loaded.pop(dispatch.OPS['info'], None)
+
+        self.assertNotIn(dispatch.OPS['info'], dispatch._loaded)
+        self.assertEqual(dispatch._dispatch({'op': 'info'}), {'user': 'ead0044'})
+        self.assertIn(dispatch.OPS['info'], dispatch._loaded)
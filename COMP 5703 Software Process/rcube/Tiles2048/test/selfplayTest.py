@@ -0,0 +1,44 @@
+import unittest
+import random
+from collections import Counter
+import Tiles2048.bitboard as bitboard
+import Tiles2048.selfplay as selfplay
+
+class SelfplayTest(unittest.TestCase):
+
+#Tests that a game is played to the end by the rules of op=shift
+    def test_selfplay_game_ends(self):
+
+        score, highest, moves = selfplay.playGame(selfplay.greedyStrategy, random.Random(5703))
+
+        self.assertGreater(moves, 0)
+        self.assertEqual(score % 2, 0)
+        self.assertTrue(1 <= highest <= bitboard.WIN_EXPONENT)
+
+#Tests that the same seed plays the same games and chunks add up
+    def test_selfplay_chunk_seeded(self):
+
+        first = selfplay.playChunk(('random', 20, 7, 1, 1))
+        second = selfplay.playChunk(('random', 20, 7, 1, 1))
+        games, totalScore, maxTiles, lengths = selfplay.combine([first, second])
+
+        self.assertEqual(first, second, 'Seeded chunks play different games')
+        self.assertEqual(games, 40)
+        self.assertEqual(sum(maxTiles.values()), 40)
+        self.assertEqual(sum(lengths.values()), 40)
+
+#Tests percentiles taken from the game length counts
+    def test_selfplay_percentile(self):
+
+        lengths = Counter({10: 50, 20: 40, 30: 9, 40: 1})
+
+        self.assertEqual(selfplay.percentile(lengths, 0.5), 10)
+        self.assertEqual(selfplay.percentile(lengths, 0.9), 20)
+        self.assertEqual(selfplay.percentile(lengths, 0.99), 30)
+        self.assertEqual(selfplay.percentile(lengths, 0.999), 40)
+
+#Tests that an unknown strategy is reported
+    def test_selfplay_invalid_strategy(self):
+
+        with self.assertRaises(ValueError):
+            selfplay.strategyFor('best')
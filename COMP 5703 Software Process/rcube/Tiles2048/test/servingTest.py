@@ -0,0 +1,181 @@
+import io
+import gzip
+import json
+import hashlib
+import queue
+import logging
+import unittest
+import contextlib
+import serving
+import Tiles2048.dispatch as dispatch
+
+class ServingTest(unittest.TestCase):
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+#Tests that bodies are compact JSON that reads back as the result
+    def test_serving_json_body(self):
+
+        result = {'grid': '2000000000000000', 'score': '0', 'integrity': 'AB', 'status': 'ok'}
+
+        self.assertEqual(serving.toJson({'a': 1, 'b': 'x'}), '{"a":1,"b":"x"}')
+        self.assertEqual(json.loads(serving.responseBody(result)), result)
+        self.assertEqual(json.loads(serving.responseBody([{'status': 'ok'}, {'status': 'lose'}])), [{'status': 'ok'}, {'status': 'lose'}])
+
+#Tests that a body carrying only a status is built once and reused
+    def test_serving_cached_status_body(self):
+
+        before = serving.statusBody.cache_info().hits
+        body = serving.responseBody({'status': dispatch.ERROR01})
+
+        self.assertEqual(json.loads(body), {'status': dispatch.ERROR01})
+        self.assertIs(serving.responseBody({'status': dispatch.ERROR01}), body)
+        self.assertGreater(serving.statusBody.cache_info().hits, before, 'The dispatch errors were not ready before the first request')
+        self.assertEqual(json.loads(serving.responseBody({'status': 'ok', 'score': '4'})), {'status': 'ok', 'score': '4'})
+
+#Tests that a full queue drops the record instead of blocking, and that records are queued unformatted
+    def test_serving_dropping_queue_handler(self):
+
+        handler = serving.DroppingQueueHandler(queue.Queue(2))
+        records = [logging.LogRecord('rcube', logging.INFO, __file__, 1, 'Response --> %s', ({'n': n},), None) for n in range(3)]
+        for record in records:
+            handler.emit(record)
+
+        self.assertEqual(handler.dropped, 1)
+        self.assertIs(handler.queue.get_nowait(), records[0])
+        self.assertFalse(hasattr(records[0], 'message'), 'The record was formatted on the request thread')
+
+#Tests that the first logged response starts this process's listener, which writes it out
+    def test_serving_log_listener_started(self):
+
+        output = io.StringIO()
+        rate = serving.LOG_SAMPLE_RATE
+        serving.stopLogging()
+        serving.LOG_SAMPLE_RATE = 1
+        try:
+            with contextlib.redirect_stdout(output):
+                serving.logResponse({'status': 'ok'})
+                self.assertIsNotNone(serving.listenerPid)
+                serving.stopLogging()
+        finally:
+            serving.LOG_SAMPLE_RATE = rate
+
+        self.assertIn("Response --> {'status': 'ok'}", output.getvalue())
+
+#Tests that a bulk request answers every operation in order, with JSON numbers read as query strings
+    def test_serving_bulk_result(self):
+
+        grid = '2200000000002200'
+        operations = [{'op': 'status', 'grid': grid, 'score': 0, 'integrity': self.generateHash(grid, '0')},
+                      {'op': 'nope'},
+                      {'op': 'status', 'grid': grid, 'score': '0', 'integrity': 'B942', 'session': None}]
+
+        results = serving.bulkResult(json.dumps(operations))
+
+        self.assertEqual(results[0], dispatch._dispatch({'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}))
+        self.assertEqual(results[1], {'status': dispatch.ERROR03})
+        self.assertEqual(results[2], {'status': 'error: bad integrity value'})
+
+#Tests that an operation that is not a dictionary, or holds a nested value, gets its own error
+    def test_serving_bulk_invalid_operations(self):
+
+        results = serving.bulkResult('[null, 5, {"op": "create", "size": [4]}, {"op": "create", "seed": true}, {"op": "nope"}]')
+
+        self.assertEqual(results[:2], [{'status': dispatch.ERROR02}] * 2)
+        self.assertEqual(results[2], {'status': 'error: invalid operation - size is not a string or number'})
+        self.assertEqual(results[3], {'status': 'error: invalid operation - seed is not a string or number'})
+        self.assertEqual(results[4], {'status': dispatch.ERROR03})
+
+#Tests that a POSTed shiftBatch takes its boards as a real JSON array
+    def test_serving_bulk_shift_batch_array(self):
+
+        grid = '2200000000002200'
+        boards = [{'grid': grid, 'score': 0, 'direction': 'left', 'integrity': self.generateHash(grid, '0')}] * 50
+
+        results = serving.bulkResult(json.dumps([{'op': 'shiftBatch', 'boards': boards}, {'op': 'status', 'grid': [grid]}]))
+
+        self.assertEqual(results[0]['status'], 'ok')
+        self.assertEqual(len(results[0]['results']), 50)
+        self.assertEqual([result['score'] for result in results[0]['results']], ['8'] * 50)
+        self.assertEqual(results[1], {'status': 'error: invalid operation - grid is not a string or number'})
+
+#Tests that a body that is not a JSON array, or is too long, is rejected as a whole
+    def test_serving_bulk_not_an_array(self):
+
+        self.assertEqual(serving.bulkResult('{"op": "create"}'), {'status': 'error: invalid operations - not a JSON array'})
+        self.assertEqual(serving.bulkResult('[{"op": '), {'status': 'error: invalid operations - not a JSON array'})
+        self.assertIn('more than', serving.bulkResult('[' + ','.join(['{}'] * (serving.MAX_OPERATIONS + 1)) + ']')['status'])
+
+#Tests that only a body big enough to gain is gzipped, and only for a client that accepts gzip
+    def test_serving_encode_body(self):
+
+        small = '{"status":"ok"}'
+        large = serving.toJson([{'status': 'ok'}] * 100)
+
+        self.assertEqual(serving.encodeBody(small, 'gzip'), (small.encode(), {'Vary': 'Accept-Encoding'}))
+        self.assertEqual(serving.encodeBody(large, 'br, deflate'), (large.encode(), {'Vary': 'Accept-Encoding'}))
+
+        payload, headers = serving.encodeBody(large, 'GZIP, br')
+        self.assertEqual(headers, {'Vary': 'Accept-Encoding', 'Content-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(payload), large.encode())
+        self.assertLess(len(payload), len(large))
+
+#Tests that only requests whose response depends on their parameters alone get a cache key
+    def test_serving_cache_key(self):
+
+        status = {'op': 'status', 'grid': '2' + '0' * 15, 'score': '0', 'integrity': 'AB', 'direction': 'left'}
+
+        self.assertEqual(serving.cacheKey(status), ('status', '2' + '0' * 15, '0', 'AB'), 'Parameters the op does not read are in the key')
+        self.assertEqual(serving.cacheKey(dict(status, session='0')), serving.cacheKey(status))
+        self.assertIsNone(serving.cacheKey(dict(status, session='a1b2')))
+        self.assertIsNone(serving.cacheKey({'op': 'create'}))
+        self.assertIsNotNone(serving.cacheKey({'op': 'create', 'seed': '7'}))
+        self.assertIsNone(serving.cacheKey({'op': 'shift', 'grid': '2' + '0' * 15, 'direction': 'left'}))
+        self.assertIsNotNone(serving.cacheKey({'op': 'shift', 'grid': '2' + '0' * 15, 'direction': 'left', 'spawn': 'hash'}))
+        self.assertIsNone(serving.cacheKey({'op': 'recommend', 'grid': '2' + '0' * 15, 'depth': '2'}), 'A timed recommend is cached')
+        self.assertIsNone(serving.cacheKey({'op': 'recommend', 'strategy': 'rollout', 'budgetMs': '0'}))
+        self.assertIsNotNone(serving.cacheKey({'op': 'recommend', 'grid': '2' + '0' * 15, 'depth': '2', 'budgetMs': '0'}))
+        self.assertIsNone(serving.cacheKey({'op': 'echo'}))
+
+#Tests that If-None-Match matches the ETag alone, in a list, weak or as *, and never a response without one
+    def test_serving_etag_matches(self):
+
+        self.assertTrue(serving.etagMatches('"abc"', '"abc"'))
+        self.assertTrue(serving.etagMatches('"x", W/"abc"', '"abc"'))
+        self.assertTrue(serving.etagMatches('*', '"abc"'))
+        self.assertFalse(serving.etagMatches('"abd"', '"abc"'))
+        self.assertFalse(serving.etagMatches('', '"abc"'))
+        self.assertFalse(serving.etagMatches('*', None))
+
+#Tests that the cache keeps the most recently used bodies, each with an ETag of its content
+    def test_serving_response_cache(self):
+
+        cache = serving.ResponseCache(2)
+        first = cache.put('a', '{"n":1}')
+        cache.put('b', '{"n":2}')
+        cache.get('a')
+        cache.put('c', '{"n":3}')
+
+        self.assertEqual(cache.get('a'), ('{"n":1}', first))
+        self.assertIsNone(cache.get('b'), 'The least recently used body was kept')
+        self.assertNotEqual(cache.get('c')[1], first)
+        self.assertEqual(cache.put('d', '{"n":1}'), first, 'The same body has a different ETag')
+
+#Tests that a cacheable response is served from the cache with its ETag, and an error is never cached
+    def test_serving_dispatch_body_cached(self):
+
+        grid = '2200000000004400'
+        userParms = {'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+        body, etag = serving.dispatchBody(userParms)
+
+        self.assertIsNotNone(etag)
+        self.assertEqual(serving.dispatchBody(dict(userParms)), (body, etag))
+        self.assertEqual(serving.cacheHeaders(etag), {'ETag': etag, 'Cache-Control': 'public, max-age=' + str(serving.CACHE_MAX_AGE)})
+
+        body, etag = serving.dispatchBody(dict(userParms, integrity='B942'))
+        self.assertEqual(json.loads(body), {'status': 'error: bad integrity value'})
+        self.assertIsNone(etag, 'An error response was cached')
+        self.assertEqual(serving.cacheHeaders(etag), {'Cache-Control': 'no-store'})
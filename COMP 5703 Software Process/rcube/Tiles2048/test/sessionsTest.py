@@ -0,0 +1,203 @@
+import os
+import hashlib
+import tempfile
+import threading
+import unittest
+import Tiles2048.sessions as sessions
+import Tiles2048.dispatch as dispatch
+
+class SessionsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.saved = sessions.store
+        sessions.store = sessions.SessionStore(100, 60, clock=self.clock)
+
+    def tearDown(self):
+        sessions.store = self.saved
+
+    def clock(self):
+        return self.now
+
+#Tests that a created session is played with only its id and a direction
+    def test_sessions_create_and_shift(self):
+
+        created = dispatch._dispatch({'op': 'create', 'session': '1', 'seed': 'a'})
+        sessionId = created['session']
+
+        shifted = dispatch._dispatch({'op': 'shift', 'session': sessionId, 'direction': 'left'})
+        status = dispatch._dispatch({'op': 'status', 'session': sessionId})
+
+        self.assertTrue(0 < len(sessionId) <= 16, 'The session id is not short')
+        self.assertEqual(shifted['session'], sessionId)
+        self.assertNotIn('integrity', shifted)
+        self.assertEqual(status['grid'], shifted['grid'])
+        self.assertEqual(status['score'], shifted['score'])
+        self.assertIn(sum([int(tile) for tile in shifted['grid']]), (6, 8), 'The new number was not added to the kept board')
+
+#Tests that a session keeps its size and plays a list of moves
+    def test_sessions_size_and_moves(self):
+
+        created = dispatch._dispatch({'op': 'create', 'session': '1', 'size': '5', 'seed': 'b'})
+        kept = dispatch._dispatch({'op': 'shift', 'session': created['session'], 'moves': 'lurd', 'spawn': 'hash'})
+
+        self.assertEqual(len(kept['grid']), 25)
+        self.assertEqual(kept['moves'], '4')
+        self.assertEqual(dispatch._dispatch({'op': 'status', 'session': created['session']})['grid'], kept['grid'])
+
+#Tests that a recommend on a session searches the kept board, with no grid, score or integrity sent
+    def test_sessions_recommend(self):
+
+        created = dispatch._dispatch({'op': 'create', 'session': '1', 'seed': 'c'})
+        grid = created['grid']
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+
+        recommended = dispatch._dispatch({'op': 'recommend', 'session': created['session'], 'depth': '2', 'budgetMs': '0'})
+        expected = dispatch._dispatch({'op': 'recommend', 'grid': grid, 'score': '0', 'integrity': integrity, 'depth': '2', 'budgetMs': '0'})
+
+        self.assertEqual(recommended, dict(expected, session=created['session']))
+        self.assertEqual(dispatch._dispatch({'op': 'recommend', 'session': 'nope'}), {'status': sessions.ERROR})
+        self.assertEqual(dispatch._dispatch({'op': 'recommend', 'session': created['session'], 'strategy': 'guess'}),
+                         {'status': 'error: invalid strategy'})
+
+        large = dispatch._dispatch({'op': 'create', 'session': '1', 'size': '5', 'seed': 'c'})
+        self.assertEqual(dispatch._dispatch({'op': 'recommend', 'session': large['session']})['status'],
+                         'error: invalid session - recommend only plays 4x4 games')
+
+#Tests that an unknown session and a bad session flag are reported
+    def test_sessions_errors(self):
+
+        self.assertEqual(dispatch._dispatch({'op': 'shift', 'session': 'nope', 'direction': 'up'}),
+                         {'status': 'error: unknown session'})
+        self.assertEqual(dispatch._dispatch({'op': 'create', 'session': '2'}),
+                         {'status': 'error: invalid session - expected 0 or 1'})
+        self.assertNotIn('session', dispatch._dispatch({'op': 'create'}))
+
+#Tests that a game unused for longer than the TTL expires, and a used one does not
+    def test_sessions_ttl(self):
+
+        store = sessions.store
+        idle = store.create(1, 0, 4)
+        used = store.create(2, 0, 4)
+        self.now += 40
+        store.get(used)
+        self.now += 40
+
+        self.assertEqual(store.get(idle), None)
+        self.assertEqual(store.get(used), (2, 0, 4))
+
+#Tests that the least recently used game is dropped past the capacity
+    def test_sessions_lru(self):
+
+        store = sessions.SessionStore(2, 60, clock=self.clock)
+        first = store.create(1, 0, 4)
+        second = store.create(2, 0, 4)
+        store.get(first)
+        store.create(3, 0, 4)
+
+        self.assertEqual(store.get(second), None)
+        self.assertEqual(store.get(first), (1, 0, 4))
+
+#Tests that session=0 plays and reports the grid sent, as no session does
+    def test_sessions_zero_is_no_session(self):
+
+        grid = '2200000000002200'
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+
+        shifted = dispatch._dispatch({'op': 'shift', 'session': '0', 'grid': grid, 'score': '0', 'direction': 'left', 'integrity': integrity})
+        status = dispatch._dispatch({'op': 'status', 'session': '0', 'grid': grid, 'score': '0', 'integrity': integrity})
+
+        self.assertEqual(shifted['status'], 'ok')
+        self.assertEqual(status['status'], 'ok')
+        self.assertNotIn('session', shifted)
+
+#Tests that session=1 is refused when several workers would each keep their own games
+    def test_sessions_refused_unshared(self):
+
+        workers = sessions.WORKERS
+        sessions.WORKERS = 2
+        try:
+            self.assertEqual(dispatch._dispatch({'op': 'create', 'session': '1'}), {'status': sessions.UNSHARED_ERROR})
+            self.assertEqual(dispatch._dispatch({'op': 'create', 'seed': 'a'})['status'], 'ok')
+        finally:
+            sessions.WORKERS = workers
+
+#Tests that two stores on one database (two workers) play the same game, each seeing the other's moves
+    def test_sessions_database_shared(self):
+
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, 'sessions.db')
+        first = sessions.SessionStore(1, 60, path, clock=self.clock)
+        second = sessions.SessionStore(1, 60, path, clock=self.clock)
+        try:
+            self.assertTrue(first.shared())
+            large = 1 << 99
+            sessionId = first.create(large, 8, 5)
+            self.assertEqual(second.get(sessionId), (large, 8, 5))
+
+            self.assertEqual(second.update(sessionId, lambda board, score, size: ((board | 1, score + 4), 'played')), 'played')
+            self.assertEqual(first.get(sessionId), (large | 1, 12, 5), 'The cached game was not read again')
+
+            #the first store's move loses to one the second store writes while it plays, and is played again
+            plays = []
+            def play(board, score, size):
+                if not plays:
+                    second.update(sessionId, lambda board, score, size: ((board | 2, score + 2), 'other'))
+                plays.append(board)
+                return (board | 4, score + 4), 'mine'
+            self.assertEqual(first.update(sessionId, play), 'mine')
+            self.assertEqual(plays, [large | 1, large | 3])
+            self.assertEqual(second.get(sessionId), (large | 7, 18, 5))
+
+            self.now += 61
+            self.assertEqual(first.get(sessionId), None)
+            self.assertEqual(second.update(sessionId, play), None)
+        finally:
+            first.close()
+            second.close()
+            directory.cleanup()
+
+#Tests that the database is in WAL mode and that expired games are purged by a create at most once per interval
+    def test_sessions_database_purge(self):
+
+        directory = tempfile.TemporaryDirectory()
+        store = sessions.SessionStore(10, 10, os.path.join(directory.name, 'sessions.db'), clock=self.clock)
+        try:
+            database = store.database()
+            self.assertEqual(database.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            expired = store.create(1, 0, 4)
+            self.now += 11
+            store.create(2, 0, 4)
+            self.assertEqual(database.execute('SELECT COUNT(*) FROM sessions').fetchone()[0], 2, 'Games were purged before the interval')
+
+            self.now += sessions.PURGE_INTERVAL
+            store.create(3, 0, 4)
+            self.assertIsNone(database.execute('SELECT id FROM sessions WHERE id = ?', (expired,)).fetchone(), 'An expired game was not purged')
+            self.assertEqual(database.execute('SELECT COUNT(*) FROM sessions').fetchone()[0], 1)
+        finally:
+            store.close()
+            directory.cleanup()
+
+#Tests that a long move on one game does not hold up a move on another
+    def test_sessions_lock_per_game(self):
+
+        store = sessions.store
+        slow = store.create(1, 0, 4)
+        fast = store.create(2, 0, 4)
+        started = threading.Event()
+        release = threading.Event()
+
+        def wait(board, score, size):
+            started.set()
+            release.wait(5)
+            return (board, score), 'slow'
+
+        thread = threading.Thread(target=store.update, args=(slow, wait))
+        thread.start()
+        started.wait(5)
+        try:
+            self.assertEqual(store.update(fast, lambda board, score, size: ((board, score + 2), 'fast')), 'fast')
+            self.assertEqual(store.get(fast), (2, 2, 4))
+        finally:
+            release.set()
+            thread.join()
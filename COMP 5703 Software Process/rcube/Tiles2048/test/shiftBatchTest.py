@@ -0,0 +1,74 @@
+import unittest
+import json
+import hashlib
+import Tiles2048.shiftBatch as shiftBatch
+import Tiles2048.dispatch as dispatch
+
+class ShiftBatchTest(unittest.TestCase):
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+#Tests that a missing or unreadable boards value is reported
+    def test_shiftBatch_missing_and_invalid_boards(self):
+
+        self.assertEqual(shiftBatch._shiftBatch({'op': 'shiftBatch'}), {'status': 'error: missing boards'})
+        self.assertEqual(shiftBatch._shiftBatch({'op': 'shiftBatch', 'boards': '[{'}),
+                         {'status': 'error: invalid boards - not a JSON array'})
+
+#Tests that every board gets its own result in order, with errors kept per board
+    def test_shiftBatch_results_in_order(self):
+
+        grid = '2200000000002200'
+        entries = [{'grid': grid, 'score': '0', 'direction': 'left', 'integrity': self.generateHash(grid, '0')},
+                   {'grid': grid, 'score': '0', 'direction': 'left', 'integrity': 'B942E8D41B4'},
+                   {'grid': grid, 'score': 4, 'direction': 'right', 'integrity': self.generateHash(grid, '4')}]
+
+        actualResult = shiftBatch._shiftBatch({'op': 'shiftBatch', 'boards': json.dumps(entries)})
+        results = actualResult.get('results', [])
+
+        self.assertEqual(actualResult.get('status'), 'ok')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['grid'][0] + results[0]['grid'][12], '44', 'First board does not shift left')
+        self.assertEqual(results[0]['score'], '8')
+        self.assertEqual(results[0]['integrity'], self.generateHash(results[0]['grid'], results[0]['score']))
+        self.assertEqual(results[1], {'status': 'error: bad integrity value'})
+        self.assertEqual(results[2]['grid'][3] + results[2]['grid'][15], '44', 'Third board does not shift right')
+        self.assertEqual(results[2]['score'], '12')
+
+#Tests that an entry that is not a dictionary is reported without failing the batch
+    def test_shiftBatch_invalid_entry(self):
+
+        actualResult = shiftBatch._shiftBatch({'op': 'shiftBatch', 'boards': ['not a board']})
+
+        self.assertEqual(actualResult, {'results': [{'status': 'error: invalid board entry'}], 'status': 'ok'})
+
+#Tests that a dispatched batch gives every request the result _dispatch would give it
+    def test_dispatchBatch_matches_dispatch(self):
+
+        grid = '2200000000002200'
+        requests = [{'op': 'shift', 'grid': grid, 'score': '0', 'direction': 'left', 'integrity': self.generateHash(grid, '0')},
+                    {'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')},
+                    {'op': 'shift', 'grid': grid, 'score': '0', 'integrity': 'bad'},
+                    {'op': 'nope'},
+                    {'op': 'shift', 'grid': grid, 'score': '0', 'moves': 'll', 'spawn': 'hash', 'integrity': self.generateHash(grid, '0')}]
+
+        results = dispatch._dispatchBatch(requests)
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]['grid'][0] + results[0]['grid'][12] + results[0]['score'], '448')
+        self.assertEqual(results[0]['integrity'], self.generateHash(results[0]['grid'], results[0]['score']))
+        for i in (1, 2, 3, 4):
+            self.assertEqual(results[i], dispatch._dispatch(requests[i]), 'Batched request ' + str(i) + ' differs from _dispatch')
+
+#Tests that an entry holding a nested value is rejected instead of shifted with its Python text
+    def test_shiftBatch_nested_value_rejected(self):
+
+        grid = '2200000000002200'
+        entries = [{'grid': grid, 'score': '0', 'direction': ['left'], 'integrity': self.generateHash(grid, '0')}]
+
+        actualResult = shiftBatch._shiftBatch({'op': 'shiftBatch', 'boards': json.dumps(entries)})
+
+        self.assertEqual(actualResult['results'], [{'status': 'error: invalid board entry - direction is not a string or number'}])
@@ -1,6 +1,8 @@
 import unittest
+import random
 import Tiles2048.create as create
 import Tiles2048.shift as shift
+import Tiles2048.bitboard as bitboard
 import hashlib
 
 class ShiftTest(unittest.TestCase):
@@ -56,7 +58,7 @@ class ShiftTest(unittest.TestCase):
         userParmsShift = {'op': 'shift', 'grid': '00002481600001280361', 'score': '0', 'direction': 'down', \
                     'integrity': integrity}
         
-        expectedErrorMessage = {'status': 'error: missing grid'}
+        expectedErrorMessage = {'status': 'error: invalid grid - invalid tile at character 18'}
         
         actualErrorMessage = shift._shift(userParmsShift)
         self.assertEqual(actualErrorMessage, expectedErrorMessage, \
@@ -329,3 +331,153 @@ class ShiftTest(unittest.TestCase):
         self. assertEqual(actualWinGridStatus, 'win', 'Status does not update to win when appropriate')
         self. assertEqual(actualLoseGridStatus, 'lose', 'Status does not update to lose when appropriate')
         
+
+#Tests that a sequence of moves is played with one integrity value in and one out
+    def test_shift_multiple_moves(self):
+        
+        grid = '2200000000002200'
+        
+        hashString = grid + "." + '0'
+        myHash = hashlib.sha256()
+        myHash.update(hashString.encode())
+        integrity = myHash.hexdigest().upper()
+        
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'moves': 'LLr', 'integrity': integrity}
+        
+        actualShiftOutput = shift._shift(userParams)
+        
+        hashString = actualShiftOutput.get('grid', '') + "." + actualShiftOutput.get('score', '')
+        myHash = hashlib.sha256()
+        myHash.update(hashString.encode())
+        expectedIntegrity = myHash.hexdigest().upper()
+        
+        self.assertEqual(actualShiftOutput.get('moves', ''), '3', 'Shift does not report the number of moves played')
+        self.assertEqual(actualShiftOutput.get('status', ''), 'ok')
+        self.assertGreaterEqual(int(actualShiftOutput.get('score', '0')), 8, 'Shift does not keep the score across moves')
+        self.assertEqual(actualShiftOutput.get('integrity', ''), expectedIntegrity, 'Shift does not sign the final grid')
+
+#Tests that a sequence stops as soon as the game is won
+    def test_shift_multiple_moves_stop_on_win(self):
+        
+        grid = '1024102400000000000000'
+        
+        hashString = grid + "." + '0'
+        myHash = hashlib.sha256()
+        myHash.update(hashString.encode())
+        integrity = myHash.hexdigest().upper()
+        
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'moves': 'lrud', 'integrity': integrity}
+        
+        actualShiftOutput = shift._shift(userParams)
+        
+        self.assertEqual(actualShiftOutput.get('status', ''), 'win')
+        self.assertEqual(actualShiftOutput.get('moves', ''), '1', 'Shift keeps playing after a win')
+        self.assertTrue(actualShiftOutput.get('grid', '').startswith('2048'))
+
+#Tests that an unknown move letter is reported
+    def test_shift_invalid_moves_value(self):
+        
+        grid = '2200000000002200'
+        
+        hashString = grid + "." + '0'
+        myHash = hashlib.sha256()
+        myHash.update(hashString.encode())
+        integrity = myHash.hexdigest().upper()
+        
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'moves': 'lxr', 'integrity': integrity}
+        
+        expectedErrorMessage = {'status': 'error: invalid moves - use only u, d, l and r'}
+        
+        actualErrorMessage = shift._shift(userParams)
+        self.assertEqual(actualErrorMessage, expectedErrorMessage, 'Shift does not display correct error for invalid moves')
+
+#Tests that the new number only ever lands in an empty cell and a full board is left alone
+    def test_shift_insert_new_number_empty_cells(self):
+
+        board = bitboard.parseGrid('24816168422481616800')
+        rng = random.Random(5703)
+
+        for _ in range(50):
+            cells = bitboard.cells(shift.insertNewNumber(board, rng))
+            self.assertEqual(cells[:14], bitboard.cells(board)[:14], 'New number replaces an existing tile')
+            self.assertEqual(sorted(cells[14:])[0], 0, 'New number is not placed in exactly one empty cell')
+            self.assertIn(max(cells[14:]), (1, 2), 'New number is not a 2 or a 4')
+
+        full = bitboard.parseGrid('24816168422481616842')
+        self.assertEqual(shift.insertNewNumber(full, rng), full, 'Full board is changed')
+
+#Tests that the table lookup picks the same cell as stepping through the empty cells
+    def test_shift_insert_new_number_select(self):
+
+        rng = random.Random(2048)
+
+        for _ in range(200):
+            board = rng.getrandbits(64) & rng.getrandbits(64)
+            empty = bitboard.emptyMask(board)
+            cells = [position for position in range(0, 64, 4) if (empty >> position) & 1]
+            self.assertEqual(bitboard.emptyFlags(board), sum([1 << (position // 4) for position in cells]), 'Empty flags are not in cell order')
+            for n, position in enumerate(cells):
+                self.assertEqual(4 * bitboard.selectFlag(bitboard.emptyFlags(board), n), position, 'Wrong empty cell selected')
+
+#Tests that the same seed places the same new numbers
+    def test_shift_insert_new_number_seeded(self):
+
+        board = bitboard.parseGrid('2000000000000000')
+        first = [shift.insertNewNumber(board, random.Random(seed)) for seed in range(20)]
+        second = [shift.insertNewNumber(board, random.Random(seed)) for seed in range(20)]
+
+        self.assertEqual(first, second, 'Seeded placement is not repeatable')
+        self.assertGreater(len(set(first)), 1, 'Placement does not depend on the seed')
+
+#Tests that spawn=hash gives the same board for the same request and answers a retry from the cache
+    def test_shift_hash_spawn_repeatable(self):
+
+        grid = '2200000000002200'
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'moves': 'lurd', 'spawn': 'hash', 'integrity': integrity}
+
+        shift.cachedShift.cache_clear()
+        first = shift._shift(userParams)
+        second = shift._shift(dict(userParams))
+
+        self.assertEqual(first, second, 'Identical hash spawn requests give different results')
+        self.assertEqual(first, shift.shiftBoard(userParams), 'Cached result differs from a fresh shift')
+        self.assertEqual(shift.cachedShift.cache_info().hits, 1, 'Retried request is not answered from the cache')
+        self.assertEqual(first.get('moves'), '4')
+
+#Tests that an unknown spawn mode is reported
+    def test_shift_invalid_spawn_value(self):
+
+        grid = '2200000000002200'
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'spawn': 'fixed', 'integrity': integrity}
+
+        self.assertEqual(shift._shift(userParams), {'status': 'error: invalid spawn - expected random or hash'})
+
+#Tests a shift on a 5x5 grid
+    def test_shift_size_five(self):
+
+        grid = '2200000000000000000000022'
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+        userParams = {'op': 'shift', 'grid': grid, 'score': '0', 'direction': 'left', 'size': '5', 'integrity': integrity}
+
+        actualShiftOutput = shift._shift(userParams)
+        newGrid = actualShiftOutput.get('grid', '')
+
+        self.assertEqual(len(newGrid) - newGrid.count('0'), 3, 'Shifted grid does not hold two 4s and one new tile')
+        self.assertEqual(len(newGrid), 25, 'Shifted grid is not 5x5')
+        self.assertTrue(newGrid.startswith('4'), 'Top row does not shift left')
+        self.assertEqual(actualShiftOutput.get('score', ''), '8')
+        self.assertEqual(actualShiftOutput.get('status', ''), 'ok')
+
+#Tests that a size outside 3 to 8, or a grid of the wrong size, is reported
+    def test_shift_invalid_size_value(self):
+
+        grid = '2200000000002200'
+        integrity = hashlib.sha256((grid + '.0').encode()).hexdigest().upper()
+
+        self.assertEqual(shift._shift({'op': 'shift', 'grid': grid, 'score': '0', 'size': '9', 'integrity': integrity}),
+                         {'status': 'error: invalid size - expected 3 to 8'})
+        self.assertEqual(shift._shift({'op': 'shift', 'grid': grid, 'score': '0', 'size': '5', 'integrity': integrity}),
+                         {'status': 'error: invalid grid - not enough characters'})
+
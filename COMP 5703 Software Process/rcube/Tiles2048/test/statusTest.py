@@ -0,0 +1,74 @@
+import unittest
+import hashlib
+import Tiles2048.status as status
+
+class StatusTest(unittest.TestCase):
+
+    def generateHash(self, grid, score):
+        myHash = hashlib.sha256()
+        myHash.update((grid + "." + score).encode())
+        return myHash.hexdigest().upper()
+
+    def statusOf(self, grid):
+        userParms = {'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+        return status._status(userParms)
+
+#Tests that the grid, score and integrity are checked the same way as for shift
+    def test_status_bad_integrity_value(self):
+
+        userParms = {'op': 'status', 'grid': '2200000000002200', 'score': '0', 'integrity': 'B942E8D41B4'}
+
+        self.assertEqual(status._status(userParms), {'status': 'error: bad integrity value'})
+
+#Tests a game that can still be played
+    def test_status_ok(self):
+
+        expectedResult = {'directions': ['up', 'down', 'right', 'left'], 'maxTile': '4', 'empty': '12', 'status': 'ok'}
+
+        self.assertEqual(self.statusOf('2200000000004400'), expectedResult)
+
+#Tests that only the directions that change the grid are listed
+    def test_status_some_directions(self):
+
+        actualResult = self.statusOf('24816168422481616840')
+
+        self.assertEqual(actualResult['directions'], ['down', 'right'])
+        self.assertEqual(actualResult['maxTile'], '16')
+        self.assertEqual(actualResult['empty'], '1')
+
+#Tests a game with no legal move left
+    def test_status_lose(self):
+
+        expectedResult = {'directions': [], 'maxTile': '16', 'empty': '0', 'status': 'lose'}
+
+        self.assertEqual(self.statusOf('24816168422481616842'), expectedResult)
+
+#Tests that a 2048 tile means the game is won
+    def test_status_win(self):
+
+        actualResult = self.statusOf('2048' + '0' * 15)
+
+        self.assertEqual(actualResult['status'], 'win')
+        self.assertEqual(actualResult['maxTile'], '2048')
+        self.assertEqual(actualResult['empty'], '15')
+
+#Tests that a grid with 2, 0, 4, 8 side by side is not mistaken for a win
+    def test_status_2048_digits_not_a_win(self):
+
+        actualResult = self.statusOf('2048' + '0' * 12)
+
+        self.assertEqual(actualResult['status'], 'ok')
+        self.assertEqual(actualResult['maxTile'], '8')
+
+#Tests that a batch of status requests gives every request its own status, equal ones answered alike
+    def test_status_all(self):
+
+        grid = '2200000000004400'
+        userParms = {'op': 'status', 'grid': grid, 'score': '0', 'integrity': self.generateHash(grid, '0')}
+        batch = [userParms, {'op': 'status', 'grid': grid, 'score': '0', 'integrity': 'B942'}, dict(userParms)]
+
+        results = status.statusAll(batch)
+
+        self.assertEqual(results, [status._status(userParms) for userParms in batch])
+        self.assertEqual(results[0], results[2])
+        self.assertIsNot(results[0], results[2], 'Equal requests share one result')
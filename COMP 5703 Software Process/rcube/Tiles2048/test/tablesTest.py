@@ -0,0 +1,86 @@
+import os
+import unittest
+import tempfile
+from array import array
+import Tiles2048.tables as tables
+import Tiles2048.bitboard as bitboard
+
+class TablesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.builds = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def build(self):
+        self.builds += 1
+        return [array('H', range(65536)), array('d', [0.5]) * 65536]
+
+    def load(self, fingerprint='test'):
+        return tables.load('test', ('H', 'd'), fingerprint, self.build, self.directory.name)
+
+#Tests that tables are built once, then mapped from the file with the same values
+    def test_tables_round_trip(self):
+
+        built = self.load()
+        mapped = self.load()
+
+        self.assertEqual(self.builds, 1, 'Tables were built again although the file was valid')
+        self.assertIsInstance(mapped[0], memoryview)
+        self.assertEqual(list(mapped[0]), list(built[0]))
+        self.assertEqual(mapped[1][65535], 0.5)
+
+#Tests that a file with a changed byte fails its checksum and is rebuilt
+    def test_tables_corrupt_file_rebuilt(self):
+
+        self.load()
+        path = os.path.join(self.directory.name, 'test.bin')
+        with open(path, 'r+b') as tableFile:
+            tableFile.seek(tables.HEADER.size + 1000)
+            tableFile.write(b'\xff')
+
+        mapped = self.load()
+
+        self.assertEqual(self.builds, 2, 'A corrupt table file was used')
+        self.assertEqual(mapped[0][500], 500)
+
+#Tests that tables built from other inputs are not used
+    def test_tables_fingerprint_rebuilt(self):
+
+        self.load('weights 1')
+        self.load('weights 2')
+
+        self.assertEqual(self.builds, 2, 'Tables built from other inputs were used')
+
+#Tests that the built tables are used from memory when the file cannot be written
+    def test_tables_unwritable_directory(self):
+
+        blocker = os.path.join(self.directory.name, 'file')
+        open(blocker, 'w').close()
+
+        result = tables.load('test', ('H', 'd'), 'test', self.build, blocker)
+
+        self.assertIsInstance(result[0], array)
+        self.assertEqual(result[0][7], 7)
+
+#Tests that the mapped move tables match a fresh build
+    def test_tables_move_tables_match_build(self):
+
+        built = bitboard.buildMoveTables()
+
+        for table, expected in zip((bitboard.ROW_LEFT, bitboard.ROW_RIGHT, bitboard.SCORE_LEFT, bitboard.SCORE_RIGHT), built):
+            self.assertEqual(list(table), list(expected))
+
+#Tests that the code fingerprint is stable and changes with the code
+    def test_tables_code_fingerprint(self):
+
+        def first(row):
+            return [tile * 2 for tile in row]
+
+        def second(row):
+            return [tile * 3 for tile in row]
+
+        self.assertEqual(tables.codeFingerprint(first), tables.codeFingerprint(first))
+        self.assertNotEqual(tables.codeFingerprint(first), tables.codeFingerprint(second))
@@ -0,0 +1,73 @@
+import os
+import unittest
+import Tiles2048.transposition as transposition
+
+class TranspositionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = transposition.TranspositionTable(entries=8, name='tiles2048_transposition_test')
+
+    def tearDown(self):
+        self.table.close()
+
+#Tests that a stored value is found again for the same depth only
+    def test_transposition_store_and_lookup(self):
+
+        self.table.store(0x1234, 3, 1.5)
+
+        self.assertEqual(self.table.lookup(0x1234, 3), 1.5)
+        self.assertIsNone(self.table.lookup(0x1234, 2), 'Deeper result is reused for a shallower search')
+        self.assertIsNone(self.table.lookup(0x1234, 4), 'Shallower result is reused for a deeper search')
+        self.assertIsNone(self.table.lookup(0x4321, 1), 'Unknown key is found')
+
+#Tests that storing the same key again replaces its entry
+    def test_transposition_replace(self):
+
+        self.table.store(0x1234, 1, 1.0)
+        self.table.store(0x1234, 2, 2.0)
+
+        self.assertEqual(self.table.lookup(0x1234, 2), 2.0)
+
+#Tests that the table stays bounded and keeps recently used entries
+    def test_transposition_second_chance_eviction(self):
+
+        keys = list(range(1, 200))
+        for key in keys:
+            self.table.store(key, 1, float(key))
+            #the first key is read after every store, so it keeps getting a second chance
+            self.table.lookup(keys[0], 1)
+
+        found = [key for key in keys if self.table.lookup(key, 1) != None]
+
+        self.assertLessEqual(len(found), 8, 'Table holds more entries than its size')
+        self.assertIn(keys[0], found, 'Referenced entry was evicted')
+
+#Tests that a damaged entry reads as a miss instead of a wrong value
+    def test_transposition_torn_entry(self):
+
+        self.table.store(0x1234, 3, 1.5)
+        offset = self.table.bucketOffset(0x1234)
+        self.table.buffer[offset + 8] ^= 0xFF
+
+        self.assertIsNone(self.table.lookup(0x1234, 3))
+
+#Tests that a process that only attached to the block leaves it for the process that made it
+    def test_transposition_attached_close_keeps_block(self):
+
+        self.table.store(0x1234, 3, 1.5)
+        attached = transposition.TranspositionTable(entries=8, name='tiles2048_transposition_test')
+        attached.close()
+
+        again = transposition.TranspositionTable(entries=8, name='tiles2048_transposition_test')
+        try:
+            self.assertEqual(again.lookup(0x1234, 3), 1.5, 'The block was removed by a process that did not make it')
+        finally:
+            again.close()
+
+#Tests that the block name carries the heuristic's fingerprint and this process
+    def test_transposition_table_name(self):
+
+        name = transposition.tableName()
+
+        self.assertTrue(name.endswith('_' + str(os.getpid())))
+        self.assertLessEqual(len(name), 31)
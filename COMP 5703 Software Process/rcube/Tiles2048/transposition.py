@@ -0,0 +1,157 @@
+import os
+import atexit
+import struct
+import hashlib
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+import Tiles2048.heuristic as heuristic
+
+#-------------------------------------------------------------------------------
+#A transposition table for recommend, held in shared memory so every worker
+#process of one server reads and writes the same entries.
+#
+#Entries are grouped into buckets of WAYS slots; a key can only live in its own
+#bucket. Each slot holds (check, value, depth, referenced) where check is
+#key ^ valueBits ^ depth. Workers write without locks, so a slot torn by two
+#writers simply fails the check and reads as a miss. A full bucket evicts by
+#second chance: starting at a slot picked from the key's hash, referenced slots
+#have the bit cleared and are passed over, and the first unreferenced one is
+#replaced. There is no hand kept between stores.
+#
+#The block is named after the heuristic it holds values of and the process that
+#made it (the gunicorn master makes it before forking), so another server, a
+#test run or a table of an older heuristic is never attached by mistake.
+#TRANSPOSITION_TABLE names the block to use instead, and is set for the
+#processes started by the one that made it. Only that process removes it.
+#-------------------------------------------------------------------------------
+
+TABLE_ENV = 'TRANSPOSITION_TABLE'
+DEFAULT_ENTRIES = 1 << 16
+WAYS = 4
+
+ENTRY = struct.Struct('<QdBB6x')
+DOUBLE = struct.Struct('<d')
+BITS = struct.Struct('<Q')
+UINT64 = 0xFFFFFFFFFFFFFFFF
+
+_sharedTable = None
+
+#the name of the block this process would make: the heuristic's fingerprint and this process's pid
+#(short, as some systems limit shared memory names to 31 characters)
+def tableName():
+    layout = heuristic.fingerprint() + ENTRY.format + str(WAYS) + str(DEFAULT_ENTRIES)
+    return 't2048_' + hashlib.sha256(layout.encode()).hexdigest()[:10] + '_' + str(os.getpid())
+
+class TranspositionTable:
+
+    #name=None keeps a private table; owner takes over a block of this name that is already there
+    #(one left by a crashed process that had the same pid), so it is removed when this process is done
+    def __init__(self, entries=DEFAULT_ENTRIES, name=None, owner=False):
+        self.buckets = max(1, entries // WAYS)
+        size = self.buckets * WAYS * ENTRY.size
+        self.name = name
+        self.memory = None
+        self.ownerPid = None
+        self.buffer = bytearray(size)
+        if name == None:
+            return
+        try:
+            try:
+                self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+                self.ownerPid = os.getpid()
+            except FileExistsError:
+                self.memory = shared_memory.SharedMemory(name=name)
+                if owner:
+                    self.ownerPid = os.getpid()
+                else:
+                    untrack(name)
+                if self.memory.size < size:
+                    raise OSError('shared table ' + name + ' is too small')
+            self.buffer = self.memory.buf
+        except OSError:
+            #no usable shared memory here, so this process keeps a private table
+            self.close()
+            self.memory = None
+
+    #detaches from the shared block; the process that created it also removes it
+    #(forked workers inherit the table but never remove it)
+    def close(self):
+        if self.memory != None:
+            self.buffer = bytearray(len(self.buffer))
+            self.memory.close()
+            if self.ownerPid == os.getpid():
+                self.memory.unlink()
+            self.memory = None
+
+    #returns the value stored for key at exactly depth, or None; a deeper value is not reused for a shallower
+    #search, so a search's values, and the depth it reports, are those of the depth it was asked for
+    def lookup(self, key, depth):
+        offset = self.bucketOffset(key)
+        for way in range(WAYS):
+            check, value, storedDepth, referenced = ENTRY.unpack_from(self.buffer, offset)
+            if check != 0 and check ^ valueBits(value) ^ storedDepth == key:
+                if storedDepth != depth:
+                    return None
+                if not referenced:
+                    self.buffer[offset + 17] = 1
+                return value
+            offset += ENTRY.size
+        return None
+
+    def store(self, key, depth, value):
+        check = key ^ valueBits(value) ^ depth
+        start = self.bucketOffset(key)
+
+        #reuse the slot already holding key, otherwise the first empty one
+        victim = None
+        offset = start
+        for way in range(WAYS):
+            storedCheck, storedValue, storedDepth, referenced = ENTRY.unpack_from(self.buffer, offset)
+            if storedCheck == 0 or storedCheck ^ valueBits(storedValue) ^ storedDepth == key:
+                victim = offset
+                break
+            offset += ENTRY.size
+
+        #otherwise give referenced slots a second chance, starting from a slot picked by the key
+        if victim == None:
+            hand = (key >> 11) % WAYS
+            for step in range(2 * WAYS):
+                offset = start + ((hand + step) % WAYS) * ENTRY.size
+                if self.buffer[offset + 17]:
+                    self.buffer[offset + 17] = 0
+                else:
+                    victim = offset
+                    break
+
+        ENTRY.pack_into(self.buffer, victim, check, value, depth, 0)
+
+    def bucketOffset(self, key):
+        return (((key * 0x9E3779B97F4A7C15) & UINT64) % self.buckets) * WAYS * ENTRY.size
+
+#the raw bits of a float, so they can be folded into the check
+def valueBits(value):
+    return BITS.unpack(DOUBLE.pack(value))[0]
+
+#on 3.11 attaching registers the block with the resource tracker, which then removes it when this
+#process exits; only the process that made the block should remove it
+def untrack(name):
+    if os.name == 'posix':
+        resource_tracker.unregister('/' + name, 'shared_memory')
+
+#the table every search in this process uses; forked workers inherit the same mapping,
+#and other processes started from here attach by TRANSPOSITION_TABLE
+#a pool process with no table from its parent keeps a private one, as it would never get to remove a shared one
+def sharedTable():
+    global _sharedTable
+    if _sharedTable == None:
+        name = os.getenv(TABLE_ENV, '')
+        if name:
+            _sharedTable = TranspositionTable(name=name)
+        elif multiprocessing.parent_process() != None:
+            _sharedTable = TranspositionTable()
+        else:
+            _sharedTable = TranspositionTable(name=tableName(), owner=True)
+            if _sharedTable.memory != None:
+                os.environ[TABLE_ENV] = _sharedTable.name
+        atexit.register(_sharedTable.close)
+    return _sharedTable
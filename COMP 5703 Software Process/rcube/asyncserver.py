@@ -0,0 +1,202 @@
+import os
+import sys
+import asyncio
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import Tiles2048.dispatch as dispatch
+import serving
+import Tiles2048.metrics as metrics
+
+#-----------------------------------
+#  An asyncio front end for /2048 that micro-batches requests:
+#        python asyncserver.py
+#
+#  Requests that arrive within BATCH_WINDOW_US microseconds of each other (or BATCH_MAX of them)
+#  are handed to dispatch._dispatchBatch together, and each waiting request gets its own result.
+#  The batch runs on one engine thread so the event loop keeps reading sockets meanwhile.
+#  Only the ops that are answered as a batch (dispatch.BATCHED_OPS) use that thread; every other op,
+#  such as a recommend, and every POST body runs on a pool of WORKER_THREADS threads, so a slow one
+#  never holds up the batches behind it.
+#  Responses are the same JSON bodies as microservice.py, with HTTP/1.1 keep-alive.
+#  POST /2048 takes a JSON array of operations, and GET responses carry the same ETags, as in microservice.py.
+#  Any other method on /2048 gets a 405, and a request with a malformed Content-Length a 400.
+#  GET /metrics and /admin/profile behave as in microservice.py.
+#
+
+BATCH_WINDOW_US = int(os.getenv('BATCH_WINDOW_US', '200'))
+BATCH_MAX = int(os.getenv('BATCH_MAX', '256'))
+WORKER_THREADS = int(os.getenv('THREADS', '4'))
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 16 * 1024 * 1024
+HTTP_STATUS = {200: '200 OK', 304: '304 Not Modified', 403: '403 Forbidden', 404: '404 Not Found',
+               500: '500 Internal Server Error'}
+
+class MicroBatcher:
+
+    def __init__(self, window, maxBatch):
+        self.window = window
+        self.maxBatch = maxBatch
+        self.pending = []
+        self.timer = None
+        self.engine = ThreadPoolExecutor(max_workers=1)
+        self.workers = ThreadPoolExecutor(max_workers=WORKER_THREADS)
+
+    #queues one request and returns the future its result will be set on; an op that is not
+    #answered as a batch is run on its own worker thread instead
+    def submit(self, userParms):
+        loop = asyncio.get_running_loop()
+        if userParms.get(dispatch.OP) not in dispatch.BATCHED_OPS:
+            return loop.run_in_executor(self.workers, dispatch._dispatch, userParms)
+        future = loop.create_future()
+        self.pending.append((userParms, future))
+        if len(self.pending) >= self.maxBatch:
+            self.flush()
+        elif self.timer == None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer != None:
+            self.timer.cancel()
+            self.timer = None
+        batch = self.pending
+        self.pending = []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().run_in_executor(self.engine, dispatch._dispatchBatch,
+                                                          [userParms for userParms, _ in batch])
+        task.add_done_callback(lambda done: self.deliver(batch, done))
+
+    def deliver(self, batch, done):
+        error = done.exception()
+        for i, (userParms, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error != None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+
+#the query string as microservice.py reads it: every key once, with its first value
+def queryParms(target):
+    userParms = {}
+    for key, value in urllib.parse.parse_qsl(urllib.parse.urlsplit(target).query, keep_blank_values=True):
+        userParms.setdefault(key, value)
+    return userParms
+
+#body is text, or bytes that are already encoded
+def httpResponse(status, contentType, body, keepAlive, headers=None):
+    if isinstance(body, str):
+        body = body.encode()
+    head = 'HTTP/1.1 ' + status + '\r\nContent-Type: ' + contentType + '\r\nContent-Length: ' + str(len(body))
+    for name, value in (headers or {}).items():
+        head += '\r\n' + name + ': ' + value
+    head += '\r\nConnection: ' + ('keep-alive' if keepAlive else 'close') + '\r\n\r\n'
+    return head.encode() + body
+
+async def handleConnection(reader, writer, batcher):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+
+            lines = head.decode('latin-1').split('\r\n')
+            requestLine = lines[0].split(' ')
+            if len(requestLine) != 3:
+                writer.write(httpResponse('400 Bad Request', 'text/plain', 'bad request', False))
+                break
+            method, target, version = requestLine
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            #the body is only used by POST, but it always has to be read off the connection
+            lengthText = headers.get('content-length', '0') or '0'
+            if not (lengthText.isascii() and lengthText.isdigit()):
+                writer.write(httpResponse('400 Bad Request', 'text/plain', 'bad request', False))
+                break
+            length = int(lengthText)
+            if length > MAX_BODY_BYTES:
+                writer.write(httpResponse('413 Payload Too Large', 'text/plain', 'payload too large', False))
+                break
+            content = b''
+            if length:
+                content = await reader.readexactly(length)
+
+            connection = headers.get('connection', '').lower()
+            keepAlive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+
+            start = metrics.clock()
+            path = urllib.parse.urlsplit(target).path
+            if path == '/2048' and method == 'POST':
+                #a bulk request is already a batch, so it runs on a worker thread rather than waiting in one
+                code = 200
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(batcher.workers, serving.bulkResult, content)
+                    serving.logResponse(result)
+                    body = serving.responseBody(result)
+                except Exception as e:
+                    code = 500
+                    body = serving.statusBody('error: ' + str(e))
+                payload, extraHeaders = serving.encodeBody(body, headers.get('accept-encoding', ''))
+                writer.write(httpResponse(HTTP_STATUS[code], 'application/json', payload, keepAlive, extraHeaders))
+                metrics.observeHttp('POST /2048', code, metrics.clock() - start)
+            elif path == '/2048' and method != 'GET':
+                writer.write(httpResponse('405 Method Not Allowed', 'text/plain', 'method not allowed', keepAlive,
+                                          {'Allow': 'GET, POST'}))
+            elif path == '/2048':
+                etag = None
+                code = 200
+                try:
+                    userParms = queryParms(target)
+                    key = serving.cacheKey(userParms)
+                    cached = serving.responseCache.get(key) if key != None else None
+                    if cached != None:
+                        body, etag = cached
+                    else:
+                        result = await batcher.submit(userParms)
+                        serving.logResponse(result)
+                        body = serving.responseBody(result)
+                        if key != None and not serving.isError(result):
+                            etag = serving.responseCache.put(key, body)
+                except Exception as e:
+                    code = 500
+                    body = serving.statusBody('error: ' + str(e))
+                cacheHeaders = serving.cacheHeaders(etag)
+                if serving.etagMatches(headers.get('if-none-match', ''), etag):
+                    code = 304
+                    body = b''
+                writer.write(httpResponse(HTTP_STATUS[code], 'application/json', body, keepAlive, cacheHeaders))
+                metrics.observeHttp('GET /2048', code, metrics.clock() - start)
+            elif path == '/metrics':
+                writer.write(httpResponse('200 OK', metrics.CONTENT_TYPE, metrics.exposition(), keepAlive))
+            elif path == '/admin/profile':
+                code, body = serving.adminProfile(queryParms(target).get('rate', ''), headers.get('x-admin-token', ''))
+                writer.write(httpResponse(HTTP_STATUS[code], 'application/json' if code != 404 else 'text/plain', body, keepAlive))
+            elif path == '/info':
+                writer.write(httpResponse('200 OK', 'text/html; charset=utf-8', sys.version, keepAlive))
+            else:
+                writer.write(httpResponse('404 Not Found', 'text/plain', 'not found', keepAlive))
+            await writer.drain()
+
+            if not keepAlive:
+                break
+    finally:
+        writer.close()
+
+async def serve(host, port):
+    batcher = MicroBatcher(BATCH_WINDOW_US / 1e6, BATCH_MAX)
+    server = await asyncio.start_server(lambda reader, writer: handleConnection(reader, writer, batcher),
+                                        host, port, limit=MAX_HEADER_BYTES)
+    async with server:
+        await server.serve_forever()
+
+#-----------------------------------
+port = os.getenv('PORT', '5000')
+if __name__ == "__main__":
+    serving.warm()
+    serving.startWorker()
+    asyncio.run(serve('0.0.0.0', int(port)))
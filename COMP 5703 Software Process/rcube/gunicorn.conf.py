@@ -0,0 +1,61 @@
+import os
+import gc
+import shutil
+import tempfile
+
+#-----------------------------------
+#  Production serving for /2048:
+#        gunicorn -c gunicorn.conf.py microservice:app
+#
+#  The master imports the app and warms the engine once, then forks WEB_CONCURRENCY workers
+#  (one per core by default), so the tables are shared copy-on-write instead of built per worker.
+#  A worker is replaced gracefully, after its current request, once it has served MAX_REQUESTS.
+#
+
+#every worker writes its metrics to one directory so /metrics on any worker reports them all;
+#this runs before the app is loaded, so the workers see it; without a METRICS_DIR a fresh directory
+#is made for this start and removed when the server exits
+createdMetricsDir = ''
+if not os.getenv('METRICS_DIR'):
+    createdMetricsDir = tempfile.mkdtemp(prefix='rcube-metrics-')
+    os.environ['METRICS_DIR'] = createdMetricsDir
+
+bind = '0.0.0.0:' + os.getenv('PORT', '5000')
+#a small default, as os.cpu_count() reports the host's cores rather than the container's share of them,
+#and every worker holds its own sessions, caches and rollout pool; WEB_CONCURRENCY sets it
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+#the rollout pools share the cores between the workers (see Tiles2048/rollout.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+preload_app = True
+
+#threaded workers hold idle keep-alive connections open (the default sync worker closes every one)
+worker_class = 'gthread'
+threads = int(os.getenv('THREADS', '4'))
+keepalive = 5
+
+#the jitter keeps the workers from all restarting at the same moment
+max_requests = int(os.getenv('MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+graceful_timeout = 30
+timeout = 60
+
+#runs in the master after the app is loaded and before the first worker is forked
+def when_ready(server):
+    import serving
+    serving.warm()
+
+#objects that exist before the fork are moved out of the collector's reach,
+#so collections in the workers do not write to (and copy) the shared pages
+def pre_fork(server, worker):
+    gc.freeze()
+
+#runs in each worker as it starts: the worker's own threads are started here rather than in the master
+#(see serving.startWorker)
+def post_fork(server, worker):
+    import serving
+    serving.startWorker()
+
+#runs in the master as the server exits
+def on_exit(server):
+    if createdMetricsDir:
+        shutil.rmtree(createdMetricsDir, ignore_errors=True)
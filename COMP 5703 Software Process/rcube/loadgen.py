@@ -0,0 +1,237 @@
+import sys
+import json
+import time
+import random
+import atexit
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import Tiles2048.bitboard as bitboard
+import Tiles2048.shift as shift
+import Tiles2048.selfplay as selfplay
+
+#-----------------------------------
+#  Records, synthesizes and replays /2048 request streams
+#
+#  A trace is a JSON-lines file of {'t': seconds since the first request, 'parms': {query parameters}}.
+#  The server writes one when TRACE_FILE is set:
+#        TRACE_FILE=trace.jsonl python microservice.py
+#  or one can be made from self-play:
+#        python loadgen.py synthesize --games 200 --output trace.jsonl
+#  and replayed in-process through the Flask test client or over HTTP:
+#        python loadgen.py replay trace.jsonl --rate 500 --concurrency 8
+#        python loadgen.py replay trace.jsonl --target http://127.0.0.1:5000 --rate 0
+#
+#  The replay reports throughput and p50/p95/p99/p999 latency for every op.
+#
+
+PERCENTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99), ('p999', 0.999))
+
+#-------------------------------
+#traces
+#-------------------------------
+
+def readTrace(path):
+    with open(path) as traceFile:
+        return [json.loads(line) for line in traceFile if line.strip()]
+
+def writeTrace(path, records):
+    with open(path, 'w') as traceFile:
+        for record in records:
+            traceFile.write(json.dumps(record) + '\n')
+
+#appends requests to a trace file as the server handles them; the lines are kept in memory
+#and written BUFFER_LINES at a time (and at exit), so a request only appends to a list
+class TraceRecorder:
+
+    BUFFER_LINES = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.start = None
+        self.lines = []
+        atexit.register(self.close)
+
+    def record(self, userParms):
+        now = time.perf_counter()
+        with self.lock:
+            if self.start == None:
+                self.start = now
+            self.lines.append(json.dumps({'t': round(now - self.start, 6), 'parms': userParms}) + '\n')
+            if len(self.lines) >= self.BUFFER_LINES:
+                self.write()
+
+    #call with the lock held
+    def write(self):
+        lines = self.lines
+        self.lines = []
+        with open(self.path, 'a') as traceFile:
+            traceFile.write(''.join(lines))
+
+    #writes what is still buffered
+    def close(self):
+        with self.lock:
+            if self.lines:
+                self.write()
+
+#plays games with a self-play strategy and writes the requests a client would have sent:
+#a create, then a shift for every move, with a status and a recommend now and then
+def synthesize(games, strategy, seed, requestGap):
+    rng = random.Random(seed)
+    play = selfplay.strategyFor(strategy)
+    records = []
+    t = 0.0
+
+    def add(userParms):
+        nonlocal t
+        records.append({'t': round(t, 6), 'parms': userParms})
+        t += requestGap
+
+    for _ in range(games):
+        add({'op': 'create'})
+        board = selfplay.openingBoard(rng)
+        score = 0
+        status = 'ok'
+        while status == 'ok':
+            gridString = bitboard.toGridString(board)
+            integrity = shift.calculateIntegrity(gridString, str(score))
+            direction = play(board, rng)
+            add({'op': 'shift', 'grid': gridString, 'score': str(score), 'direction': direction, 'integrity': integrity})
+            if rng.random() < 0.05:
+                add({'op': 'status', 'grid': gridString, 'score': str(score), 'integrity': integrity})
+            if rng.random() < 0.02:
+                add({'op': 'recommend', 'grid': gridString, 'score': str(score), 'integrity': integrity, 'depth': '2'})
+            newBoard, gained = bitboard.MOVES[direction](board)
+            score += gained
+            board, status = shift.settleBoard(newBoard, rng)
+    return records
+
+#-------------------------------
+#senders
+#-------------------------------
+
+#sends through the Flask test client; each thread gets its own client
+class InProcessSender:
+
+    def __init__(self):
+        import microservice
+        self.app = microservice.app
+        self.local = threading.local()
+
+    def send(self, userParms):
+        client = getattr(self.local, 'client', None)
+        if client == None:
+            client = self.local.client = self.app.test_client()
+        response = client.get('/2048', query_string=userParms)
+        return response.status_code, response.get_data(as_text=True)
+
+#sends over HTTP with the standard library, so the tool needs nothing the service does not
+class HttpSender:
+
+    def __init__(self, target):
+        self.url = target.rstrip('/') + '/2048?'
+
+    def send(self, userParms):
+        with urllib.request.urlopen(self.url + urllib.parse.urlencode(userParms)) as response:
+            return response.status, response.read().decode()
+
+#-------------------------------
+#replay
+#-------------------------------
+
+#replays the trace and returns ({op: [latency seconds]}, {op: errors}, elapsed seconds)
+#rate is requests per second (0 sends as fast as the threads allow; -1 keeps the trace's own timing)
+#with a rate, latency is measured from when the request was due, so a slow server is not hidden by late sends
+def replay(records, sender, rate, concurrency):
+    if rate > 0:
+        due = [i / rate for i in range(len(records))]
+    elif rate < 0:
+        due = [record.get('t', 0.0) for record in records]
+    else:
+        due = None
+
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    start = time.perf_counter()
+
+    def run(i):
+        userParms = records[i]['parms']
+        if due != None:
+            sendAt = start + due[i]
+            delay = sendAt - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            sendAt = time.perf_counter()
+        try:
+            statusCode, body = sender.send(userParms)
+            failed = statusCode != 200 or "'status': 'error" in body or '"status":"error' in body
+        except Exception:
+            failed = True
+        latency = time.perf_counter() - sendAt
+        op = userParms.get('op', '')
+        with lock:
+            latencies.setdefault(op, []).append(latency)
+            if failed:
+                errors[op] = errors.get(op, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, range(len(records))))
+    return latencies, errors, time.perf_counter() - start
+
+def report(latencies, errors, elapsed):
+    total = sum([len(values) for values in latencies.values()])
+    print('requests   ' + str(total))
+    print('seconds    ' + format(elapsed, '.2f'))
+    print('req/s      ' + format(total / elapsed if elapsed else 0.0, '.1f'))
+    print('')
+    print('op'.ljust(12) + 'count'.rjust(8) + 'errors'.rjust(8) + ''.join([label.rjust(10) for label, _ in PERCENTILES]) + '   (ms)')
+    for op in sorted(latencies):
+        counts = Counter(latencies[op])
+        line = op.ljust(12) + str(len(latencies[op])).rjust(8) + str(errors.get(op, 0)).rjust(8)
+        line += ''.join([format(selfplay.percentile(counts, fraction) * 1000, '10.2f') for _, fraction in PERCENTILES])
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record, synthesize and replay /2048 request streams.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    synth = commands.add_parser('synthesize', help='write a trace from self-play games')
+    synth.add_argument('--games', type=int, default=100)
+    synth.add_argument('--strategy', default='greedy')
+    synth.add_argument('--seed', type=int, default=None)
+    synth.add_argument('--gap-ms', type=float, default=10.0, help='time between requests in the trace')
+    synth.add_argument('--output', required=True)
+
+    play = commands.add_parser('replay', help='replay a trace and report latency per op')
+    play.add_argument('trace')
+    play.add_argument('--target', default='inprocess', help="'inprocess' (Flask test client) or a base URL")
+    play.add_argument('--rate', type=float, default=0, help='requests per second; 0 is unthrottled, -1 keeps the trace timing')
+    play.add_argument('--concurrency', type=int, default=4)
+    play.add_argument('--limit', type=int, default=0, help='only replay the first N requests')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'synthesize':
+        records = synthesize(args.games, args.strategy, args.seed, args.gap_ms / 1000.0)
+        writeTrace(args.output, records)
+        print('wrote ' + str(len(records)) + ' requests to ' + args.output)
+        return 0
+
+    records = readTrace(args.trace)
+    if args.limit:
+        records = records[:args.limit]
+    if args.target == 'inprocess':
+        sender = InProcessSender()
+    else:
+        sender = HttpSender(args.target)
+    report(*replay(records, sender, args.rate, args.concurrency))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
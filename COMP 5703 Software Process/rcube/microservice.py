@@ -1,10 +1,18 @@
 import sys 
 import os
-from flask import Flask, request
-import Tiles2048.dispatch as dispatch
+from flask import Flask, Response, request
+from werkzeug.serving import WSGIRequestHandler
+import serving
+import Tiles2048.metrics as metrics
 
 app = Flask(__name__)
 
+#set TRACE_FILE to record every /2048 request for loadgen.py to replay
+trace = None
+if os.getenv('TRACE_FILE'):
+    import loadgen
+    trace = loadgen.TraceRecorder(os.getenv('TRACE_FILE'))
+
 #-----------------------------------
 #  The following code is invoked when the path portion of the URL matches 
 #         /2048
@@ -12,17 +20,74 @@ app = Flask(__name__)
 #  Parameters are passed as a URL query:
 #        /2048?parm1=value1&parm2=value2
 #
+#  The response is a JSON object
+#  Responses that only depend on the parameters (see serving.CACHED_OPS) carry an ETag,
+#  and a request whose If-None-Match holds it gets an empty 304
+#  A request that raises gets a 500 with the error as its status
+#
 @app.route('/2048')
 def server():
+    start = metrics.clock()
+    code = 500
+    try:
+        etag = None
+        try:
+            userParms = {}
+            for key in request.args:
+                userParms[key] = str(request.args.get(key, ''))
+            if trace != None:
+                trace.record(userParms)
+            body, etag = serving.dispatchBody(userParms)
+            code = 200
+        except Exception as e:
+            body = serving.statusBody('error: ' + str(e))
+        headers = serving.cacheHeaders(etag)
+        if serving.etagMatches(request.headers.get('If-None-Match', ''), etag):
+            code = 304
+            return Response(status=304, headers=headers)
+        return Response(body, status=code, mimetype='application/json', headers=headers)
+    finally:
+        metrics.observeHttp('GET /2048', code, metrics.clock() - start)
+
+#-----------------------------------
+#  Many operations in one request: POST /2048 with a JSON array of parameter objects
+#        [{"op": "shift", "grid": "...", "score": 0, "direction": "left", "integrity": "..."}, ...]
+#
+#  The response is the JSON array of results, in the same order, gzipped when the client accepts it
+#
+@app.route('/2048', methods=['POST'])
+def bulkServer():
+    start = metrics.clock()
+    code = 500
     try:
-        userParms = {}
-        for key in request.args:
-            userParms[key] = str(request.args.get(key, ''))
-        result=dispatch._dispatch(userParms)
-        print("Response -->", str(result))
-        return str(result)
-    except Exception as e:
-        return str(e)
+        try:
+            result = serving.bulkResult(request.get_data())
+            serving.logResponse(result)
+            body = serving.responseBody(result)
+            code = 200
+        except Exception as e:
+            body = serving.statusBody('error: ' + str(e))
+        payload, headers = serving.encodeBody(body, request.headers.get('Accept-Encoding', ''))
+        return Response(payload, status=code, mimetype='application/json', headers=headers)
+    finally:
+        metrics.observeHttp('POST /2048', code, metrics.clock() - start)
+
+#-----------------------------------
+#  Request counts, error counts and latency histograms (see Tiles2048/metrics.py)
+#  in the Prometheus text format, added up over every worker
+#
+@app.route('/metrics')
+def metricsServer():
+    return Response(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
+
+#-----------------------------------
+#  Starts or stops the sampling profiler: /admin/profile?rate=0.05 with the ADMIN_TOKEN in X-Admin-Token
+#  (see serving.adminProfile)
+#
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def profileServer():
+    code, body = serving.adminProfile(request.args.get('rate', ''), request.headers.get('X-Admin-Token', ''))
+    return Response(body, status=code, mimetype='application/json' if code != 404 else 'text/plain')
     
 @app.route('/info')
 def info():
@@ -32,5 +97,9 @@ def info():
 #-----------------------------------
 port = os.getenv('PORT', '5000')
 if __name__ == "__main__":
+    #HTTP/1.1 so clients can keep the connection open between requests
+    WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+    serving.warm()
+    serving.startWorker()
     app.run(host='0.0.0.0', port=int(port))
 
@@ -0,0 +1,304 @@
+import os
+import sys
+import gzip
+import json
+import hmac
+import hashlib
+import threading
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from functools import lru_cache
+from collections import OrderedDict
+import Tiles2048.dispatch as dispatch
+import Tiles2048.heuristic as heuristic
+import Tiles2048.transposition as transposition
+import Tiles2048.sessions as sessions
+import Tiles2048.profiler as profiler
+import Tiles2048.metrics as metrics
+
+#-----------------------------------
+#  Response bodies and request logging shared by the /2048 front ends
+#
+
+#-------------------------------
+#JSON bodies
+#-------------------------------
+
+#the standard library's C encoder, with no spaces
+toJson = json.JSONEncoder(separators=(',', ':')).encode
+
+#a body that only carries a status (e.g. 'error: bad integrity value') is built once and reused
+@lru_cache(maxsize=256)
+def statusBody(status):
+    return toJson({'status': status})
+
+#the constant dispatch errors are ready before the first request
+for _status in (dispatch.ERROR01, dispatch.ERROR02, dispatch.ERROR03):
+    statusBody(_status)
+del _status
+
+def responseBody(result):
+    if isinstance(result, dict) and len(result) == 1 and isinstance(result.get('status'), str):
+        return statusBody(result['status'])
+    return toJson(result)
+
+#-------------------------------
+#response cache
+#-------------------------------
+
+#these ops give the same response for the same parameters, so their bodies are cached with an ETag;
+#each op lists the parameters it reads, and only those make up the key
+CACHED_OPS = {
+    'status': ('grid', 'score', 'integrity'),
+    'recommend': ('grid', 'score', 'integrity', 'strategy', 'depth', 'budgetMs'),
+    'create': ('size', 'seed'),
+    'shift': ('grid', 'score', 'integrity', 'direction', 'moves', 'spawn', 'size'),
+    }
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '4096'))
+CACHE_MAX_AGE = int(os.getenv('CACHE_MAX_AGE', '3600'))
+
+#returns the cache key for a request, or None when its response must not be reused
+#(a create without a seed, a shift without spawn=hash and a rollout recommend are random, a timed
+#recommend depends on how far the search got, and a request on a server-side session depends on the game kept for it)
+def cacheKey(userParms):
+    op = userParms.get('op', None)
+    if op not in CACHED_OPS:
+        return None
+    if sessions.selected(userParms):
+        return None
+    if op == 'create' and not userParms.get('seed', ''):
+        return None
+    if op == 'shift' and userParms.get('spawn', '') != 'hash':
+        return None
+    if op == 'recommend' and userParms.get('strategy', '') not in ('', 'expectimax'):
+        return None
+    if op == 'recommend' and userParms.get('budgetMs', '') != '0':
+        return None
+    return (op,) + tuple([userParms.get(name, '') or '' for name in CACHED_OPS[op]])
+
+#a size-bounded LRU of key -> (body, etag), safe to share between request threads
+class ResponseCache:
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry != None:
+                self.entries.move_to_end(key)
+            return entry
+
+    #stores the body and returns its ETag
+    def put(self, key, body):
+        etag = '"' + hashlib.blake2b(body.encode(), digest_size=12).hexdigest() + '"'
+        with self.lock:
+            self.entries[key] = (body, etag)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return etag
+
+responseCache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+#returns (body, etag) for a GET request; etag is None when the response must not be reused
+def dispatchBody(userParms):
+    key = cacheKey(userParms)
+    if key != None:
+        cached = responseCache.get(key)
+        if cached != None:
+            return cached
+
+    result = dispatch._dispatch(userParms)
+    logResponse(result)
+    body = responseBody(result)
+    if key == None or isError(result):
+        return body, None
+    return body, responseCache.put(key, body)
+
+#an error is never cached: it may not hold for the next request (e.g. the engine failed)
+def isError(result):
+    return isinstance(result, dict) and str(result.get('status', '')).startswith('error')
+
+#the caching headers for a response
+def cacheHeaders(etag):
+    if etag == None:
+        return {'Cache-Control': 'no-store'}
+    return {'ETag': etag, 'Cache-Control': 'public, max-age=' + str(CACHE_MAX_AGE)}
+
+#true when the client's If-None-Match already holds this ETag
+def etagMatches(ifNoneMatch, etag):
+    if etag == None or not ifNoneMatch:
+        return False
+    tags = [tag.strip() for tag in ifNoneMatch.split(',')]
+    return '*' in tags or etag in tags or 'W/' + etag in tags
+
+#-------------------------------
+#bulk requests
+#-------------------------------
+
+MAX_OPERATIONS = 10000
+GZIP_LEVEL = 5
+MIN_GZIP_BYTES = 512
+
+#runs a POSTed JSON array of operations and returns the array of results, in the same order
+#operations may carry numbers (e.g. a JSON score), so their values are turned into query strings first
+def bulkResult(body):
+    try:
+        operations = json.loads(body)
+    except ValueError:
+        return {'status': 'error: invalid operations - not a JSON array'}
+
+    if not isinstance(operations, list):
+        return {'status': 'error: invalid operations - not a JSON array'}
+
+    if len(operations) > MAX_OPERATIONS:
+        return {'status': 'error: invalid operations - more than ' + str(MAX_OPERATIONS) + ' operations'}
+
+    #an operation that is not a dictionary of strings and numbers gets its error in its place,
+    #and the rest are dispatched together
+    results = [None] * len(operations)
+    positions = []
+    batch = []
+    for position, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            results[position] = {'status': dispatch.ERROR02}
+            continue
+        try:
+            batch.append(operationParms(operation))
+        except ValueError as e:
+            results[position] = {'status': 'error: ' + str(e)}
+            continue
+        positions.append(position)
+    for position, result in zip(positions, dispatch._dispatchBatch(batch)):
+        results[position] = result
+    return results
+
+#parameters that take a JSON array as it is, e.g. the boards of op=shiftBatch
+LIST_KEYS = ('boards',)
+
+#an operation's values must be strings or numbers (a null value is left out); raises ValueError otherwise
+def operationParms(operation):
+    userParms = {}
+    for key, value in operation.items():
+        if value == None:
+            continue
+        if key in LIST_KEYS and isinstance(value, list):
+            userParms[key] = value
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError('invalid operation - ' + key + ' is not a string or number')
+        userParms[key] = str(value)
+    return userParms
+
+#returns (body bytes, extra headers), gzipped when the client accepts it and the body is big enough to gain
+def encodeBody(body, acceptEncoding):
+    body = body.encode()
+    headers = {'Vary': 'Accept-Encoding'}
+    if len(body) >= MIN_GZIP_BYTES and 'gzip' in acceptEncoding.lower():
+        body = gzip.compress(body, GZIP_LEVEL)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+#-------------------------------
+#request logging
+#-------------------------------
+
+#LOG_SAMPLE_RATE is the share of responses that are logged (1 logs every response, 0 none)
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+LOG_QUEUE_SIZE = 10000
+
+#the request thread only puts the record on the queue: formatting and writing happen on the
+#listener thread, and when the queue is full the record is dropped rather than waited on
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, logQueue):
+        super().__init__(logQueue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+logHandler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+logger = logging.getLogger('rcube')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+logger.addHandler(logHandler)
+logListener = None
+listenerPid = None
+listenerLock = threading.Lock()
+
+#a forked worker does not inherit the listener thread, so each process starts its own queue and listener,
+#the first time it logs
+def startLogging():
+    global logListener, listenerPid
+    with listenerLock:
+        if listenerPid == os.getpid():
+            return
+        logHandler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        logListener = logging.handlers.QueueListener(logHandler.queue, logging.StreamHandler(sys.stdout))
+        logListener.start()
+        listenerPid = os.getpid()
+
+#writes what is still queued; only the process that started the listener can stop it
+def stopLogging():
+    global listenerPid
+    with listenerLock:
+        if listenerPid != os.getpid():
+            return
+        logListener.stop()
+        listenerPid = None
+
+atexit.register(stopLogging)
+
+#logs a sampled share of responses; the body is only turned into text on the listener thread
+def logResponse(result):
+    if LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE:
+        if listenerPid != os.getpid():
+            startLogging()
+        logger.info('Response --> %s', result)
+
+#-------------------------------
+#profiling
+#-------------------------------
+
+#/admin/profile?rate=0.05 profiles that share of /2048 ops in every worker (see Tiles2048/profiler.py); rate=0 stops
+#the request must carry the ADMIN_TOKEN in an X-Admin-Token header, and without an ADMIN_TOKEN the route does not exist
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+#returns (HTTP status code, body)
+def adminProfile(rateText, token):
+    if not ADMIN_TOKEN:
+        return 404, 'not found'
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return 403, statusBody('error: invalid admin token')
+    return 200, responseBody(profiler.control(rateText))
+
+#-------------------------------
+#warming
+#-------------------------------
+
+#builds everything the engine would otherwise build on its first request: the move tables (on import),
+#the heuristic row table and the shared transposition table
+#a pre-forking server calls this once before forking so the workers share these pages copy-on-write
+def warm():
+    heuristic.rowValues()
+    transposition.sharedTable()
+
+#starts what a serving process runs beside its request threads, once it is forked (gunicorn's post_fork)
+#or when a front end is run directly: the metrics flusher and the profiler's threads; the log listener starts
+#on the first log and the rollout pool on the first rollout, so a worker that serves neither starts neither
+def startWorker():
+    metrics.startMetrics()
+    profiler.startProfiler()
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import Tiles2048.selfplay as selfplay
+import Tiles2048.transposition as transposition
+
+#-----------------------------------
+#  Plays complete games offline, straight on the Tiles2048 engine, spread over every core
+#
+#        python simulate.py --games 1000000 --strategy greedy
+#        python simulate.py --games 200 --strategy recommend --depth 2
+#        python simulate.py --games 1000 --strategy mymodule:myStrategy
+#
+#  and reports games per second, the spread of max tiles and the game lengths
+#
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play 2048 games offline and report how a strategy does.')
+    parser.add_argument('--games', type=int, default=10000, help='number of games to play')
+    parser.add_argument('--strategy', default='random',
+                        help='random, greedy, recommend or module:function (called with board and rng)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--chunk', type=int, default=500, help='games per task sent to a worker')
+    parser.add_argument('--seed', type=int, default=None, help='seed for repeatable runs')
+    parser.add_argument('--depth', type=int, default=2, help='search depth for the recommend strategy')
+    parser.add_argument('--budget-ms', type=int, default=50, help='time budget per move for the recommend strategy')
+    args = parser.parse_args(argv)
+
+    try:
+        selfplay.strategyFor(args.strategy, args.depth, args.budget_ms)
+    except (ValueError, ImportError, AttributeError) as e:
+        parser.error(str(e))
+
+    rng = random.Random(args.seed)
+    tasks = []
+    remaining = args.games
+    while remaining > 0:
+        games = min(args.chunk, remaining)
+        tasks.append((args.strategy, games, rng.getrandbits(64), args.depth, args.budget_ms))
+        remaining -= games
+
+    #the recommend strategy's workers share one transposition table, made here so this process removes it
+    if args.strategy == 'recommend':
+        transposition.sharedTable()
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(selfplay.playChunk, tasks))
+    else:
+        results = [selfplay.playChunk(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+
+    report(selfplay.combine(results), elapsed, args)
+
+def report(combined, elapsed, args):
+    games, totalScore, maxTiles, lengths = combined
+    if games == 0:
+        print('no games played')
+        return
+
+    print('strategy         ' + args.strategy)
+    print('games            ' + str(games))
+    print('workers          ' + str(args.workers))
+    print('seconds          ' + format(elapsed, '.2f'))
+    print('games/s          ' + format(games / elapsed, '.1f'))
+    print('mean score       ' + format(totalScore / games, '.1f'))
+    print('')
+    print('max tile         games      share')
+    for tile in sorted(maxTiles, key=int):
+        print(tile.ljust(16) + ' ' + str(maxTiles[tile]).ljust(10) + ' ' + format(100.0 * maxTiles[tile] / games, '.2f') + '%')
+    print('')
+    print('game length      moves')
+    for label, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p99.9', 0.999)):
+        print(label.ljust(16) + ' ' + str(selfplay.percentile(lengths, fraction)))
+    print('max'.ljust(16) + ' ' + str(max(lengths)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])